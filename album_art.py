@@ -0,0 +1,278 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+ART_CACHE_DIR = ".cache-art"
+ART_MEMORY_MAX_BYTES = 64 * 1024 * 1024
+ART_MEMORY_MAX_ENTRIES = 256
+ART_DISK_MAX_BYTES = 256 * 1024 * 1024
+ART_MISSING_TTL = 24 * 60 * 60  # seconds before a track without art is looked up again
+ART_THUMBNAIL_SIZE = 200
+ART_BACKGROUND_SOURCE_SIZE = 256  # a 2048px wide window blurs a 256px wide image
+
+BACKGROUND_SCALE = 8
+BACKGROUND_BLUR_RADIUS = 15  # at full window size
+BACKGROUND_DARKEN = 80
+
+
+class AlbumArtCache:
+    """Two-tier cache of album art keyed by Spotify track id.
+
+    The track -> image URL mapping and the raw image bytes live on disk under
+    `path`. The in-memory LRU, bounded by both entry count and decoded size,
+    holds the thumbnail and background source of prepare_album_art(), never
+    the full decoded cover. The disk tier evicts its least recently used
+    images once it grows past max_disk_bytes. hits/misses count lookups per
+    tier ("memory", "disk", "url"). Pillow is only imported once an image is
+    first decoded.
+    """
+
+    def __init__(self, path=ART_CACHE_DIR, max_memory_bytes=ART_MEMORY_MAX_BYTES,
+                 max_memory_entries=ART_MEMORY_MAX_ENTRIES, max_disk_bytes=ART_DISK_MAX_BYTES):
+        self.path = path
+        self.max_memory_bytes = max_memory_bytes
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = {"memory": 0, "disk": 0, "url": 0}
+        self.misses = {"memory": 0, "disk": 0, "url": 0}
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._urls = None
+        self._missing = None  # track id -> time its lookup found no art
+        self._disk = None  # file name -> size, oldest first
+
+    def get(self, track_id, lookup_url, download):
+        """Return prepare_album_art() of track_id's album art, or None if it has none.
+
+        lookup_url(track_id) resolves the image URL (None when the track has no
+        art) and download(url) fetches the raw bytes; both are only called on a
+        miss of the tiers below them.
+        """
+        with self._lock:
+            art = self._memory.get(track_id)
+            if art is not None:
+                self._memory.move_to_end(track_id)
+                self.hits["memory"] += 1
+                return art
+            self.misses["memory"] += 1
+
+        image = None
+        data = self._read_image(track_id)
+        if data is not None:
+            try:
+                image = _decode_image(data)
+            except Exception as e:
+                logging.warning(f"Dropping unreadable album art cache entry for {track_id}: {e}")
+                self._remove_image(track_id)
+        if image is None:
+            url = self._image_url(track_id, lookup_url)
+            if not url:
+                return None
+            data = download(url)
+            image = _decode_image(data)
+            self._write_image(track_id, data)
+        art = prepare_album_art(image)
+        self._remember(track_id, art)
+        return art
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": sum(self._disk_index().values()),
+            }
+
+    def clear(self):
+        """Drop both tiers. Returns False if there was nothing on disk to delete."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._urls = None
+            self._missing = None
+            self._disk = None
+            if not os.path.exists(self.path):
+                return False
+            shutil.rmtree(self.path, ignore_errors=True)
+            return True
+
+    def _remember(self, track_id, art):
+        with self._lock:
+            if track_id in self._memory:
+                return
+            self._memory[track_id] = art
+            self._memory_bytes += _art_bytes(art)
+            while self._memory and (len(self._memory) > self.max_memory_entries
+                                    or self._memory_bytes > self.max_memory_bytes):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= _art_bytes(evicted)
+
+    def _image_url(self, track_id, lookup_url):
+        """The image URL of track_id, or None when it has none.
+
+        A track found without art is only remembered for ART_MISSING_TTL, as
+        the lookup may have failed rather than found nothing.
+        """
+        with self._lock:
+            urls = self._url_index()
+            if track_id in urls:
+                self.hits["url"] += 1
+                return urls[track_id]
+            checked = self._missing.get(track_id)
+            if checked is not None and time.time() - checked < ART_MISSING_TTL:
+                self.hits["url"] += 1
+                return None
+            self.misses["url"] += 1
+        url = lookup_url(track_id)
+        with self._lock:
+            if url:
+                urls[track_id] = url
+                self._missing.pop(track_id, None)
+            else:
+                self._missing[track_id] = time.time()
+            self._save_urls()
+        return url or None
+
+    def _url_index(self):
+        if self._urls is None:
+            self._urls, self._missing = {}, {}
+            try:
+                with open(os.path.join(self.path, "urls.json"), "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                self._urls = dict(index.get("urls", {}))
+                self._missing = dict(index.get("missing", {}))
+            except (OSError, ValueError, AttributeError):
+                pass
+        return self._urls
+
+    def _save_urls(self):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_path = os.path.join(self.path, "urls.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"urls": self._urls, "missing": self._missing}, f)
+            os.replace(tmp_path, os.path.join(self.path, "urls.json"))
+        except OSError as e:
+            logging.error(f"Error saving album art URL cache: {e}")
+
+    def _disk_index(self):
+        if self._disk is None:
+            entries = []
+            try:
+                with os.scandir(self.path) as it:
+                    for entry in it:
+                        if entry.name.endswith(".img"):
+                            st = entry.stat()
+                            entries.append((st.st_mtime, entry.name, st.st_size))
+            except OSError:
+                pass
+            self._disk = OrderedDict((name, size) for _, name, size in sorted(entries))
+        return self._disk
+
+    def _read_image(self, track_id):
+        name = f"{track_id}.img"
+        with self._lock:
+            disk = self._disk_index()
+            if name not in disk:
+                self.misses["disk"] += 1
+                return None
+            file_path = os.path.join(self.path, name)
+            try:
+                with open(file_path, "rb") as f:
+                    data = f.read()
+                os.utime(file_path)
+            except OSError:
+                disk.pop(name, None)
+                self.misses["disk"] += 1
+                return None
+            disk.move_to_end(name)
+            self.hits["disk"] += 1
+            return data
+
+    def _write_image(self, track_id, data):
+        name = f"{track_id}.img"
+        with self._lock:
+            disk = self._disk_index()
+            file_path = os.path.join(self.path, name)
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                # Written aside and renamed, so a crash never leaves a truncated image behind.
+                with open(file_path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(file_path + ".tmp", file_path)
+            except OSError as e:
+                logging.error(f"Error writing album art cache entry {name}: {e}")
+                return
+            disk[name] = len(data)
+            disk.move_to_end(name)
+            total = sum(disk.values())
+            while total > self.max_disk_bytes and len(disk) > 1:
+                evicted, size = disk.popitem(last=False)
+                total -= size
+                try:
+                    os.remove(os.path.join(self.path, evicted))
+                except OSError:
+                    pass
+
+    def _remove_image(self, track_id):
+        name = f"{track_id}.img"
+        with self._lock:
+            self._disk_index().pop(name, None)
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+
+def _decode_image(data):
+    from PIL import Image
+
+    image = Image.open(BytesIO(data))
+    image.load()
+    return image
+
+
+def _art_bytes(art):
+    return sum(image.width * image.height * len(image.getbands()) for image in art)
+
+
+def prepare_album_art(img):
+    """Reduce a decoded cover to (thumbnail, background source), all the viewer draws from.
+
+    The thumbnail fits in ART_THUMBNAIL_SIZE and the RGB background source in
+    ART_BACKGROUND_SOURCE_SIZE, about a quarter of a 640px cover's pixels.
+    """
+    from PIL import Image
+
+    thumbnail = img.copy()
+    thumbnail.thumbnail((ART_THUMBNAIL_SIZE, ART_THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+    source = img.convert("RGB")
+    source.thumbnail((ART_BACKGROUND_SOURCE_SIZE, ART_BACKGROUND_SOURCE_SIZE), Image.Resampling.BILINEAR,
+                     reducing_gap=2.0)
+    return thumbnail, source
+
+
+def render_album_art(art, size):
+    """Return (thumbnail, blurred and darkened background) for art from prepare_album_art().
+
+    The background is rendered at 1/BACKGROUND_SCALE of `size`; the blur hides
+    the difference once the caller scales it up to the full window.
+    """
+    from PIL import Image, ImageFilter
+
+    thumbnail, source = art
+    width, height = size
+    small_size = (max(1, width // BACKGROUND_SCALE), max(1, height // BACKGROUND_SCALE))
+    blurred = source.resize(small_size, Image.Resampling.BILINEAR)
+    blurred = blurred.filter(ImageFilter.GaussianBlur(radius=BACKGROUND_BLUR_RADIUS / BACKGROUND_SCALE))
+    # Same result as compositing black at alpha BACKGROUND_DARKEN over the image.
+    blurred = blurred.point(lambda v: v * (255 - BACKGROUND_DARKEN) // 255)
+    return thumbnail, blurred
@@ -0,0 +1,4 @@
+"""Benchmarks for the viewer's hot paths on synthetic streaming histories.
+
+Run `python -m benchmarks --help` from the repository root; see __main__.py.
+"""
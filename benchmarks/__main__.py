@@ -0,0 +1,198 @@
+"""Run the benchmark suite.
+
+    python -m benchmarks                          # every case on 10k and 100k plays, both schemas
+    python -m benchmarks --sizes 1m,10m --schema extended --cases parse,merge,search
+    python -m benchmarks --save-baseline          # record this machine's numbers
+    python -m benchmarks                          # ...and later compare against them
+
+Histories are generated once per (schema, size, seed) under --data-dir. Every
+case runs in a fresh Python process, with the scratch directory under
+--data-dir as its working directory (Qt on the offscreen platform for the
+cases that need a window), so its peak RSS is its own and it never touches
+the config.json or caches of a real session. Playlist calls go to a stub
+Web API served from this process. A case whose median time or peak RSS grows
+past --threshold over the baseline is flagged and the run exits with status 1.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.cases import CASES
+from benchmarks.generate import SCHEMAS, dataset, dataset_dir, format_plays, parse_plays
+from benchmarks.stub_server import StubSpotifyAPI
+
+DATA_DIR = ".cache-bench"
+DEFAULT_SIZES = "10k,100k"
+DEFAULT_REPEAT = 5
+REGRESSION_THRESHOLD = 0.15
+TIME_NOISE_FLOOR = 0.01  # seconds; slowdowns below this are timer noise
+RSS_NOISE_FLOOR = 16 * 2 ** 20
+CASE_TIMEOUT = 3600
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    return f"{seconds * 1000:.1f} ms" if seconds < 1 else f"{seconds:.2f} s"
+
+
+def format_bytes(size):
+    return "-" if size is None else f"{size / 2 ** 20:.0f} MB"
+
+
+def run_case(name, data_dir, repeat, work_dir, api_url=None):
+    """Run one case in a child process and return its result dict."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    command = [sys.executable, "-m", "benchmarks.cases", name, os.path.abspath(data_dir), "--repeat", str(repeat)]
+    if api_url:
+        command += ["--api-url", api_url]
+    try:
+        process = subprocess.run(command, cwd=work_dir, env=env, capture_output=True, text=True,
+                                 timeout=CASE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return {"case": name, "error": f"timed out after {CASE_TIMEOUT} s"}
+    lines = process.stdout.strip().splitlines()
+    if process.returncode or not lines:
+        error = (process.stderr.strip().splitlines() or [f"exit status {process.returncode}"])[-1]
+        return {"case": name, "error": error}
+    result = json.loads(lines[-1])
+    if result["seconds"]:
+        result["median"] = median(result["seconds"])
+        result["min"] = min(result["seconds"])
+    return result
+
+
+def compare(result, baseline, threshold):
+    """Return (change text, regressed) for result against its baseline entry."""
+    if not baseline or "median" not in result or "median" not in baseline:
+        return "", False
+    regressed = []
+    change = result["median"] / baseline["median"] - 1 if baseline["median"] else 0.0
+    if change > threshold and result["median"] - baseline["median"] > TIME_NOISE_FLOOR:
+        regressed.append("time")
+    rss, base_rss = result.get("peak_rss"), baseline.get("peak_rss")
+    if rss and base_rss and rss > base_rss * (1 + threshold) and rss - base_rss > RSS_NOISE_FLOOR:
+        regressed.append("RSS")
+    text = f"{change:+.0%}"
+    if regressed:
+        text += f"  REGRESSION ({', '.join(regressed)})"
+    return text, bool(regressed)
+
+
+def load_baseline(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    baseline = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the viewer's hot paths.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"comma-separated play counts, 10k to 10m (default: {DEFAULT_SIZES})")
+    parser.add_argument("--schema", choices=SCHEMAS + ("both",), default="both")
+    parser.add_argument("--cases", help=f"comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DATA_DIR, help=f"generated histories and scratch (default: {DATA_DIR})")
+    parser.add_argument("--baseline", help="baseline file (default: DATA_DIR/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help=f"relative slowdown flagged as a regression (default: {REGRESSION_THRESHOLD})")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stub API adds to each response")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    try:
+        args.sizes = [parse_plays(size) for size in args.sizes.split(",") if size.strip()]
+    except ValueError as e:
+        parser.error(str(e))
+    args.cases = [name.strip() for name in args.cases.split(",")] if args.cases else list(CASES)
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+    args.schemas = SCHEMAS if args.schema == "both" else (args.schema,)
+    args.baseline = args.baseline or os.path.join(args.data_dir, "baseline.json")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    work_dir = os.path.join(args.data_dir, "work")
+    os.makedirs(work_dir, exist_ok=True)
+    baseline = load_baseline(args.baseline)
+    if baseline and baseline.get("machine") != platform.node():
+        print(f"Note: the baseline was recorded on {baseline.get('machine')!r}.", file=sys.stderr)
+    baseline_results = (baseline or {}).get("results", {})
+
+    api = StubSpotifyAPI(latency=args.latency).start() if any(CASES[name][2] for name in args.cases) else None
+    results = {}
+    regressions = []
+    print(f"{'case':<16}{'schema':<10}{'plays':>7}{'median':>12}{'min':>12}{'peak RSS':>10}  vs baseline")
+    try:
+        for schema in args.schemas:
+            for plays in args.sizes:
+                if not os.path.isdir(dataset_dir(args.data_dir, plays, schema, args.seed)):
+                    print(f"Generating {format_plays(plays)} {schema} plays...", file=sys.stderr)
+                paths = dataset(args.data_dir, plays, schema, args.seed)
+                data_dir = os.path.dirname(paths[0])
+                for name in args.cases:
+                    key = f"{name}/{schema}/{format_plays(plays)}"
+                    result = run_case(name, data_dir, args.repeat, work_dir, api.url if api else None)
+                    results[key] = result
+                    row = f"{name:<16}{schema:<10}{format_plays(plays):>7}"
+                    if "error" in result or "skipped" in result:
+                        print(f"{row}  {result.get('error') or 'skipped: ' + result['skipped']}")
+                        continue
+                    change, regressed = compare(result, baseline_results.get(key), args.threshold)
+                    if regressed:
+                        regressions.append(key)
+                    print(f"{row}{format_seconds(result.get('median')):>12}{format_seconds(result.get('min')):>12}"
+                          f"{format_bytes(result.get('peak_rss')):>10}  {change}")
+    finally:
+        if api is not None:
+            api.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        # Cases and sizes left out of this run keep their old baseline.
+        measured = {key: result for key, result in results.items() if "median" in result}
+        save_baseline(args.baseline, {**baseline_results, **measured})
+        print(f"Saved baseline to {args.baseline}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""The benchmark cases, each run in a fresh process by `python -m benchmarks`.
+
+A case sets up what it needs untimed, then times `repeat` runs of one hot
+path. Cases that need the main window create it on Qt's offscreen platform.
+Run one directly with
+
+    python -m benchmarks.cases search .cache-bench/extended-100k-seed0
+
+which prints a JSON line with the run times, peak RSS and case details.
+Relative paths such as config.json and .cache-history resolve against the
+current directory, which the runner points at a scratch directory.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+
+from history_core import (
+    HistoryCache, PlayKeySet, empty_history_frame, frame_from_chunks, load_history_chunks, load_history_files,
+    load_history_frame, merge_history, track_rows, unique_track_uris
+)
+
+PLAYLIST_UPLOAD_TRACKS = 5000
+SEARCH_NO_MATCH = "zzqxj"
+
+CASES = {}
+
+
+def case(name, window=False, api=False):
+    """Register a benchmark; window cases get a viewer, api cases the stub API's URL."""
+    def register(fn):
+        CASES[name] = (fn, window, api)
+        return fn
+    return register
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None where it cannot be read."""
+    # Linux carries ru_maxrss over from the parent across exec, so prefer VmHWM.
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Bench:
+    """What a case gets: the export files, the repeat count and somewhere to record timings."""
+
+    def __init__(self, paths, repeat, api_url=None):
+        self.paths = paths
+        self.repeat = repeat
+        self.api_url = api_url
+        self.seconds = []
+        self.setup_rss = None
+        self.info = {}
+        self.skipped = None
+
+    def repeats(self):
+        return range(self.repeat)
+
+    @contextmanager
+    def timer(self):
+        if self.setup_rss is None:
+            self.setup_rss = peak_rss()
+        start = time.perf_counter()
+        yield
+        self.seconds.append(time.perf_counter() - start)
+
+    def history(self):
+        """The sorted history frame of all files, loaded through a scratch HistoryCache."""
+        df = load_history_files(self.paths, cache=HistoryCache())
+        self.info["plays"] = len(df)
+        return df
+
+
+_app = None
+
+
+def viewer():
+    """A shown StreamingHistoryViewer on the offscreen platform, with startup callbacks run."""
+    global _app
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    _app = QApplication.instance() or QApplication([sys.argv[0]])
+    from spotify_history_viewer import StreamingHistoryViewer
+
+    window = StreamingHistoryViewer()
+    window.show()
+    _app.processEvents()
+    return window
+
+
+@case("parse")
+def parse(bench):
+    """openFiles: parse every file in the worker processes, nothing cached."""
+    for _ in bench.repeats():
+        with bench.timer():
+            chunks = load_history_chunks(bench.paths)
+    bench.info["files"] = len(bench.paths)
+    bench.info["megabytes"] = round(sum(os.path.getsize(path) for path in bench.paths) / 2 ** 20, 1)
+    bench.info["records"] = sum(len(chunk["Date/Time"]) for chunk in chunks)
+
+
+@case("parse_cached")
+def parse_cached(bench):
+    """openFiles again: every file read back from a warm HistoryCache."""
+    cache = HistoryCache()
+    cache.clear()
+    load_history_chunks(bench.paths, cache=cache)
+    for _ in bench.repeats():
+        with bench.timer():
+            load_history_chunks(bench.paths, cache=cache)
+
+
+@case("reopen_cached")
+def reopen_cached(bench):
+    """Open the same files again: the merged history read back from a warm HistoryCache."""
+    cache = HistoryCache()
+    cache.clear()
+    load_history_frame(bench.paths, cache=cache)
+    for _ in bench.repeats():
+        with bench.timer():
+            df, _, _ = load_history_frame(bench.paths, cache=cache)
+    bench.info["plays"] = len(df)
+
+
+@case("normalize")
+def normalize(bench):
+    """Parsed chunks to one DataFrame: categoricals, normalized URIs, nullable Skipped."""
+    chunks = load_history_chunks(bench.paths, cache=HistoryCache())
+    for _ in bench.repeats():
+        with bench.timer():
+            frame_from_chunks(chunks)
+
+
+@case("merge")
+def merge(bench):
+    """Open: deduplicate the plays of every file and sort them by date into an empty history."""
+    chunks = load_history_chunks(bench.paths, cache=HistoryCache())
+    for _ in bench.repeats():
+        with bench.timer():
+            df, added = merge_history(empty_history_frame(), PlayKeySet(), chunks)
+    bench.info["plays"] = added
+
+
+@case("add_files")
+def add_files(bench):
+    """Add Files: merge the middle file into the sorted history of all the others."""
+    chunks = load_history_chunks(bench.paths, cache=HistoryCache())
+    if len(chunks) < 2:
+        bench.skipped = "needs at least two export files"
+        return
+    middle = len(chunks) // 2
+    rest = chunks[:middle] + chunks[middle + 1:]
+    for _ in bench.repeats():
+        keys = PlayKeySet()
+        base, _ = merge_history(empty_history_frame(), keys, rest)
+        with bench.timer():
+            df, added = merge_history(base, keys, [chunks[middle]])
+    bench.info["plays"] = len(df)
+    bench.info["added"] = added
+
+
+@case("set_history", window=True)
+def set_history(bench):
+    """Show a loaded history: build the search index and statistics, fill the table and date presets."""
+    window = viewer()
+    df = bench.history()
+    for _ in bench.repeats():
+        with bench.timer():
+            window.setHistory(df)
+            window.table_view.viewport().repaint()
+
+
+@case("populate_table", window=True)
+def populate_table(bench):
+    """Hand the history frame to the table model and paint the first screen of rows."""
+    window = viewer()
+    df = bench.history()
+    for _ in bench.repeats():
+        with bench.timer():
+            window.populateTable(df)
+            window.table_view.viewport().repaint()
+
+
+def search_queries(df):
+    """A spread of searches over df: its top artist, a frequent song, a prefix, two words and no match."""
+    artist = df["Creator"].value_counts().index[0]
+    song = df["Song"].value_counts().index[0]
+    return [artist, song, song[:3], f"{artist.split()[0]} {song.split()[0]}", SEARCH_NO_MATCH]
+
+
+@case("search", window=True)
+def search(bench):
+    """Type a series of searches into the search field, each followed by a repaint."""
+    window = viewer()
+    df = bench.history()
+    window.setHistory(df)
+    queries = search_queries(df)
+    bench.info["queries"] = len(queries)
+    for _ in bench.repeats():
+        with bench.timer():
+            for query in queries:
+                window.search_field.blockSignals(True)
+                window.search_field.setText(query)
+                window.search_field.blockSignals(False)
+                window.search()
+                window.table_view.viewport().repaint()
+        window.clearSearch()
+
+
+@case("date_range", window=True)
+def date_range(bench):
+    """Step through every date-range preset: binary-search the sorted dates, refresh the stats pane."""
+    window = viewer()
+    window.setHistory(bench.history())
+    presets = range(1, window.range_preset.count() - 1)  # skip All Time and Custom
+    bench.info["presets"] = len(presets)
+    for _ in bench.repeats():
+        with bench.timer():
+            for index in presets:
+                window.range_preset.setCurrentIndex(index)
+                window.table_view.viewport().repaint()
+        window.range_preset.setCurrentIndex(0)
+
+
+@case("playlist_uris")
+def playlist_uris(bench):
+    """Create Playlist from every result: the distinct track URIs of the whole history, in order."""
+    df = bench.history()
+    rows = np.arange(len(df))
+    for _ in bench.repeats():
+        with bench.timer():
+            uris = unique_track_uris(df, track_rows(df, rows))
+    bench.info["tracks"] = len(uris)
+
+
+@case("playlist_upload", api=True)
+def playlist_upload(bench):
+    """Create a playlist and add up to PLAYLIST_UPLOAD_TRACKS tracks through the stub Web API."""
+    from benchmarks.stub_server import stub_spotify
+    from spotify_client import PRIORITY_BULK, PlaylistEngine, RequestScheduler, SpotifyClient, make_http_session
+
+    df = bench.history()
+    uris = unique_track_uris(df, track_rows(df, np.arange(len(df))))[:PLAYLIST_UPLOAD_TRACKS]
+    if not uris:
+        bench.skipped = "the export has no track URIs"
+        return
+    # Unthrottled, so the time is our request path rather than the rate limiter's sleeps.
+    scheduler = RequestScheduler(rate=1e6, burst=1e6)
+    client = SpotifyClient(stub_spotify(bench.api_url, make_http_session()), scheduler=scheduler)
+    engine = PlaylistEngine(client)
+    client.current_user()
+    bench.info["tracks"] = len(uris)
+    for i in bench.repeats():
+        with bench.timer():
+            playlist_id = engine.find_or_create(f"Benchmark {i}")
+            engine.add_tracks(playlist_id, uris, priority=PRIORITY_BULK)
+            engine.playlist_index(refresh=True)
+
+
+def run_case(name, paths, repeat, api_url=None):
+    """Run one case in this process and return its result dict."""
+    fn, window, api = CASES[name]
+    if api and not api_url:
+        raise ValueError(f"{name} needs the stub API URL")
+    bench = Bench(paths, repeat, api_url)
+    fn(bench)
+    result = {"case": name, "seconds": bench.seconds, "setup_rss": bench.setup_rss, "peak_rss": peak_rss(),
+              "info": bench.info}
+    if bench.skipped:
+        result["skipped"] = bench.skipped
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.cases", description="Run one benchmark case.")
+    parser.add_argument("case", choices=sorted(CASES))
+    parser.add_argument("data_dir", help="directory of export files, e.g. from benchmarks.generate")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--api-url", help="base URL of a running stub API (benchmarks.stub_server)")
+    args = parser.parse_args(argv)
+    paths = sorted(glob.glob(os.path.join(args.data_dir, "*.json")))
+    if not paths:
+        parser.error(f"no export files in {args.data_dir}")
+    print(json.dumps(run_case(args.case, paths, args.repeat, args.api_url)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Deterministic synthetic Spotify streaming history for the benchmarks.
+
+Writes export files in either schema the viewer reads: the extended
+streaming history ("Streaming_History_Audio_*.json") or the account-data
+download ("StreamingHistory_music_*.json"). Tracks are played with Zipf
+distributed popularity and assigned to Zipf distributed artists, so a few of
+them account for most plays as in a real library. The same (plays, schema,
+seed) always produces byte-identical files.
+
+    python -m benchmarks.generate OUT_DIR --plays 1m --schema legacy
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+SCHEMAS = ("extended", "legacy")
+EXTENDED_FILE_PLAYS = 16000  # about where Spotify splits extended exports
+LEGACY_FILE_PLAYS = 10000
+TRACK_ZIPF = 1.1
+ARTIST_ZIPF = 1.0
+SKIP_RATE = 0.22
+EPISODE_RATE = 0.02  # share of extended-schema plays that are podcast episodes
+UNKNOWN_SKIP_SHARE = 0.3  # the oldest plays have "skipped": null, as in real exports
+HISTORY_END = np.datetime64("2025-01-01T00:00:00", "s")
+PLAYS_PER_DAY = 40
+MAX_HISTORY_DAYS = 12 * 365
+
+# Relative listening per hour of the day: quiet at night, peaking in the evening.
+HOUR_WEIGHTS = (3, 2, 1, 1, 1, 1, 2, 4, 6, 7, 7, 8, 9, 8, 8, 8, 9, 10, 11, 12, 12, 11, 8, 5)
+WORDS = (
+    "Midnight", "Summer", "Echo", "Golden", "River", "Neon", "Heart", "Ghost", "Paper", "Silver",
+    "Fire", "Ocean", "Static", "Velvet", "Wild", "Blue", "Electric", "Lost", "Young", "Broken",
+    "City", "Light", "Dream", "Shadow", "Sugar", "Thunder", "Glass", "Honey", "Desert", "Satellite",
+    "Love", "Night", "Storm", "Island", "Fever", "Mirror", "Highway", "Crystal", "Rain", "Moon",
+    "Wolves", "Kings", "Parade", "Machine", "Garden", "Empire", "Signal", "Bloom", "Horizon", "Tide",
+    "Café", "Noël", "Sueño", "Größe", "Zoë", "Mañana", "夜明け", "東京", "Ça Va", "Señorita",
+    "Remix", "Live", "Acoustic", "Forever", "Again", "Tonight", "Home", "Alone", "Together", "Gone",
+    "Run", "Dance", "Fall", "Rise", "Burn", "Fade", "Shine", "Wait", "Breathe", "Hold",
+)
+BASE62 = np.frombuffer(b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz", dtype=np.uint8)
+PLATFORMS = (
+    "Android OS 13 API 33 (samsung, SM-S911B)",
+    "iOS 17.1.2 (iPhone15,3)",
+    "Windows 10 (10.0.19045; x64; AppX)",
+    "OS X 14.1.1 [arm 2]",
+    "web_player windows 10;chrome 119.0.0.0;desktop",
+)
+PLATFORM_WEIGHTS = (0.45, 0.25, 0.15, 0.1, 0.05)
+COUNTRIES = ("SE", "SE", "SE", "DE", "US")
+REASONS_START = ("trackdone", "fwdbtn", "clickrow", "playbtn", "appload")
+REASONS_START_WEIGHTS = (0.6, 0.2, 0.12, 0.05, 0.03)
+
+
+def parse_plays(value):
+    """Parse a play count such as "10000", "100k" or "10m"."""
+    text = str(value).strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    if scale != 1:
+        text = text[:-1]
+    try:
+        plays = int(float(text) * scale)
+    except ValueError:
+        raise ValueError(f"invalid play count: {value!r}")
+    if plays <= 0:
+        raise ValueError(f"invalid play count: {value!r}")
+    return plays
+
+
+def format_plays(plays):
+    for suffix, scale in (("m", 1000000), ("k", 1000)):
+        if plays >= scale and plays % scale == 0:
+            return f"{plays // scale}{suffix}"
+    return str(plays)
+
+
+def _zipf(rng, n, size, exponent):
+    """size ranks in [0, n) drawn with probability proportional to 1 / (rank + 1) ** exponent."""
+    cdf = np.cumsum(1.0 / np.arange(1, n + 1) ** exponent)
+    return np.minimum(np.searchsorted(cdf, rng.random(size) * cdf[-1], side="right"), n - 1)
+
+
+def _names(rng, count, min_words, max_words):
+    lengths = rng.integers(min_words, max_words + 1, count).tolist()
+    words = rng.integers(0, len(WORDS), (count, max_words)).tolist()
+    return [" ".join(WORDS[w] for w in row[:n]) for row, n in zip(words, lengths)]
+
+
+def _ids(rng, count):
+    """count random 22-character base62 ids, the shape of Spotify ids."""
+    chars = BASE62[rng.integers(0, len(BASE62), (count, 22))]
+    return [value.decode("ascii") for value in chars.view("S22").ravel()]
+
+
+class Catalog:
+    """Artists, albums, tracks and podcast episodes to draw plays from."""
+
+    def __init__(self, rng, plays):
+        tracks = int(np.clip(plays // 8, 500, 2000000))
+        artists = max(50, tracks // 12)
+        self.artists = _names(rng, artists, 1, 3)
+        self.albums = _names(rng, artists * 3, 1, 3)
+        self.songs = _names(rng, tracks, 1, 4)
+        self.track_ids = _ids(rng, tracks)
+        self.track_artist = _zipf(rng, artists, tracks, ARTIST_ZIPF)
+        self.track_album = self.track_artist * 3 + rng.integers(0, 3, tracks)
+        self.durations = rng.integers(90000, 420000, tracks)
+        shows = _names(rng, 40, 2, 3)
+        self.episodes = [f"{shows[i % len(shows)]} #{i // len(shows) + 1}" for i in range(400)]
+        self.episode_shows = [shows[i % len(shows)] for i in range(400)]
+        self.episode_ids = _ids(rng, 400)
+
+
+class Plays:
+    """The columns of every generated play, oldest first."""
+
+    def __init__(self, rng, catalog, plays, episodes):
+        days = int(np.clip(plays // PLAYS_PER_DAY, 30, MAX_HISTORY_DAYS))
+        start = HISTORY_END - np.timedelta64(days, "D")
+        hours = rng.choice(24, plays, p=np.asarray(HOUR_WEIGHTS) / sum(HOUR_WEIGHTS))
+        seconds = rng.integers(0, days, plays) * 86400 + hours * 3600 + rng.integers(0, 3600, plays)
+        self.ts = start + np.sort(seconds).astype("timedelta64[s]")
+        self.track = _zipf(rng, len(catalog.track_ids), plays, TRACK_ZIPF)
+        self.skipped = rng.random(plays) < SKIP_RATE
+        self.ms_played = np.where(self.skipped, rng.integers(500, 30000, plays), catalog.durations[self.track])
+        self.skip_known = np.arange(plays) >= int(plays * UNKNOWN_SKIP_SHARE)
+        if episodes:
+            self.episode = np.where(rng.random(plays) < EPISODE_RATE,
+                                    rng.integers(0, len(catalog.episodes), plays), -1)
+        else:
+            self.episode = np.full(plays, -1)
+        self.platform = rng.choice(len(PLATFORMS), plays, p=PLATFORM_WEIGHTS)
+        self.country = rng.integers(0, len(COUNTRIES), plays)
+        self.reason_start = rng.choice(len(REASONS_START), plays, p=REASONS_START_WEIGHTS)
+        self.shuffle = rng.random(plays) < 0.4
+        self.offline = rng.random(plays) < 0.05
+
+
+def extended_records(catalog, plays, start, stop):
+    ts = np.datetime_as_string(plays.ts[start:stop], unit="s").tolist()
+    epoch = plays.ts[start:stop].astype(np.int64).tolist()
+    columns = zip(ts, epoch, plays.track[start:stop].tolist(), plays.episode[start:stop].tolist(),
+                  plays.ms_played[start:stop].tolist(), plays.skipped[start:stop].tolist(),
+                  plays.skip_known[start:stop].tolist(), plays.platform[start:stop].tolist(),
+                  plays.country[start:stop].tolist(), plays.reason_start[start:stop].tolist(),
+                  plays.shuffle[start:stop].tolist(), plays.offline[start:stop].tolist())
+    records = []
+    for ts, epoch, track, episode, ms, skipped, known, platform, country, reason, shuffle, offline in columns:
+        is_track = episode < 0
+        artist = catalog.track_artist[track]
+        records.append({
+            "ts": ts + "Z",
+            "platform": PLATFORMS[platform],
+            "ms_played": ms,
+            "conn_country": COUNTRIES[country],
+            "ip_addr": f"192.0.2.{country + 1}",
+            "master_metadata_track_name": catalog.songs[track] if is_track else None,
+            "master_metadata_album_artist_name": catalog.artists[artist] if is_track else None,
+            "master_metadata_album_album_name": catalog.albums[catalog.track_album[track]] if is_track else None,
+            "spotify_track_uri": f"spotify:track:{catalog.track_ids[track]}" if is_track else None,
+            "episode_name": None if is_track else catalog.episodes[episode],
+            "episode_show_name": None if is_track else catalog.episode_shows[episode],
+            "spotify_episode_uri": None if is_track else f"spotify:episode:{catalog.episode_ids[episode]}",
+            "audiobook_title": None,
+            "audiobook_uri": None,
+            "audiobook_chapter_uri": None,
+            "audiobook_chapter_title": None,
+            "reason_start": REASONS_START[reason],
+            "reason_end": "fwdbtn" if skipped else "trackdone",
+            "shuffle": shuffle,
+            "skipped": skipped if known else None,
+            "offline": offline,
+            "offline_timestamp": epoch * 1000 if offline else None,
+            "incognito_mode": False,
+        })
+    return records
+
+
+def legacy_records(catalog, plays, start, stop):
+    # The account-data download has minute resolution and no skip flag.
+    end_times = np.datetime_as_string(plays.ts[start:stop], unit="m").tolist()
+    columns = zip(end_times, plays.track[start:stop].tolist(), plays.ms_played[start:stop].tolist())
+    return [
+        {
+            "endTime": end_time.replace("T", " "),
+            "artistName": catalog.artists[catalog.track_artist[track]],
+            "trackName": catalog.songs[track],
+            "msPlayed": ms,
+        }
+        for end_time, track, ms in columns
+    ]
+
+
+def generate_history(out_dir, plays, schema="extended", seed=0):
+    """Write plays synthetic plays in the given schema to out_dir; returns the file paths."""
+    if schema not in SCHEMAS:
+        raise ValueError(f"unknown schema: {schema!r}")
+    rng = np.random.default_rng([seed, plays])
+    catalog = Catalog(rng, plays)
+    history = Plays(rng, catalog, plays, episodes=schema == "extended")
+    os.makedirs(out_dir, exist_ok=True)
+    per_file = EXTENDED_FILE_PLAYS if schema == "extended" else LEGACY_FILE_PLAYS
+    paths = []
+    for index, start in enumerate(range(0, plays, per_file)):
+        stop = min(plays, start + per_file)
+        if schema == "extended":
+            first, last = (str(ts) for ts in history.ts[[start, stop - 1]].astype("datetime64[Y]"))
+            years = first if first == last else f"{first}-{last}"
+            name = f"Streaming_History_Audio_{years}_{index}.json"
+            records = extended_records(catalog, history, start, stop)
+        else:
+            name = f"StreamingHistory_music_{index}.json"
+            records = legacy_records(catalog, history, start, stop)
+        path = os.path.join(out_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        paths.append(path)
+    return paths
+
+
+def dataset_dir(data_dir, plays, schema="extended", seed=0):
+    return os.path.join(data_dir, f"{schema}-{format_plays(plays)}-seed{seed}")
+
+
+def dataset(data_dir, plays, schema="extended", seed=0):
+    """Paths of a generated history under data_dir, generating it on first use."""
+    out_dir = dataset_dir(data_dir, plays, schema, seed)
+    if not os.path.isdir(out_dir):
+        # Generated aside and renamed, so an interrupted run never leaves a partial set behind.
+        tmp_dir = out_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        generate_history(tmp_dir, plays, schema, seed)
+        os.replace(tmp_dir, out_dir)
+    return sorted(os.path.join(out_dir, name) for name in os.listdir(out_dir) if name.endswith(".json"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.generate",
+                                     description="Write a synthetic Spotify streaming history.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--plays", type=parse_plays, default=parse_plays("100k"),
+                        help="number of plays, e.g. 10k, 2.5m (default: 100k)")
+    parser.add_argument("--schema", choices=SCHEMAS, default="extended")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    paths = generate_history(args.out_dir, args.plays, args.schema, args.seed)
+    print(f"Wrote {args.plays:,} plays to {len(paths)} files in {args.out_dir}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""A local stand-in for the parts of the Spotify Web API the viewer calls.
+
+Benchmarks point spotipy at it, so playlist and metadata code runs its real
+request path (spotipy, the shared requests session, the scheduler) without
+network variance, rate limits or credentials. It enforces the same batch
+limits as Spotify (100 items per playlist add, 50 ids per tracks lookup) and
+counts requests per endpoint. fail_next() makes it answer with 429s (with a
+Retry-After) or server errors, to exercise the client's retry handling.
+
+    python -m benchmarks.stub_server --port 8900
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+STUB_USER_ID = "benchmark-user"
+STUB_TOKEN = "benchmark-token"
+STUB_PLAYLISTS = 120  # existing playlists the user owns, so the index is paged
+MAX_PLAYLIST_ITEMS = 100
+MAX_TRACK_IDS = 50
+
+
+class StubSpotifyAPI:
+    """Serve the stub API from a background thread on 127.0.0.1.
+
+    latency adds a fixed delay (in seconds) to every response to mimic a
+    network round trip. requests counts the handled requests by route.
+    devices is the device list the player endpoints accept; a command for
+    any other device id gets a 404, as for a device that went offline.
+    """
+
+    def __init__(self, port=0, latency=0.0, playlists=STUB_PLAYLISTS):
+        self.latency = latency
+        self.requests = Counter()
+        self.playlists = [{"id": f"stubplaylist{i:010d}", "name": f"Playlist {i}",
+                           "owner": {"id": STUB_USER_ID}} for i in range(playlists)]
+        self.playlist_items = Counter()
+        self.devices = [{"id": "benchmark-device", "is_active": True, "name": "Benchmark", "type": "Computer"}]
+        self._failures = []  # (status, retry_after) for the next requests, answered before routing
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        # A short poll interval keeps stop() quick; tests start and stop a server per case.
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05},
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail_next(self, status, count=1, retry_after=None):
+        """Answer the next count requests with status (429, or a 5xx) instead of serving them.
+
+        retry_after (seconds, may be fractional) is sent as the Retry-After header.
+        """
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def handle(self, method, path, query, body):
+        """Return (status, JSON-able body or None, extra headers) for one request."""
+        with self._lock:
+            if self._failures:
+                status, retry_after = self._failures.pop(0)
+                headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+                route = "rate limited" if status == 429 else "server error"
+                message = "API rate limit exceeded" if status == 429 else "Service unavailable"
+                return self._count(route, status, _error(status, message), headers)
+            if path == "/v1/me" and method == "GET":
+                return self._count("me", 200, {"id": STUB_USER_ID, "display_name": "Benchmark",
+                                               "product": "premium"})
+            if path == "/v1/me/playlists" and method == "GET":
+                limit = min(int(query.get("limit", 20)), 50)
+                offset = int(query.get("offset", 0))
+                items = self.playlists[offset:offset + limit]
+                more = offset + limit < len(self.playlists)
+                next_url = f"{self.url}/v1/me/playlists?limit={limit}&offset={offset + limit}" if more else None
+                return self._count("playlists", 200, {"items": items, "limit": limit, "offset": offset,
+                                                      "total": len(self.playlists), "next": next_url})
+            if re.fullmatch(r"/v1/(users/[^/]+|me)/playlists", path) and method == "POST":
+                playlist = {"id": f"stubplaylist{len(self.playlists):010d}", "name": body.get("name", ""),
+                            "owner": {"id": STUB_USER_ID}}
+                self.playlists.append(playlist)
+                return self._count("create playlist", 201, playlist)
+            match = re.fullmatch(r"/v1/playlists/([^/]+)/(?:tracks|items)", path)
+            if match and method == "POST":
+                uris = body.get("uris", []) if isinstance(body, dict) else body
+                if len(uris) > MAX_PLAYLIST_ITEMS:
+                    return self._count("add items", 400, _error(400, "Too many items"))
+                self.playlist_items[match.group(1)] += len(uris)
+                return self._count("add items", 201, {"snapshot_id": f"snapshot{sum(self.requests.values())}"})
+            if path == "/v1/tracks" and method == "GET":
+                ids = [track_id for track_id in query.get("ids", "").split(",") if track_id]
+                if len(ids) > MAX_TRACK_IDS:
+                    return self._count("tracks", 400, _error(400, "Too many ids requested"))
+                tracks = [{"id": track_id, "name": f"Track {track_id}", "duration_ms": 200000, "popularity": 50,
+                           "album": {"name": f"Album {track_id[:4]}", "images": []}} for track_id in ids]
+                return self._count("tracks", 200, {"tracks": tracks})
+            if path == "/v1/me/player/devices" and method == "GET":
+                return self._count("devices", 200, {"devices": list(self.devices)})
+            if path in ("/v1/me/player/play", "/v1/me/player/pause", "/v1/me/player/queue"):
+                device_id = query.get("device_id")
+                if device_id is not None and device_id not in {device["id"] for device in self.devices}:
+                    return self._count("player", 404, _error(404, "Device not found"))
+                return self._count("player", 204, None)
+            return self._count("unknown", 404, _error(404, "Service not found"))
+
+    def _count(self, route, status, body, headers=None):
+        self.requests[route] += 1
+        return status, body, headers or {}
+
+
+def _error(status, message):
+    return {"error": {"status": status, "message": message}}
+
+
+def _handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like api.spotify.com
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def _respond(self):
+            parts = urlsplit(self.path)
+            path = parts.path.rstrip("/")  # spotipy asks for "me/"
+            query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                body = {}
+            if api.latency:
+                time.sleep(api.latency)
+            if self.headers.get("Authorization") != f"Bearer {STUB_TOKEN}":
+                status, payload, headers = 401, _error(401, "Invalid access token"), {}
+            else:
+                status, payload, headers = api.handle(self.command, path, query, body)
+            data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def stub_spotify(url, requests_session=None):
+    """A spotipy client that sends every request to the stub API at url."""
+    import spotipy
+
+    sp = spotipy.Spotify(auth=STUB_TOKEN, requests_session=requests_session or True, retries=0)
+    sp.prefix = f"{url}/v1/"
+    return sp
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stub_server",
+                                     description="Serve a stub Spotify Web API on 127.0.0.1.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args(argv)
+    api = StubSpotifyAPI(args.port, args.latency).start()
+    print(f"Stub Spotify API on {api.url}/v1/ (token: {STUB_TOKEN})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Command-line access to Spotify streaming history, without the GUI.
+
+Examples:
+    python history.py query ~/Spotify --artist "Daft Punk" --from 2023-01-01 --top 50 --format csv
+    python history.py query Streaming_History_Audio_*.json --search "live" --format jsonl > live.jsonl
+    python history.py stats ~/Spotify --from 2024-01-01 --to 2024-12-31
+
+Only numpy and pandas are imported (never PyQt5, Pillow or spotipy), and
+results are written to stdout a chunk at a time, so it suits cron jobs and
+pipelines over large archives.
+"""
+import argparse
+import glob
+import os
+import sys
+
+import pandas as pd
+
+from history_core import (
+    EXPORT_FORMATS, HistoryCache, export_chunks, load_history_files, play_summary, select_rows, top_plays,
+    write_frames
+)
+
+
+def expand_paths(paths):
+    """Export files named on the command line; directories contribute their *.json files."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.json"))))
+        else:
+            files.append(path)
+    return files
+
+
+def parse_date(value):
+    try:
+        return pd.Timestamp(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value!r}")
+
+
+def load(args):
+    def report_error(file_path, e):
+        print(f"history: failed to load {file_path}: {e}", file=sys.stderr)
+
+    files = []
+    for file_path in expand_paths(args.files):
+        if os.path.isfile(file_path):
+            files.append(file_path)
+        else:
+            report_error(file_path, "no such file")
+    if not files:
+        sys.exit("history: no history files found")
+
+    cache = None if args.no_cache else HistoryCache()
+    return load_history_files(files, on_error=report_error, cache=cache)
+
+
+def selected_rows(df, args):
+    # --to is an inclusive day, like the viewer's date picker.
+    end = None if args.to is None else args.to.normalize() + pd.Timedelta(days=1)
+    return select_rows(df, args.start, end, artist=args.artist, song=args.song, query=args.search)
+
+
+def query(args):
+    df = load(args)
+    rows = selected_rows(df, args)
+    if args.top:
+        group = "artist" if args.artists else "track"
+        write_frames([top_plays(df, rows, args.top, group, args.by)], sys.stdout, args.format)
+        return
+    if args.limit is not None:
+        if isinstance(rows, slice):
+            rows = slice(rows.start, min(rows.stop, rows.start + args.limit))
+        else:
+            rows = rows[:args.limit]
+    write_frames(export_chunks(df, rows), sys.stdout, args.format, plays=True)
+
+
+def stats(args):
+    df = load(args)
+    summary = play_summary(df, selected_rows(df, args))
+    write_frames([pd.DataFrame([summary])], sys.stdout, args.format)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="history", description="Query Spotify streaming history exports.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("files", nargs="+", help="history JSON files, or directories containing them")
+    common.add_argument("--from", dest="start", type=parse_date, metavar="DATE", help="first day (UTC)")
+    common.add_argument("--to", type=parse_date, metavar="DATE", help="last day (UTC), inclusive")
+    common.add_argument("--artist", help="only plays by this artist (exact, ignoring case)")
+    common.add_argument("--song", help="only plays of this song (exact, ignoring case)")
+    common.add_argument("--search", metavar="TEXT", help="only plays whose song or artist contains TEXT")
+    common.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    common.add_argument("--no-cache", action="store_true", help="parse every file instead of using the cache")
+
+    query_parser = subparsers.add_parser("query", parents=[common], help="list matching plays or the top tracks")
+    query_parser.add_argument("--top", type=int, metavar="N", help="print the N most played tracks instead")
+    query_parser.add_argument("--artists", action="store_true", help="with --top, rank artists instead of tracks")
+    query_parser.add_argument("--by", choices=("plays", "ms"), default="plays", help="with --top, rank by")
+    query_parser.add_argument("--limit", type=int, metavar="N", help="print at most N plays")
+    query_parser.set_defaults(func=query)
+
+    stats_parser = subparsers.add_parser("stats", parents=[common], help="print totals for the matching plays")
+    stats_parser.set_defaults(func=stats)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); silence the flush at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
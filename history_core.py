@@ -0,0 +1,1401 @@
+import codecs
+import hashlib
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Export field -> column name used throughout the viewer.
+HISTORY_FIELDS = {
+    "ts": "Date/Time",
+    "master_metadata_track_name": "Song",
+    "master_metadata_album_artist_name": "Creator",
+    "spotify_track_uri": "Track URI",
+    "skipped": "Skipped",
+    "ms_played": "Played (ms)",
+}
+
+# The older account-data export ("StreamingHistory*.json") names its fields
+# differently and has no track URI or skip flag.
+LEGACY_FIELDS = {
+    "endTime": "ts",
+    "trackName": "master_metadata_track_name",
+    "artistName": "master_metadata_album_artist_name",
+    "msPlayed": "ms_played",
+}
+
+CHUNK_STRING_COLUMNS = ("Song", "Creator", "Track URI")
+
+HISTORY_CACHE_DIR = ".cache-history"
+HISTORY_CACHE_MAX_BYTES = 512 * 1024 * 1024
+HISTORY_CACHE_VERSION = 4
+
+READ_CHUNK_SIZE = 1 << 20
+PROGRESS_INTERVAL = 0.1  # seconds between progress callbacks while files load
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+class HistoryColumns:
+    """Column buffers filled one streaming-history record at a time.
+
+    Only the fields in HISTORY_FIELDS are kept; records in the legacy schema
+    are renamed through LEGACY_FIELDS first. Repeated strings (the same song
+    or artist played hundreds of times) share a single object, Skipped is
+    packed into a signed byte per play (1/0, -1 for missing) and ms_played into
+    a 64-bit integer (0 when missing). legacy flags the records that came in
+    the legacy schema.
+    """
+
+    def __init__(self):
+        self.ts = []
+        self.song = []
+        self.creator = []
+        self.uri = []
+        self.skipped = array("b")
+        self.ms_played = array("q")
+        self.legacy = array("b")
+        self._strings = {}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def _intern(self, value):
+        if value is None:
+            return None
+        return self._strings.setdefault(value, value)
+
+    def append(self, record):
+        is_legacy = "ts" not in record and "endTime" in record
+        if is_legacy:
+            record = {field: record.get(legacy) for legacy, field in LEGACY_FIELDS.items()}
+        self.legacy.append(is_legacy)
+        self.ts.append(record.get("ts"))
+        self.song.append(self._intern(record.get("master_metadata_track_name")))
+        self.creator.append(self._intern(record.get("master_metadata_album_artist_name")))
+        self.uri.append(self._intern(record.get("spotify_track_uri")))
+        skipped = record.get("skipped")
+        self.skipped.append(-1 if skipped is None else int(bool(skipped)))
+        ms_played = record.get("ms_played")
+        self.ms_played.append(int(ms_played) if isinstance(ms_played, (int, float)) and ms_played > 0 else 0)
+
+    def truncate(self, size):
+        """Drop everything appended after the first `size` records."""
+        del self.ts[size:]
+        del self.song[size:]
+        del self.creator[size:]
+        del self.uri[size:]
+        del self.skipped[size:]
+        del self.ms_played[size:]
+        del self.legacy[size:]
+
+    def to_chunk(self):
+        """Pack the buffers into a compact, picklable columnar chunk sorted by time.
+
+        Timestamps become datetime64[ns] (UTC, NaT last) and the string columns
+        are dictionary encoded as (int32 codes, unique values) with -1 for null.
+        "Key" and "Minute Key" hold each play's play_keys() hashes.
+        """
+        ts = pd.to_datetime(pd.Series(self.ts, dtype=object), errors="coerce", utc=True, format="ISO8601")
+        ts = ts.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+        order = np.argsort(ts, kind="stable")
+        chunk = {"Date/Time": ts[order]}
+        for name, values in zip(CHUNK_STRING_COLUMNS, (self.song, self.creator, self.uri)):
+            codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+            chunk[name] = (codes.astype(np.int32)[order], np.asarray(uniques, dtype=object))
+        chunk["Skipped"] = np.frombuffer(self.skipped, dtype=np.int8)[order]
+        chunk["Played (ms)"] = np.frombuffer(self.ms_played, dtype=np.int64)[order]
+        legacy = np.frombuffer(self.legacy, dtype=np.int8)[order].astype(bool)
+        chunk["Key"], chunk["Minute Key"] = play_keys(chunk["Date/Time"], chunk["Song"], chunk["Creator"],
+                                                      chunk["Track URI"], chunk["Played (ms)"], legacy)
+        return chunk
+
+
+def play_keys(ts, song, creator, uri, ms_played, legacy):
+    """Hash each play to a pair of uint64s: (key, minute key).
+
+    The key identifies a play within its own schema. Extended rows use their
+    exact end time and track URI (song and creator for rows without one), so
+    distinct plays in the same minute stay apart. The minute key is the end
+    time truncated to the minute, ms_played, and song and creator (the URI for
+    rows without a song), which is all the legacy export has; it is only used
+    to match legacy rows against extended ones. Legacy rows use it as their
+    key too, so for them the two are equal. The string columns are (codes,
+    uniques) pairs as in to_chunk().
+    """
+    # Build and hash the track string once per distinct (song, creator, uri) code triple.
+    sizes = [len(column[1]) + 1 for column in (song, creator, uri)]
+    codes = [np.asarray(column[0], dtype=np.int64) + 1 for column in (song, creator, uri)]
+    triples, distinct = pd.factorize((codes[0] * sizes[1] + codes[1]) * sizes[2] + codes[2])
+    song_codes, rest = np.divmod(distinct, sizes[1] * sizes[2])
+    creator_codes, uri_codes = np.divmod(rest, sizes[2])
+    songs, creators, uris = (
+        np.append(None, np.asarray(column[1], dtype=object))[column_codes]
+        for column, column_codes in ((song, song_codes), (creator, creator_codes), (uri, uri_codes))
+    )
+    names = [f"{s}\x1f{c or ''}" if s is not None else None for s, c in zip(songs, creators)]
+    tracks = np.array([u or n or "" for n, u in zip(names, uris)], dtype=object)
+    minute_tracks = np.array([n or u or "" for n, u in zip(names, uris)], dtype=object)
+    minutes = np.asarray(ts, dtype="datetime64[m]").astype(np.int64)
+    minute_keys = _combine_hashes(pd.util.hash_array(minutes),
+                                  pd.util.hash_array(np.asarray(ms_played, dtype=np.int64)),
+                                  pd.util.hash_array(minute_tracks)[triples])
+    exact = np.asarray(ts, dtype="datetime64[ns]").astype(np.int64)
+    keys = _combine_hashes(pd.util.hash_array(exact), pd.util.hash_array(tracks)[triples])
+    keys = np.where(legacy, minute_keys, keys)
+    return keys, minute_keys
+
+
+def _combine_hashes(first, *rest):
+    keys = first
+    for part in rest:
+        keys = keys * np.uint64(0x100000001B3) ^ part
+    return keys
+
+
+def normalize_track_uri(uri):
+    if uri.startswith("https://open.spotify.com/track/"):
+        m = re.search(r'https://open\.spotify\.com/track/([A-Za-z0-9]+)', uri)
+        if m:
+            return f"spotify:track:{m.group(1)}"
+    return uri
+
+
+def _merge_encoded(parts, normalize=None):
+    """Combine per-chunk (codes, uniques) pairs into one Categorical.
+
+    Only the distinct values are touched: they are optionally normalized and
+    refactorized into a shared category table, and each chunk's codes are
+    remapped through a small lookup array (-1 stays missing).
+    """
+    uniques = np.concatenate([np.asarray(values, dtype=object) for _, values in parts])
+    if normalize is not None:
+        uniques = np.array([normalize(value) for value in uniques], dtype=object)
+    shared_codes, categories = pd.factorize(uniques)
+    codes = []
+    offset = 0
+    for chunk_codes, values in parts:
+        remap = np.append(shared_codes[offset:offset + len(values)], -1)
+        codes.append(remap[chunk_codes])
+        offset += len(values)
+    return np.concatenate(codes), np.asarray(categories, dtype=object)
+
+
+def frame_from_chunks(chunks, rows=None):
+    """Concatenate chunks from to_chunk() into one history frame in timestamp order.
+
+    Song, Creator and Track URI come out as categoricals sharing one string per
+    distinct value, with track URIs normalized once per distinct value,
+    Skipped as a nullable boolean and Played (ms) as int64. rows optionally
+    picks positions (in chunk order) to keep.
+    """
+    chunks = [chunk for chunk in chunks if len(chunk["Date/Time"])]
+    if not chunks:
+        return empty_history_frame()
+    ts = np.concatenate([chunk["Date/Time"] for chunk in chunks])
+    # Each chunk is already sorted, so this stable sort only merges the runs.
+    if rows is None:
+        order = np.argsort(ts, kind="stable")
+    else:
+        rows = np.asarray(rows, dtype=np.int64)
+        order = rows[np.argsort(ts[rows], kind="stable")]
+    df = pd.DataFrame({"Date/Time": pd.Series(ts[order]).dt.tz_localize("UTC")})
+    for name in CHUNK_STRING_COLUMNS:
+        normalize = normalize_track_uri if name == "Track URI" else None
+        codes, categories = _merge_encoded([chunk[name] for chunk in chunks], normalize)
+        df[name] = pd.Categorical.from_codes(codes[order], categories=categories)
+    skipped = np.concatenate([chunk["Skipped"] for chunk in chunks])[order]
+    df["Skipped"] = pd.arrays.BooleanArray(skipped == 1, skipped < 0)
+    df["Played (ms)"] = np.concatenate([chunk["Played (ms)"] for chunk in chunks])[order]
+    return df
+
+
+def empty_history_frame():
+    df = pd.DataFrame({"Date/Time": pd.Series([], dtype="datetime64[ns, UTC]")})
+    for name in CHUNK_STRING_COLUMNS:
+        df[name] = pd.Categorical([], categories=pd.Index([], dtype=object))
+    df["Skipped"] = pd.array([], dtype="boolean")
+    df["Played (ms)"] = np.array([], dtype=np.int64)
+    return df
+
+
+class PlayKeySet:
+    """Sorted sets of the play_keys() of every play in a history frame.
+
+    Holds the key of every play, plus the minute key of every extended play
+    so that legacy plays can be matched against them. Lives as long as the
+    frame it describes, so each merge only hashes the incoming plays;
+    membership and insertion are binary searches on sorted uint64 arrays.
+    The keys of each export file are computed once and kept in its
+    HistoryCache entry.
+    """
+
+    def __init__(self):
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._minute_keys = np.zeros(0, dtype=np.uint64)
+
+    @classmethod
+    def from_arrays(cls, keys, minute_keys):
+        """A set holding arrays that must already be sorted and distinct (e.g. saved .arrays)."""
+        key_set = cls()
+        key_set._keys = keys
+        key_set._minute_keys = minute_keys
+        return key_set
+
+    @property
+    def arrays(self):
+        """(keys, minute keys of extended plays) as sorted uint64 arrays."""
+        return self._keys, self._minute_keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def missing(self, keys, minute_keys):
+        """Boolean mask of the plays, given by their play_keys(), that are not in the set.
+
+        An extended play is present if its key is, or if its minute key
+        matches a legacy play; a legacy play if its key matches a legacy play
+        or the minute key of an extended one.
+        """
+        legacy = keys == minute_keys
+        found = _contains(self._keys, keys) | _contains(self._keys, minute_keys)
+        found[legacy] |= _contains(self._minute_keys, keys[legacy])
+        return ~found
+
+    def add(self, keys, minute_keys):
+        """Add plays given by their play_keys(); they must not be in the set yet."""
+        self._keys = _insert_keys(self._keys, keys)
+        self._minute_keys = _insert_keys(self._minute_keys, minute_keys[keys != minute_keys])
+
+
+def _contains(sorted_keys, keys):
+    positions = np.searchsorted(sorted_keys, keys)
+    found = positions < len(sorted_keys)
+    found[found] = sorted_keys[positions[found]] == keys[found]
+    return found
+
+
+def _insert_keys(sorted_keys, keys):
+    keys = np.sort(keys)
+    keys = keys[_first_of_runs(keys) & ~_contains(sorted_keys, keys)]
+    return np.insert(sorted_keys, np.searchsorted(sorted_keys, keys), keys)
+
+
+def _first_of_runs(values):
+    """Mask of the elements of sorted values that differ from their predecessor."""
+    mask = np.ones(len(values), dtype=bool)
+    mask[1:] = values[1:] != values[:-1]
+    return mask
+
+
+def merge_history(df, keys, chunks):
+    """Merge chunks from to_chunk() into the sorted frame df, skipping plays it already has.
+
+    keys is the PlayKeySet of df and is updated in place; duplicates within
+    the chunks themselves are dropped too. The new plays are sorted among
+    themselves and inserted at their searchsorted positions in df, so the
+    existing rows are copied once rather than re-sorted. Returns (merged
+    frame, number of plays added).
+    """
+    chunks = [chunk for chunk in chunks if len(chunk["Date/Time"])]
+    if not chunks:
+        return df, 0
+    first, first_keys, first_minute_keys = new_plays(keys, chunks)
+    if not len(first):
+        return df, 0
+    new = frame_from_chunks(chunks, rows=first)
+    merged = _insert_sorted(df, new) if len(df) else new
+    keys.add(first_keys, first_minute_keys)
+    return merged, len(new)
+
+
+def new_plays(keys, chunks):
+    """Return (rows, play keys, minute keys) of the plays in chunks that the PlayKeySet keys lacks.
+
+    rows are ascending positions in the concatenated chunks, one per distinct
+    play (its first occurrence), ready for frame_from_chunks(chunks, rows).
+    A legacy play that matches an extended play in the chunks is dropped in
+    favour of the extended one, which has the exact time and the track URI.
+    """
+    chunk_keys = np.concatenate([chunk["Key"] for chunk in chunks])
+    chunk_minute_keys = np.concatenate([chunk["Minute Key"] for chunk in chunks])
+    # A stable sort keeps the first occurrence of each key at the head of its run.
+    order = np.argsort(chunk_keys, kind="stable")
+    first = order[_first_of_runs(chunk_keys[order])]
+    first = first[keys.missing(chunk_keys[first], chunk_minute_keys[first])]
+    first_keys, first_minute_keys = chunk_keys[first], chunk_minute_keys[first]
+    extended = first_keys != first_minute_keys
+    shadowed = ~extended & _contains(np.sort(first_minute_keys[extended]), first_keys)
+    first = np.sort(first[~shadowed])
+    return first, chunk_keys[first], chunk_minute_keys[first]
+
+
+def _insert_sorted(df, new):
+    # Rows of new go after any equal timestamps already in df.
+    at = np.searchsorted(history_times(df), history_times(new), side="right") + np.arange(len(new))
+    take = np.empty(len(df) + len(new), dtype=np.int64)
+    is_new = np.zeros(len(take), dtype=bool)
+    is_new[at] = True
+    take[at] = np.arange(len(df), len(take))
+    take[~is_new] = np.arange(len(df))
+    merged = {}
+    for name in df.columns:
+        if isinstance(df[name].dtype, pd.CategoricalDtype):
+            # Appends the new categories, so the codes of existing rows keep their meaning.
+            combined = union_categoricals(_same_category_dtype(df[name].array, new[name].array))
+        else:
+            combined = pd.concat([df[name], new[name]], ignore_index=True).array
+        merged[name] = combined.take(take)
+    return pd.DataFrame(merged)
+
+
+def _same_category_dtype(*categoricals):
+    """The categoricals with their category tables cast to one dtype, as union_categoricals requires.
+
+    pandas 3 infers str for a table of strings but keeps object for an empty
+    one (a legacy export has no Track URI), so the first non-empty table's
+    dtype wins. Casting keeps every code.
+    """
+    filled = [c.categories.dtype for c in categoricals if len(c.categories)]
+    if not filled:
+        return list(categoricals)
+    dtype = filled[0]
+    return [c if c.categories.dtype == dtype else c.rename_categories(c.categories.astype(dtype))
+            for c in categoricals]
+
+
+def track_rows(df, rows):
+    """Return the subset of rows (frame positions) that point at a Spotify track."""
+    rows = np.asarray(rows, dtype=np.int64)
+    column = df["Track URI"]
+    is_track = np.append(column.cat.categories.str.startswith("spotify:track:"), False)
+    return rows[is_track[column.cat.codes.to_numpy()[rows]]]
+
+
+def unique_track_uris(df, rows):
+    """Distinct track URIs of rows, in the order they first appear."""
+    column = df["Track URI"]
+    codes = column.cat.codes.to_numpy()[np.asarray(rows, dtype=np.int64)]
+    codes = codes[codes >= 0]
+    _, first = np.unique(codes, return_index=True)
+    return column.cat.categories[codes[np.sort(first)]].tolist()
+
+
+def history_times(df):
+    """The Date/Time column as naive-UTC datetime64 (NaT last), sharing the frame's memory."""
+    return df["Date/Time"].dt.tz_convert(None).to_numpy()
+
+
+def _utc_datetime64(value, dtype):
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert("UTC").tz_localize(None)
+    return np.datetime64(value.to_datetime64()).astype(dtype)
+
+
+def date_range_bounds(times, start=None, end=None):
+    """Return frame positions (first, last) of the plays in [start, end).
+
+    times comes from history_times(); start and end are anything pd.Timestamp
+    accepts (naive means UTC) or None for an open bound. Both ends are binary
+    searches over the sorted column, so the result is a slice of the frame.
+    """
+    first = 0 if start is None else int(np.searchsorted(times, _utc_datetime64(start, times.dtype)))
+    last = len(times) if end is None else int(np.searchsorted(times, _utc_datetime64(end, times.dtype)))
+    return first, max(first, last)
+
+
+def iter_json_records(f, on_progress=None, chunk_size=READ_CHUNK_SIZE):
+    """Yield the objects of a JSON array (or a lone object) read from binary file f.
+
+    The file is decoded a chunk at a time, so only the record being parsed and
+    the unread tail of the current chunk are held in memory. on_progress is
+    called with the number of bytes read so far after every chunk.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    pos = 0
+    bytes_read = 0
+    eof = False
+    started = False
+
+    while True:
+        pos = _SEPARATORS.match(buf, pos).end()
+        if pos < len(buf):
+            if not started:
+                started = True
+                if buf[pos] == "[":
+                    pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                pos = end
+                yield record
+                continue
+        elif eof:
+            return
+
+        chunk = f.read(chunk_size)
+        bytes_read += len(chunk)
+        eof = not chunk
+        buf = buf[pos:] + text_decoder.decode(chunk, final=eof)
+        pos = 0
+        if on_progress is not None:
+            on_progress(bytes_read)
+
+
+def parse_history_file(path, columns, on_progress=None):
+    """Stream the records of one export file into a HistoryColumns buffer.
+
+    on_progress(bytes_read) may return False to stop early, in which case the
+    records of this file are discarded and False is returned.
+    """
+    start = len(columns)
+    cancelled = False
+
+    def report(bytes_read):
+        nonlocal cancelled
+        if on_progress is not None and on_progress(bytes_read) is False:
+            cancelled = True
+
+    try:
+        with open(path, "rb") as f:
+            for record in iter_json_records(f, report):
+                if isinstance(record, dict):
+                    columns.append(record)
+                if cancelled:
+                    break
+    except Exception:
+        columns.truncate(start)
+        raise
+    if cancelled:
+        columns.truncate(start)
+        return False
+    return True
+
+
+_loader_progress = None
+_loader_cancel = None
+
+
+def _init_loader_worker(progress_queue, cancel_event):
+    global _loader_progress, _loader_cancel
+    _loader_progress = progress_queue
+    _loader_cancel = cancel_event
+
+
+def _load_chunk(index, path):
+    def report(bytes_read):
+        _loader_progress.put((index, bytes_read))
+        return not _loader_cancel.is_set()
+
+    columns = HistoryColumns()
+    if not parse_history_file(path, columns, report):
+        return None
+    return columns.to_chunk()
+
+
+def _parse_in_workers(paths, sizes, on_progress, on_error, max_workers):
+    """Parse paths in a process pool; return their chunks, or None if cancelled."""
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(paths)))
+
+    # Spawn rather than fork: the caller may be a multithreaded Qt process.
+    context = multiprocessing.get_context("spawn")
+    progress_queue = context.Queue()
+    cancel_event = context.Event()
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=context,
+        initializer=_init_loader_worker, initargs=(progress_queue, cancel_event),
+    )
+    futures = {executor.submit(_load_chunk, i, path): i for i, path in enumerate(paths)}
+    chunks = [None] * len(paths)
+    bytes_read = [0] * len(paths)
+    pending = set(futures)
+    cancelled = False
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+            while True:
+                try:
+                    index, count = progress_queue.get_nowait()
+                except queue.Empty:
+                    break
+                bytes_read[index] = max(bytes_read[index], count)
+            for future in done:
+                index = futures[future]
+                bytes_read[index] = sizes[index]
+                try:
+                    chunks[index] = future.result()
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    on_error(paths[index], e)
+            if on_progress is not None and on_progress(sum(bytes_read)) is False:
+                cancelled = True
+                break
+    finally:
+        if pending:
+            cancel_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        progress_queue.close()
+    return None if cancelled else chunks
+
+
+def _parse_in_process(paths, sizes, on_progress, on_error):
+    """Parse paths one after another in this process, as _parse_in_workers does in a pool.
+
+    Used when a pool could not run anything in parallel, which saves
+    starting the workers and pickling every chunk back from them.
+    """
+    chunks = [None] * len(paths)
+    done = 0
+    last_report = time.monotonic()
+
+    def report(bytes_read):
+        nonlocal last_report
+        now = time.monotonic()
+        if on_progress is None or now - last_report < PROGRESS_INTERVAL:
+            return True
+        last_report = now
+        return on_progress(done + bytes_read)
+
+    for index, path in enumerate(paths):
+        columns = HistoryColumns()
+        try:
+            if not parse_history_file(path, columns, report):
+                return None
+            chunks[index] = columns.to_chunk()
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(path, e)
+        done += sizes[index]
+        if on_progress is not None and on_progress(done) is False:
+            return None
+    return chunks
+
+
+def load_history_chunks(paths, on_progress=None, on_error=None, max_workers=None, cache=None):
+    """Parse export files in parallel worker processes into columnar chunks.
+
+    Each file is parsed in its own process and comes back as a chunk (None
+    for files that failed). A single file, or a single worker, is parsed in
+    the calling process instead. on_progress(bytes_done) is called regularly
+    from the calling thread and may return False to cancel, which stops the
+    workers and returns None. on_error(path, exception) is called for every
+    file that fails to parse; without it the first failure is raised. With a
+    HistoryCache, files already seen are read back from it and only new or
+    changed files are parsed.
+    """
+    sizes = [os.path.getsize(path) for path in paths]
+    chunks = [None] * len(paths)
+    digests = [None] * len(paths)
+    if cache is not None:
+        for i, path in enumerate(paths):
+            try:
+                digests[i], chunks[i] = cache.lookup(path)
+            except OSError:
+                pass  # left to the parser, which reports it through on_error
+    misses = [i for i, chunk in enumerate(chunks) if chunk is None]
+    cached_bytes = sum(sizes) - sum(sizes[i] for i in misses)
+
+    if misses:
+        def report(bytes_read):
+            if on_progress is None:
+                return True
+            return on_progress(cached_bytes + bytes_read)
+
+        workers = min(max_workers or os.cpu_count() or 1, len(misses))
+        if workers > 1:
+            parsed = _parse_in_workers(
+                [paths[i] for i in misses], [sizes[i] for i in misses],
+                report, on_error, workers,
+            )
+        else:
+            parsed = _parse_in_process([paths[i] for i in misses], [sizes[i] for i in misses], report, on_error)
+        if parsed is None:
+            return None
+        for i, chunk in zip(misses, parsed):
+            chunks[i] = chunk
+            if cache is not None and chunk is not None:
+                cache.store(paths[i], digests[i], chunk)
+    if cache is not None:
+        cache.save(keep=digests)
+    return chunks
+
+
+def load_history_frame(paths, on_progress=None, on_error=None, max_workers=None, cache=None):
+    """Load export files (see load_history_chunks) into one sorted frame of distinct plays.
+
+    Returns (frame, its PlayKeySet, number of plays in the files), or None if
+    cancelled. With a HistoryCache the merged frame is cached as well, keyed
+    by the files' content digests in order, so reopening the same files skips
+    parsing and merging altogether.
+    """
+    if not paths:
+        return empty_history_frame(), PlayKeySet(), 0
+    digests = None
+    if cache is not None:
+        try:
+            digests = [cache.digest(path) for path in paths]
+        except OSError:
+            pass  # left to the parser, which reports it through on_error
+        cached = cache.lookup_frame(digests) if digests is not None else None
+        if cached is not None:
+            cache.save(keep=digests + [_frame_entry(digests)])
+            return cached
+    chunks = load_history_chunks(paths, on_progress, on_error, max_workers, cache)
+    if chunks is None:
+        return None
+    parsed = [chunk for chunk in chunks if chunk is not None]
+    keys = PlayKeySet()
+    df, _ = merge_history(empty_history_frame(), keys, parsed)
+    plays = sum(len(chunk["Date/Time"]) for chunk in parsed)
+    if digests is not None and len(parsed) == len(chunks):
+        cache.store_frame(digests, df, keys, plays)
+        cache.save(keep=digests + [_frame_entry(digests)])
+    return df, keys, plays
+
+
+def load_history_files(paths, on_progress=None, on_error=None, max_workers=None, cache=None):
+    """Load export files into one sorted frame of distinct plays (see load_history_frame).
+
+    Returns None if cancelled.
+    """
+    loaded = load_history_frame(paths, on_progress, on_error, max_workers, cache)
+    return None if loaded is None else loaded[0]
+
+
+def _frame_entry(digests):
+    """Cache entry name of the frame merged from files with these content digests, in order."""
+    return "frame-" + hashlib.blake2b("\n".join(digests).encode("ascii"), digest_size=16).hexdigest()
+
+
+def _file_digest(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HistoryCache:
+    """On-disk cache of parsed export files, one columnar entry per file content.
+
+    Each entry is a directory of .npy arrays (memory-mapped on load) plus the
+    string tables of its dictionary-encoded columns. manifest.json maps source
+    paths to entries by size, mtime and content hash, so an untouched file is
+    recognised from its stat alone and a touched or copied one by its hash.
+    Least recently used entries are evicted once the cache exceeds max_bytes.
+    hits/misses count lookup() results. Frames merged from a list of files
+    are cached the same way by store_frame(), under their digests in order.
+    Methods may be called from several threads; use shared_history_cache()
+    so the viewer and its background tasks share one instance and manifest.
+    """
+
+    def __init__(self, path=HISTORY_CACHE_DIR, max_bytes=HISTORY_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._manifest = None
+
+    @property
+    def manifest(self):
+        with self._lock:
+            if self._manifest is None:
+                self._manifest = {"version": HISTORY_CACHE_VERSION, "files": {}, "entries": {}}
+                try:
+                    with open(os.path.join(self.path, "manifest.json"), "r", encoding="utf-8") as f:
+                        manifest = json.load(f)
+                    if manifest.get("version") == HISTORY_CACHE_VERSION:
+                        self._manifest = manifest
+                except (OSError, ValueError):
+                    pass
+            return self._manifest
+
+    def digest(self, path):
+        """Content digest of an export file, hashed only if its size or mtime changed."""
+        with self._lock:
+            path = os.path.abspath(path)
+            st = os.stat(path)
+            files = self.manifest["files"]
+            record = files.get(path)
+            if record and record["size"] == st.st_size and record["mtime_ns"] == st.st_mtime_ns:
+                return record["digest"]
+            digest = _file_digest(path)
+            files[path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "digest": digest}
+            return digest
+
+    def lookup(self, path):
+        """Return (content digest, cached chunk or None) for an export file."""
+        with self._lock:
+            digest = self.digest(path)
+            entries = self.manifest["entries"]
+            if digest not in entries:
+                self.misses += 1
+                return digest, None
+            try:
+                chunk = self._read_entry(digest)
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Dropping unreadable history cache entry {digest}: {e}")
+                self._remove_entry(digest)
+                self.misses += 1
+                return digest, None
+            entries[digest]["used"] = time.time()
+            self.hits += 1
+            return digest, chunk
+
+    def store(self, path, digest, chunk):
+        with self._lock:
+            self._write_entry(digest, chunk, f"for {path}")
+
+    def lookup_frame(self, digests):
+        """Return the cached (frame, PlayKeySet, plays in the files) merged from files with these digests, or None.
+
+        The frame is read into memory rather than mapped, as it outlives the entry.
+        """
+        name = _frame_entry(digests)
+        with self._lock:
+            entries = self.manifest["entries"]
+            if name not in entries:
+                return None
+            try:
+                entry = self._read_entry(name, mmap_mode=None)
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Dropping unreadable history cache entry {name}: {e}")
+                self._remove_entry(name)
+                return None
+            entries[name]["used"] = time.time()
+            plays = entries[name]["plays"]
+        df = pd.DataFrame({"Date/Time": pd.Series(entry["Date/Time"]).dt.tz_localize("UTC")})
+        for column in CHUNK_STRING_COLUMNS:
+            codes, categories = entry[column]
+            df[column] = pd.Categorical.from_codes(codes, categories=categories, validate=False)
+        skipped = entry["Skipped"]
+        df["Skipped"] = pd.arrays.BooleanArray(skipped == 1, skipped < 0)
+        df["Played (ms)"] = entry["Played (ms)"]
+        return df, PlayKeySet.from_arrays(entry["Key"], entry["Minute Key"]), plays
+
+    def store_frame(self, digests, df, keys, plays):
+        """Cache the frame merged from files with these digests, in this order, with its PlayKeySet."""
+        skipped = df["Skipped"].array
+        entry = {
+            "Date/Time": history_times(df),
+            "Skipped": np.where(skipped.isna(), -1, skipped.fillna(False).to_numpy(dtype=bool)).astype(np.int8),
+            "Played (ms)": df["Played (ms)"].to_numpy(dtype=np.int64),
+        }
+        for column in CHUNK_STRING_COLUMNS:
+            entry[column] = (df[column].cat.codes.to_numpy(dtype=np.int32),
+                             np.asarray(df[column].cat.categories, dtype=object))
+        entry["Key"], entry["Minute Key"] = keys.arrays
+        name = _frame_entry(digests)
+        with self._lock:
+            if self._write_entry(name, entry, "for the merged history"):
+                self.manifest["entries"][name]["plays"] = plays
+
+    def _write_entry(self, name, chunk, description):
+        entry_dir = os.path.join(self.path, name)
+        try:
+            os.makedirs(entry_dir, exist_ok=True)
+            strings = {}
+            for column in CHUNK_STRING_COLUMNS:
+                codes, uniques = chunk[column]
+                np.save(os.path.join(entry_dir, f"{_entry_file(column)}.npy"), codes)
+                strings[column] = uniques.tolist()
+            np.save(os.path.join(entry_dir, "ts.npy"), chunk["Date/Time"])
+            np.save(os.path.join(entry_dir, "skipped.npy"), chunk["Skipped"])
+            np.save(os.path.join(entry_dir, "ms_played.npy"), chunk["Played (ms)"])
+            np.save(os.path.join(entry_dir, "keys.npy"), chunk["Key"])
+            np.save(os.path.join(entry_dir, "minute_keys.npy"), chunk["Minute Key"])
+            with open(os.path.join(entry_dir, "strings.json"), "w", encoding="utf-8") as f:
+                json.dump(strings, f, ensure_ascii=False)
+        except OSError as e:
+            logging.error(f"Error writing history cache entry {description}: {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return False
+        size = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+        self.manifest["entries"][name] = {"bytes": size, "used": time.time()}
+        return True
+
+    def save(self, keep=()):
+        """Evict down to max_bytes (never evicting `keep`) and write the manifest."""
+        with self._lock:
+            entries = self.manifest["entries"]
+            total = sum(entry["bytes"] for entry in entries.values())
+            for digest in sorted(entries, key=lambda d: entries[d]["used"]):
+                if total <= self.max_bytes:
+                    break
+                if digest in keep:
+                    continue
+                total -= entries[digest]["bytes"]
+                self._remove_entry(digest)
+            live = set(entries)
+            self.manifest["files"] = {
+                path: record for path, record in self.manifest["files"].items() if record["digest"] in live
+            }
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                tmp_path = os.path.join(self.path, "manifest.json.tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.manifest, f)
+                os.replace(tmp_path, os.path.join(self.path, "manifest.json"))
+            except OSError as e:
+                logging.error(f"Error saving history cache manifest: {e}")
+
+    def clear(self):
+        """Delete the whole cache. Returns False if there was nothing to delete."""
+        with self._lock:
+            self._manifest = None
+            if not os.path.exists(self.path):
+                return False
+            shutil.rmtree(self.path, ignore_errors=True)
+            return True
+
+    def _read_entry(self, name, mmap_mode="r"):
+        entry_dir = os.path.join(self.path, name)
+        with open(os.path.join(entry_dir, "strings.json"), "r", encoding="utf-8") as f:
+            strings = json.load(f)
+        chunk = {
+            "Date/Time": np.load(os.path.join(entry_dir, "ts.npy"), mmap_mode=mmap_mode),
+            "Skipped": np.load(os.path.join(entry_dir, "skipped.npy"), mmap_mode=mmap_mode),
+            "Played (ms)": np.load(os.path.join(entry_dir, "ms_played.npy"), mmap_mode=mmap_mode),
+            "Key": np.load(os.path.join(entry_dir, "keys.npy"), mmap_mode=mmap_mode),
+            "Minute Key": np.load(os.path.join(entry_dir, "minute_keys.npy"), mmap_mode=mmap_mode),
+        }
+        for column in CHUNK_STRING_COLUMNS:
+            codes = np.load(os.path.join(entry_dir, f"{_entry_file(column)}.npy"), mmap_mode=mmap_mode)
+            chunk[column] = (codes, np.array(strings[column], dtype=object))
+        return chunk
+
+    def _remove_entry(self, digest):
+        self.manifest["entries"].pop(digest, None)
+        shutil.rmtree(os.path.join(self.path, digest), ignore_errors=True)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def shared_history_cache():
+    """The process-wide HistoryCache in HISTORY_CACHE_DIR, created on first use from any thread."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = HistoryCache()
+        return _shared_cache
+
+
+def _entry_file(column):
+    return column.lower().replace(" ", "_")
+
+
+class SearchIndex:
+    """Case-insensitive substring search over the distinct Song and Creator values.
+
+    A query is matched against the casefolded categories only; matching
+    values are mapped back to rows through each column's category codes. When
+    a query extends the previous one, only the previous matches are rescanned.
+    """
+
+    COLUMNS = ("Song", "Creator")
+
+    def __init__(self, df):
+        self._codes = []
+        self._keys = []
+        for name in self.COLUMNS:
+            self._codes.append(df[name].cat.codes.to_numpy())
+            self._keys.append([str(value).casefold() for value in df[name].cat.categories])
+        self._last_query = None
+        self._last_matches = None
+        self._last_rows = None
+
+    def search(self, query):
+        """Return the sorted row positions whose Song or Creator contains query."""
+        query = query.casefold()
+        narrowing = self._last_query is not None and self._last_query in query
+        matches = []
+        for i, keys in enumerate(self._keys):
+            candidates = self._last_matches[i] if narrowing else range(len(keys))
+            matches.append(np.array([k for k in candidates if query in keys[k]], dtype=np.int64))
+
+        rows = self._last_rows if narrowing else None
+        mask = None
+        for codes, keys, matched in zip(self._codes, self._keys, matches):
+            hit = np.zeros(len(keys) + 1, dtype=bool)  # extra slot for code -1 (missing)
+            hit[matched] = True
+            column_codes = codes if rows is None else codes[rows]
+            column_mask = hit[column_codes]
+            mask = column_mask if mask is None else mask | column_mask
+        rows = np.flatnonzero(mask) if rows is None else rows[mask]
+
+        self._last_query = query
+        self._last_matches = matches
+        self._last_rows = rows
+        return rows
+
+
+SORT_COLUMNS = ("Date/Time", "Song", "Creator", "Skipped", "Track URI")
+
+
+class SortOrders:
+    """Row permutations of a history frame sorted by one column, cached per (column, direction).
+
+    Each permutation is a stable np.argsort over an integer key per row:
+    the timestamp, the rank of the casefolded category (computed once per
+    distinct value, not per row) or the skip flag. Ties stay in time order
+    and missing values sort last in both directions. Build a new instance
+    when the frame changes; that is the only invalidation.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._orders = {}
+
+    def order(self, column, descending=False):
+        """Frame positions of every row, ordered by column."""
+        key = (column, descending)
+        if key not in self._orders:
+            self._orders[key] = self._sort(column, descending)
+        return self._orders[key]
+
+    def sort_rows(self, rows, column, descending=False):
+        """Reorder rows (a slice or sorted positions, as from select_rows) by column."""
+        if column == "Date/Time" and not descending:
+            return rows  # frames are kept in time order already
+        order = self.order(column, descending)
+        if isinstance(rows, slice):
+            first, last, _ = rows.indices(len(self.df))
+            if first == 0 and last == len(self.df):
+                return order
+            return order[(order >= first) & (order < last)]
+        keep = np.zeros(len(self.df), dtype=bool)
+        keep[rows] = True
+        return order[keep[order]]
+
+    def _sort(self, column, descending):
+        if column not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {column!r}")
+        if column == "Date/Time":
+            times = history_times(self.df)
+            keys = times.view(np.int64)
+            missing = np.isnat(times)
+        elif column == "Skipped":
+            skipped = self.df["Skipped"].array
+            keys = skipped.fillna(False).to_numpy(dtype=np.int64)
+            missing = skipped.isna()
+        else:
+            values = self.df[column].cat
+            categories = np.asarray(values.categories.str.casefold(), dtype=object)
+            # Values equal after casefolding share a rank, so they tie and stay in time order.
+            _, rank = np.unique(categories, return_inverse=True)
+            rank = np.append(rank.astype(np.int64), 0)  # code -1 (missing), moved last below
+            codes = values.codes.to_numpy()
+            keys = rank[codes]
+            missing = codes < 0
+        keys = -keys if descending else keys.copy()
+        keys[missing] = np.iinfo(np.int64).max
+        return np.argsort(keys, kind="stable")
+
+
+NS_PER_DAY = 86_400_000_000_000
+NS_PER_HOUR = 3_600_000_000_000
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def _day_number(value):
+    """Days since 1970-01-01 (UTC) of a timestamp, or None for an open bound."""
+    if value is None:
+        return None
+    return int(_utc_datetime64(value, "datetime64[D]").astype(np.int64))
+
+
+def _month_number(day):
+    return int(np.datetime64(day, "D").astype("datetime64[M]").astype(np.int64))
+
+
+def track_labels(df):
+    """(songs, creators) indexed by Track URI code, taken from each track's first play."""
+    uri_codes = df["Track URI"].cat.codes.to_numpy()
+    seen, first = np.unique(uri_codes, return_index=True)
+    first = first[seen >= 0]
+    labels = []
+    for name in ("Song", "Creator"):
+        column = df[name].cat
+        values = np.append(np.asarray(column.categories, dtype=object), "")
+        per_track = np.full(len(df["Track URI"].cat.categories), "", dtype=object)
+        per_track[seen[seen >= 0]] = values[column.codes.to_numpy()[first]]
+        labels.append(per_track)
+    return tuple(labels)
+
+
+class HistoryStats:
+    """Listening statistics answered from rollups built once per history frame.
+
+    Plays are aggregated into per-day tables keyed by (day, track), (day,
+    artist) and (day, hour) using the frames' category codes, and the track
+    and artist tables again per month. A query over [start, end) slices the
+    coarsest rollup that lines up with its bounds (both are sorted by period,
+    so the slice is a searchsorted) and sums that slice only; nothing touches
+    the per-play rows after construction. Days are UTC calendar days, and a
+    bound inside a day is truncated to that day's UTC midnight: [start, end)
+    always covers whole days (use select_rows with play_summary / top_plays
+    for exact times). Tracks are keyed by Track URI, so plays without one
+    (podcasts, local files) only count towards the totals.
+    """
+
+    def __init__(self, df):
+        ts = df["Date/Time"]
+        valid = ts.notna().to_numpy()
+        ns = ts.dt.tz_convert(None).to_numpy(dtype="datetime64[ns]").astype(np.int64)[valid]
+        day = (ns // NS_PER_DAY).astype(np.int32)
+        hour = (ns // NS_PER_HOUR % 24).astype(np.int8)
+        track = df["Track URI"].cat.codes.to_numpy()[valid]
+        artist = df["Creator"].cat.codes.to_numpy()[valid]
+        ms = df["Played (ms)"].to_numpy()[valid]
+        skips = df["Skipped"].fillna(False).to_numpy(dtype=bool)[valid]
+        tracked, credited = track >= 0, artist >= 0
+        self.daily_tracks = self._rollup("day", day[tracked], "track", track[tracked], ms[tracked], skips[tracked])
+        self.daily_artists = self._rollup("day", day[credited], "artist", artist[credited], ms[credited],
+                                          skips[credited])
+        self.daily_hours = self._rollup("day", day, "hour", hour, ms, skips)
+        self.monthly_tracks = self._by_month(self.daily_tracks, "track")
+        self.monthly_artists = self._by_month(self.daily_artists, "artist")
+
+        self._track_song, self._track_creator = track_labels(df)
+        self._artists = np.asarray(df["Creator"].cat.categories, dtype=object)
+        self.first_day = int(day.min()) if len(day) else None
+        self.last_day = int(day.max()) if len(day) else None
+
+    @staticmethod
+    def _rollup(period_name, periods, key_name, keys, ms, skips, plays=None):
+        """Sum plays (one per row unless given), ms and skips per (period, key), sorted by both.
+
+        Each pair is packed into one int64, so a single np.unique groups them;
+        this is several times faster than a two-column groupby.
+        """
+        width = int(keys.max()) + 1 if len(keys) else 1
+        pairs, groups = np.unique(periods.astype(np.int64) * width + keys, return_inverse=True)
+        size = len(pairs)
+        return pd.DataFrame({
+            period_name: (pairs // width).astype(periods.dtype),
+            key_name: (pairs % width).astype(keys.dtype),
+            "plays": np.bincount(groups, weights=plays, minlength=size).astype(np.int64),
+            "ms": np.bincount(groups, weights=ms, minlength=size).astype(np.int64),
+            "skips": np.bincount(groups, weights=skips, minlength=size).astype(np.int32),
+        })
+
+    @classmethod
+    def _by_month(cls, daily, key):
+        months = daily["day"].to_numpy().astype("datetime64[D]").astype("datetime64[M]").astype(np.int32)
+        return cls._rollup("month", months, key, daily[key].to_numpy(), daily["ms"].to_numpy(),
+                           daily["skips"].to_numpy(), plays=daily["plays"].to_numpy())
+
+    def _slice(self, daily, monthly, start, end):
+        start_day, end_day = _day_number(start), _day_number(end)
+        table, column, lo, hi = daily, "day", start_day, end_day
+        if monthly is not None and all(
+            day is None or np.datetime64(day, "D") == np.datetime64(day, "D").astype("datetime64[M]")
+            for day in (start_day, end_day)
+        ):
+            table, column = monthly, "month"
+            lo = None if start_day is None else _month_number(start_day)
+            hi = None if end_day is None else _month_number(end_day)
+        periods = table[column].to_numpy()
+        first = 0 if lo is None else np.searchsorted(periods, lo, side="left")
+        last = len(periods) if hi is None else np.searchsorted(periods, hi, side="left")
+        return table.iloc[first:last]
+
+    def summary(self, start=None, end=None):
+        """Totals over [start, end): plays, listening time, skip rate and distinct tracks/artists."""
+        hours = self._slice(self.daily_hours, None, start, end)
+        plays = int(hours["plays"].sum())
+        return {
+            "plays": plays,
+            "ms_played": int(hours["ms"].sum()),
+            "skip_rate": float(hours["skips"].sum()) / plays if plays else 0.0,
+            "tracks": int(self._slice(self.daily_tracks, self.monthly_tracks, start, end)["track"].nunique()),
+            "artists": int(self._slice(self.daily_artists, self.monthly_artists, start, end)["artist"].nunique()),
+        }
+
+    def top_tracks(self, n=10, start=None, end=None, by="plays"):
+        """The n most played tracks in [start, end), ranked by "plays" or "ms"."""
+        totals = self._top(self._slice(self.daily_tracks, self.monthly_tracks, start, end), "track", n, by)
+        codes = totals.index.to_numpy()
+        return pd.DataFrame({
+            "Song": self._track_song[codes],
+            "Creator": self._track_creator[codes],
+            "Plays": totals["plays"].to_numpy(),
+            "Played (ms)": totals["ms"].to_numpy(),
+            "Skip Rate": (totals["skips"] / totals["plays"]).to_numpy(),
+        })
+
+    def top_artists(self, n=10, start=None, end=None, by="plays"):
+        """The n most played artists in [start, end), ranked by "plays" or "ms"."""
+        totals = self._top(self._slice(self.daily_artists, self.monthly_artists, start, end), "artist", n, by)
+        return pd.DataFrame({
+            "Creator": self._artists[totals.index.to_numpy()],
+            "Plays": totals["plays"].to_numpy(),
+            "Played (ms)": totals["ms"].to_numpy(),
+            "Skip Rate": (totals["skips"] / totals["plays"]).to_numpy(),
+        })
+
+    @staticmethod
+    def _top(rollup, key, n, by):
+        totals = rollup.groupby(key, sort=False)[["plays", "ms", "skips"]].sum()
+        return totals.nlargest(n, [by, "plays" if by == "ms" else "ms"])
+
+    def heatmap(self, start=None, end=None, value="plays"):
+        """Weekday x hour (UTC) table of plays (or "ms") in [start, end)."""
+        hours = self._slice(self.daily_hours, None, start, end)
+        days = hours["day"].to_numpy().astype(np.int64)
+        weekday = (days + 3) % 7  # 1970-01-01 was a Thursday
+        grid = np.zeros((7, 24), dtype=np.int64)
+        np.add.at(grid, (weekday, hours["hour"].to_numpy().astype(np.int64)), hours[value].to_numpy())
+        return pd.DataFrame(grid, index=list(WEEKDAYS), columns=range(24))
+
+
+def date_range_presets(first_day, last_day):
+    """Quick [start, end) ranges for a history spanning days first_day..last_day (as on HistoryStats).
+
+    Returns (label, (start, end)) pairs: All Time, the last 30 days and last
+    12 calendar months up to the last played day, and each year in the
+    history, newest first. Bounds are naive UTC midnights; All Time is
+    (None, None), and is the only preset when the history has no dates.
+    """
+    presets = [("All Time", (None, None))]
+    if last_day is None:
+        return presets
+    first = pd.Timestamp(first_day, unit="D")
+    last = pd.Timestamp(last_day, unit="D")
+    end = last + pd.Timedelta(days=1)
+    presets.append(("Last 30 Days", (end - pd.Timedelta(days=30), end)))
+    month = last.to_period("M").to_timestamp()
+    presets.append(("Last 12 Months", (month - pd.DateOffset(months=11), month + pd.DateOffset(months=1))))
+    for year in range(last.year, first.year - 1, -1):
+        presets.append((str(year), (pd.Timestamp(year, 1, 1), pd.Timestamp(year + 1, 1, 1))))
+    return presets
+
+
+EXPORT_CHUNK_ROWS = 65536
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_FILE_FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "parquet": ".parquet"}
+_EXPORT_FIELDS = {column: field for field, column in HISTORY_FIELDS.items()}
+
+
+def select_rows(df, start=None, end=None, artist=None, song=None, query=None, search_index=None):
+    """Positions of the plays in [start, end) that match every given filter.
+
+    artist and song match Creator / Song exactly but ignoring case; query is a
+    SearchIndex substring search (pass the frame's index to reuse it). The
+    date range is two binary searches on the sorted Date/Time column, so
+    without filters the result is a slice of the frame; otherwise it is a
+    sorted array of positions, and only rows inside the range are scanned.
+    """
+    first, last = date_range_bounds(history_times(df), start, end)
+    rows = None
+    if query:
+        rows = (search_index or SearchIndex(df)).search(query)
+        rows = rows[np.searchsorted(rows, first):np.searchsorted(rows, last)]
+    for name, value in (("Creator", artist), ("Song", song)):
+        if value is None:
+            continue
+        column = df[name].cat
+        hit = np.append(np.asarray(column.categories.str.casefold() == value.casefold()), False)
+        codes = column.codes.to_numpy()
+        if rows is None:
+            rows = first + np.flatnonzero(hit[codes[first:last]])
+        else:
+            rows = rows[hit[codes[rows]]]
+    return slice(first, last) if rows is None else rows
+
+
+def top_plays(df, rows=None, n=10, group="track", by="plays"):
+    """The n most played tracks (keyed by Track URI) or artists among rows.
+
+    Counts with np.bincount over the rows' category codes, so any row
+    selection works, not just date ranges (see HistoryStats for those).
+    Columns match HistoryStats.top_tracks / top_artists.
+    """
+    rows = slice(None) if rows is None else rows
+    key = "Track URI" if group == "track" else "Creator"
+    size = len(df[key].cat.categories) + 1  # code -1 (missing) is counted in the last bin
+    codes = df[key].cat.codes.to_numpy()[rows] % size
+    plays = np.bincount(codes, minlength=size)
+    ms = np.bincount(codes, weights=df["Played (ms)"].to_numpy()[rows], minlength=size).astype(np.int64)
+    skips = np.bincount(codes, weights=df["Skipped"].fillna(False).to_numpy(dtype=bool)[rows], minlength=size)
+    plays, ms, skips = plays[:-1], ms[:-1], skips[:-1]
+    # Rank by the chosen measure, breaking ties with the other one.
+    primary, secondary = (ms, plays) if by == "ms" else (plays, ms)
+    order = np.lexsort((-secondary, -primary))
+    order = order[plays[order] > 0][:n]
+    totals = {"Plays": plays[order], "Played (ms)": ms[order], "Skip Rate": skips[order] / plays[order]}
+    if group == "track":
+        songs, creators = track_labels(df)
+        return pd.DataFrame({"Song": songs[order], "Creator": creators[order], **totals})
+    return pd.DataFrame({"Creator": np.asarray(df["Creator"].cat.categories, dtype=object)[order], **totals})
+
+
+def play_summary(df, rows=None):
+    """Totals over rows, with the same keys as HistoryStats.summary()."""
+    rows = slice(None) if rows is None else rows
+    plays = len(df["Played (ms)"].to_numpy()[rows])
+    skips = int(df["Skipped"].fillna(False).to_numpy(dtype=bool)[rows].sum())
+
+    def distinct(name):
+        codes = df[name].cat.codes.to_numpy()[rows]
+        return int(np.count_nonzero(np.bincount(codes[codes >= 0], minlength=1)))
+
+    return {
+        "plays": plays,
+        "ms_played": int(df["Played (ms)"].to_numpy()[rows].sum()),
+        "skip_rate": skips / plays if plays else 0.0,
+        "tracks": distinct("Track URI"),
+        "artists": distinct("Creator"),
+    }
+
+
+def _export_rows(df, rows):
+    if rows is None or isinstance(rows, slice):
+        return range(*(rows or slice(None)).indices(len(df)))
+    return rows
+
+
+def export_chunks(df, rows=None, chunk_rows=EXPORT_CHUNK_ROWS, iso_times=True):
+    """Yield rows (positions, a slice or None for all) of df as frames of at most chunk_rows.
+
+    Only one chunk is materialized at a time. Timestamps are formatted as ISO
+    8601 UTC strings unless iso_times is False. No rows still yield one empty
+    frame, so writers see the columns.
+    """
+    rows = _export_rows(df, rows)
+    for start in range(0, max(len(rows), 1), chunk_rows):
+        part = df.iloc[np.asarray(rows[start:start + chunk_rows], dtype=np.int64)]
+        chunk = part.reset_index(drop=True).astype({name: object for name in CHUNK_STRING_COLUMNS})
+        if iso_times:
+            # datetime_as_string is about ten times faster than .dt.strftime.
+            times = history_times(part)
+            iso = np.char.add(np.datetime_as_string(times, unit="s"), "Z").astype(object)
+            iso[np.isnat(times)] = None
+            chunk["Date/Time"] = iso
+        yield chunk
+
+
+def write_frames(frames, out, fmt="csv", plays=False):
+    """Stream an iterable of DataFrames to the text file out as CSV or JSON lines.
+
+    With plays=True the frames are history rows (see export_chunks) and JSON
+    lines use the export's own field names, so the output can be opened again
+    as a history file. CSV gets the first frame's header even when it has no
+    rows. Returns the number of rows written.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    written = 0
+    header = True
+    for chunk in frames:
+        if fmt == "csv":
+            chunk.to_csv(out, header=header, index=False, lineterminator="\n")
+            header = False
+        else:
+            if plays:
+                chunk = chunk.rename(columns=_EXPORT_FIELDS)
+            if len(chunk):
+                chunk.to_json(out, orient="records", lines=True, force_ascii=False)
+        written += len(chunk)
+    return written
+
+
+def export_file_formats():
+    """Formats export_history() can write here: Parquet needs pyarrow, which is optional."""
+    formats = list(EXPORT_FORMATS)
+    if importlib.util.find_spec("pyarrow") is not None:
+        formats.append("parquet")
+    return formats
+
+
+def _write_parquet(frames, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Fixed up front, so a chunk whose strings are all missing still matches.
+    schema = pa.schema([
+        ("Date/Time", pa.timestamp("ns", tz="UTC")),
+        ("Song", pa.string()),
+        ("Creator", pa.string()),
+        ("Track URI", pa.string()),
+        ("Skipped", pa.bool_()),
+        ("Played (ms)", pa.int64()),
+    ])
+    written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in frames:
+            writer.write_table(pa.Table.from_pandas(chunk[schema.names], schema=schema, preserve_index=False))
+            written += len(chunk)
+    return written
+
+
+def export_history(df, path, fmt="csv", rows=None, on_progress=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write rows of df (as for export_chunks) to the file path as CSV, JSON lines or Parquet.
+
+    The rows are streamed a chunk at a time, so memory use does not grow with
+    the export. on_progress(rows written, total rows) is called after each
+    chunk; returning False cancels. The file is written under a temporary name
+    and renamed once complete, so a cancelled or failed export leaves no
+    partial file behind. Returns the number of rows written, or None if
+    cancelled.
+    """
+    if fmt not in EXPORT_FILE_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    rows = _export_rows(df, rows)
+    total = len(rows)
+    cancelled = False
+
+    def reported(frames):
+        nonlocal cancelled
+        done = 0
+        for chunk in frames:
+            yield chunk
+            done += len(chunk)
+            if on_progress is not None and on_progress(done, total) is False:
+                cancelled = True
+                return
+
+    frames = reported(export_chunks(df, rows, chunk_rows, iso_times=fmt != "parquet"))
+    tmp_path = path + ".part"
+    try:
+        if fmt == "parquet":
+            written = _write_parquet(frames, tmp_path)
+        else:
+            with open(tmp_path, "w", encoding="utf-8", newline="") as out:
+                written = write_frames(frames, out, fmt, plays=True)
+        if cancelled:
+            os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, path)
+        return written
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
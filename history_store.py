@@ -0,0 +1,423 @@
+"""Multi-user history store: one memory-mapped columnar shard per user.
+
+Layout under the store directory:
+
+    store.json               user id -> display name, play count, source files
+    strings/<column>.jsonl   shared, append-only dictionaries (one string per line)
+    users/<id>/*.npy         the user's plays sorted by time, strings as dictionary ids
+
+Song, Creator and Track URI are stored as ids into dictionaries shared by
+every user, so the same artist is the same number in every shard and
+per-shard partial results combine by id. Dictionaries only ever grow, so
+adding a user or files appends to them and rewrites that user's shard only.
+Shards are opened with mmap_mode="r": a shard costs resident memory only
+while it is being read. Cross-user queries run one task per shard in a
+process pool and combine the partial counts.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from history_core import (
+    CHUNK_STRING_COLUMNS, PlayKeySet, date_range_bounds, empty_history_frame, frame_from_chunks, history_times,
+    new_plays
+)
+
+HISTORY_STORE_DIR = "history_store"
+HISTORY_STORE_VERSION = 2
+_KEY_FILES = {"Key": "keys", "Minute Key": "minute_keys"}  # the shard's PlayKeySet arrays
+_SHARD_FILES = {
+    "Date/Time": "ts",
+    "Song": "song",
+    "Creator": "creator",
+    "Track URI": "track_uri",
+    "Skipped": "skipped",
+    "Played (ms)": "ms_played",
+}
+QUERY_GROUPS = ("artist", "track")
+
+
+class StringDictionary:
+    """Append-only table of distinct strings; a string's id is its line number.
+
+    Ids never change, so shards written earlier stay valid as strings are
+    added. categories() is the pd.Index every user's frame shares for this
+    column. Safe to use from several threads: a store is shared by the
+    window and its background tasks.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._strings = None
+        self._ids = None
+        self._categories = None
+
+    def _load(self):
+        with self._lock:
+            if self._strings is None:
+                strings = []
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        strings = [json.loads(line) for line in f if line.strip()]
+                except FileNotFoundError:
+                    pass
+                self._ids = {value: i for i, value in enumerate(strings)}
+                self._strings = strings
+            return self._strings
+
+    def __len__(self):
+        return len(self._load())
+
+    def __getitem__(self, string_id):
+        return self._load()[string_id]
+
+    def encode(self, values):
+        """Ids of values as int32, adding (and appending to disk) the strings not seen before."""
+        with self._lock:
+            self._load()
+            added = [value for value in dict.fromkeys(values) if value not in self._ids]
+            if added:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(value, ensure_ascii=False) + "\n" for value in added))
+                for value in added:
+                    self._ids[value] = len(self._strings)
+                    self._strings.append(value)
+                self._categories = None
+            return np.fromiter((self._ids[value] for value in values), dtype=np.int32, count=len(values))
+
+    def categories(self):
+        with self._lock:
+            if self._categories is None:
+                self._categories = pd.Index(self._load(), dtype=object)
+            return self._categories
+
+
+def _shard_path(shard_dir, column):
+    name = _SHARD_FILES.get(column) or _KEY_FILES.get(column, column)
+    return os.path.join(shard_dir, f"{name}.npy")
+
+
+def open_shard(shard_dir, mmap_mode="r"):
+    """The columns of a shard (read-only memory maps by default), plus its PlayKeySet arrays.
+
+    The key arrays are under "Key" and "Minute Key", as in PlayKeySet.arrays.
+    """
+    return {column: np.load(_shard_path(shard_dir, column), mmap_mode=mmap_mode)
+            for column in (*_SHARD_FILES, *_KEY_FILES)}
+
+
+def _shard_totals(shard_dir, group, start, end):
+    """Per-shard plays and ms_played by artist id or by track URI id within [start, end).
+
+    Runs in a worker process. Returns (sorted keys, plays, ms_played, labels):
+    labels are the keys for artists, and for tracks the (song id, artist id)
+    of each track's first play packed into an int64. Tracks are keyed by URI
+    like HistoryStats and top_plays(), so plays without one are not counted.
+    """
+    ts = np.load(_shard_path(shard_dir, "Date/Time"), mmap_mode="r")
+    first, last = date_range_bounds(ts, start, end)
+    creator = np.load(_shard_path(shard_dir, "Creator"), mmap_mode="r")[first:last]
+    ms_played = np.load(_shard_path(shard_dir, "Played (ms)"), mmap_mode="r")[first:last]
+    if group == "artist":
+        valid = creator >= 0
+        ids = creator[valid]
+        plays = np.bincount(ids)
+        played = np.bincount(ids, weights=ms_played[valid], minlength=len(plays)).astype(np.int64)
+        keys = np.flatnonzero(plays)
+        return keys, plays[keys], played[keys], keys
+    uri = np.load(_shard_path(shard_dir, "Track URI"), mmap_mode="r")[first:last]
+    valid = uri >= 0
+    keys, first_play, groups = np.unique(uri[valid], return_index=True, return_inverse=True)
+    plays = np.bincount(groups, minlength=len(keys))
+    played = np.bincount(groups, weights=ms_played[valid], minlength=len(keys)).astype(np.int64)
+    song = np.load(_shard_path(shard_dir, "Song"), mmap_mode="r")[first:last][valid][first_play]
+    labels = (song.astype(np.int64) << 32) | (creator[valid][first_play].astype(np.int64) & 0xFFFFFFFF)
+    return keys.astype(np.int64), plays, played, labels
+
+
+def _slug(name):
+    return re.sub(r"[^a-z0-9_-]+", "-", name.lower()).strip("-") or "user"
+
+
+class HistoryStore:
+    """Per-user histories kept as memory-mapped shards with shared string dictionaries.
+
+    add_user() and add_chunks() take chunks from load_history_chunks(), so the
+    caller controls parsing (progress, cancellation, HistoryCache). frame()
+    builds a viewer history frame from a shard. combined_counts() and
+    top_artist_overlap() fan out over the shards in a process pool of up to
+    max_workers processes, created on first use and kept until close().
+    """
+
+    def __init__(self, path=HISTORY_STORE_DIR, max_workers=None):
+        self.path = path
+        self.max_workers = max_workers
+        self.dictionaries = {
+            column: StringDictionary(os.path.join(path, "strings", f"{_SHARD_FILES[column]}.jsonl"))
+            for column in CHUNK_STRING_COLUMNS
+        }
+        self._lock = threading.RLock()  # guards the manifest; the window and its tasks share a store
+        self._manifest = None
+        self._executor = None
+
+    @property
+    def manifest(self):
+        with self._lock:
+            if self._manifest is None:
+                self._manifest = {"version": HISTORY_STORE_VERSION, "users": {}}
+                try:
+                    with open(os.path.join(self.path, "store.json"), "r", encoding="utf-8") as f:
+                        manifest = json.load(f)
+                    if manifest.get("version") == HISTORY_STORE_VERSION:
+                        self._manifest = manifest
+                except (OSError, ValueError):
+                    pass
+            return self._manifest
+
+    def users(self):
+        """[(user id, info)] sorted by display name; info has "name", "plays" and "files"."""
+        with self._lock:
+            users = [(user_id, dict(info)) for user_id, info in self.manifest["users"].items()]
+        return sorted(users, key=lambda item: item[1]["name"].lower())
+
+    def user_name(self, user_id):
+        return self.manifest["users"][user_id]["name"]
+
+    def user_labels(self, user_ids):
+        """Display names for user_ids, with the user id added where two names are the same."""
+        names = [self.user_name(user_id) for user_id in user_ids]
+        return [name if names.count(name) == 1 else f"{name} ({user_id})" for name, user_id in zip(names, user_ids)]
+
+    def add_user(self, name, chunks, files=()):
+        """Create a user from parsed chunks; returns the new user id."""
+        user_id = base = _slug(name)
+        suffix = 2
+        with self._lock:
+            while user_id in self.manifest["users"] or os.path.exists(self._shard_dir(user_id)):
+                user_id = f"{base}-{suffix}"
+                suffix += 1
+            self.manifest["users"][user_id] = {"name": name, "plays": 0, "files": []}
+        self.add_chunks(user_id, chunks, files)
+        return user_id
+
+    def add_chunks(self, user_id, chunks, files=()):
+        """Merge parsed chunks into a user's shard, skipping plays it already has.
+
+        Only this user's shard is rewritten. Returns the number of plays added.
+        """
+        info = self.manifest["users"][user_id]
+        chunks = [chunk for chunk in chunks if chunk is not None and len(chunk["Date/Time"])]
+        shard_dir = self._shard_dir(user_id)
+        # Read into memory: the shard directory is replaced below, which maps would pin on Windows.
+        old = open_shard(shard_dir, mmap_mode=None) if os.path.isdir(shard_dir) else None
+        keys = PlayKeySet.from_arrays(old["Key"], old["Minute Key"]) if old is not None else PlayKeySet()
+        added = 0
+        if chunks:
+            rows, row_keys, row_minute_keys = new_plays(keys, chunks)
+            added = len(rows)
+        if added or old is None:
+            new = self._encode(frame_from_chunks(chunks, rows=rows) if added else empty_history_frame())
+            if old is not None:
+                new = _interleave(old, new)
+            if added:
+                keys.add(row_keys, row_minute_keys)
+            new["Key"], new["Minute Key"] = keys.arrays
+            self._write_shard(shard_dir, new)
+            info["plays"] = len(new["Date/Time"])
+        with self._lock:
+            info["files"] = list(dict.fromkeys(info["files"] + [os.path.abspath(path) for path in files]))
+            self._save_manifest()
+        return added
+
+    def remove_user(self, user_id):
+        with self._lock:
+            self.manifest["users"].pop(user_id, None)
+            self._save_manifest()
+        shutil.rmtree(self._shard_dir(user_id), ignore_errors=True)
+
+    def shard(self, user_id):
+        return open_shard(self._shard_dir(user_id))
+
+    def frame(self, user_id):
+        """The user's history as a viewer frame; string columns share the store's categories."""
+        shard = self.shard(user_id)
+        df = pd.DataFrame({"Date/Time": pd.Series(shard["Date/Time"]).dt.tz_localize("UTC")})
+        for column in CHUNK_STRING_COLUMNS:
+            df[column] = pd.Categorical.from_codes(shard[column], categories=self.dictionaries[column].categories())
+        skipped = shard["Skipped"]
+        df["Skipped"] = pd.arrays.BooleanArray(skipped == 1, skipped < 0)
+        df["Played (ms)"] = np.array(shard["Played (ms)"])
+        return df
+
+    def play_keys(self, user_id):
+        shard_dir = self._shard_dir(user_id)
+        return PlayKeySet.from_arrays(*(np.load(_shard_path(shard_dir, column)) for column in _KEY_FILES))
+
+    def combined_counts(self, user_ids, group="artist", start=None, end=None, n=50, by="plays"):
+        """Plays per user and in total for the top n artists or tracks across user_ids.
+
+        Columns: Creator (and Song for tracks), one plays column per user
+        (labelled by user_labels()), Plays and Played (ms) totals. by="ms" ranks by
+        listening time instead of plays. Tracks are keyed by Track URI, as in
+        top_plays(), and labelled from their first play.
+        """
+        keys, plays, played, labels = self._combine(user_ids, group, start, end)
+        total_plays = plays.sum(axis=0)
+        total_played = played.sum(axis=0)
+        rank = total_played if by == "ms" else total_plays
+        top = np.lexsort((keys, -rank))[:n]
+        result = self._labels(labels[top], group)
+        for i, label in enumerate(self.user_labels(user_ids)):
+            result[label] = plays[i, top]
+        result["Plays"] = total_plays[top]
+        result["Played (ms)"] = total_played[top]
+        return result
+
+    def top_artist_overlap(self, user_ids, n=25, start=None, end=None):
+        """Compare the users' top n artists by plays.
+
+        Returns (matrix, shared): matrix counts the artists each pair of users
+        has in common (the diagonal is each user's own count), shared lists
+        the artists in at least two users' top n with how many users have
+        them and their combined plays.
+        """
+        keys, plays, _, _ = self._combine(user_ids, "artist", start, end)
+        names = self.user_labels(user_ids)
+        tops = []
+        for user_plays in plays:
+            played = np.flatnonzero(user_plays)
+            order = np.lexsort((keys[played], -user_plays[played]))[:n]
+            tops.append(played[order])
+        in_top = np.zeros((len(user_ids), len(keys)), dtype=np.int64)
+        for i, top in enumerate(tops):
+            in_top[i, top] = 1
+        matrix = pd.DataFrame(in_top @ in_top.T, index=names, columns=names)
+        users = in_top.sum(axis=0)
+        shared = np.flatnonzero(users >= 2)
+        shared = shared[np.lexsort((-plays.sum(axis=0)[shared], -users[shared]))]
+        result = self._labels(keys[shared], "artist")
+        result["Users"] = users[shared]
+        result["Plays"] = plays.sum(axis=0)[shared]
+        return matrix, result
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _combine(self, user_ids, group, start, end):
+        """Fan _shard_totals() out over the users' shards.
+
+        Returns (keys, plays, ms, labels): plays and ms have a row per user,
+        labels come from the first user with each key.
+        """
+        if group not in QUERY_GROUPS:
+            raise ValueError(f"unknown group: {group!r}")
+        shard_dirs = [self._shard_dir(user_id) for user_id in user_ids]
+        if len(shard_dirs) < 2 or self.max_workers == 1:
+            partials = [_shard_totals(shard_dir, group, start, end) for shard_dir in shard_dirs]
+        else:
+            executor = self._pool()
+            partials = list(executor.map(_shard_totals, shard_dirs, [group] * len(shard_dirs),
+                                         [start] * len(shard_dirs), [end] * len(shard_dirs)))
+        # Keys are dictionary ids shared by every shard, so partials line up by value.
+        keys = np.sort(np.concatenate([partial[0] for partial in partials] + [np.zeros(0, dtype=np.int64)]))
+        keys = keys[np.append(True, keys[1:] != keys[:-1])] if len(keys) else keys
+        plays = np.zeros((len(partials), len(keys)), dtype=np.int64)
+        played = np.zeros((len(partials), len(keys)), dtype=np.int64)
+        labels = np.zeros(len(keys), dtype=np.int64)
+        labelled = np.zeros(len(keys), dtype=bool)
+        for i, (user_keys, user_plays, user_played, user_labels) in enumerate(partials):
+            at = np.searchsorted(keys, user_keys)
+            plays[i, at] = user_plays
+            played[i, at] = user_played
+            new = ~labelled[at]  # the first user with a key labels it
+            labels[at[new]] = user_labels[new]
+            labelled[at] = True
+        return keys, plays, played, labels
+
+    def _labels(self, labels, group):
+        """Label columns for _combine() labels: Creator, and Song first for tracks."""
+        creators = self.dictionaries["Creator"]
+        if group == "artist":
+            return pd.DataFrame({"Creator": [creators[int(label)] for label in labels]})
+        songs = self.dictionaries["Song"]
+        song_ids = (labels >> 32).tolist()
+        creator_ids = (labels & 0xFFFFFFFF).astype(np.int32).tolist()
+        return pd.DataFrame({
+            "Song": [songs[song_id] if song_id >= 0 else "" for song_id in song_ids],
+            "Creator": [creators[creator_id] if creator_id >= 0 else "" for creator_id in creator_ids],
+        })
+
+    def _pool(self):
+        if self._executor is None:
+            max_workers = self.max_workers or os.cpu_count() or 1
+            # Spawn rather than fork: the caller may be a multithreaded Qt process.
+            self._executor = ProcessPoolExecutor(max_workers=max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _encode(self, df):
+        """Shard columns of a history frame, its strings as shared dictionary ids."""
+        columns = {"Date/Time": history_times(df)}
+        for column in CHUNK_STRING_COLUMNS:
+            ids = self.dictionaries[column].encode(df[column].cat.categories.tolist())
+            codes = df[column].cat.codes.to_numpy()
+            columns[column] = np.where(codes >= 0, ids[np.maximum(codes, 0)] if len(ids) else -1, -1).astype(np.int32)
+        skipped = df["Skipped"].array
+        columns["Skipped"] = np.where(skipped.isna(), -1, skipped.fillna(False).to_numpy(dtype=bool)).astype(np.int8)
+        columns["Played (ms)"] = df["Played (ms)"].to_numpy(dtype=np.int64)
+        return columns
+
+    def _write_shard(self, shard_dir, columns):
+        # Written aside and swapped in, so readers never see a half-written shard.
+        tmp_dir = shard_dir + ".tmp"
+        old_dir = shard_dir + ".old"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for column, values in columns.items():
+            np.save(_shard_path(tmp_dir, column), np.ascontiguousarray(values))
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.isdir(shard_dir):
+            os.replace(shard_dir, old_dir)
+        os.replace(tmp_dir, shard_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def _save_manifest(self):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_path = os.path.join(self.path, "store.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, os.path.join(self.path, "store.json"))
+        except OSError as e:
+            logging.error(f"Error saving history store manifest: {e}")
+            raise
+
+    def _shard_dir(self, user_id):
+        return os.path.join(self.path, "users", user_id)
+
+
+def _interleave(old, new):
+    """Merge the sorted shard columns new into old; rows of new go after equal timestamps."""
+    at = np.searchsorted(old["Date/Time"], new["Date/Time"], side="right") + np.arange(len(new["Date/Time"]))
+    total = len(old["Date/Time"]) + len(new["Date/Time"])
+    is_new = np.zeros(total, dtype=bool)
+    is_new[at] = True
+    merged = {}
+    for column in _SHARD_FILES:
+        values = np.empty(total, dtype=new[column].dtype)
+        values[at] = new[column]
+        values[~is_new] = old[column]
+        merged[column] = values
+    return merged
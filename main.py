@@ -1,9 +1,56 @@
 import sys
-from PyQt5.QtWidgets import QApplication
-from streaming_viewer import StreamingHistoryViewer
+import time
+
+PROFILE_FLAG = "--profile-startup"
+PERF_LOG_FLAG = "--perf-log"
+DEFAULT_PERF_LOG = "perf.jsonl"
+
+
+class StartupProfile:
+    """Prints the wall-clock time of each startup phase to stderr as it completes."""
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        print(f"{phase:<32}{(now - self.last) * 1000:8.1f} ms {(now - self.start) * 1000:9.1f} ms total",
+              file=sys.stderr)
+        self.last = now
+
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = StreamingHistoryViewer()
+    profile = StartupProfile() if PROFILE_FLAG in sys.argv else None
+    argv = [arg for arg in sys.argv if arg != PROFILE_FLAG]
+    perf_log = None
+    if PERF_LOG_FLAG in argv:
+        # --perf-log [FILE]: record every timing span as a JSON line.
+        at = argv.index(PERF_LOG_FLAG)
+        has_path = at + 1 < len(argv) and not argv[at + 1].startswith("-")
+        perf_log = argv[at + 1] if has_path else DEFAULT_PERF_LOG
+        del argv[at:at + 1 + has_path]
+
+    def mark(phase):
+        if profile is not None:
+            profile.mark(phase)
+
+    # Imported here so that --profile-startup can time them.
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+    mark("import PyQt5")
+    from spotify_history_viewer import StreamingHistoryViewer
+    mark("import viewer")
+    if perf_log:
+        from perf import recorder
+        recorder.open_log(perf_log)
+
+    app = QApplication(argv)
+    mark("create QApplication")
+    window = StreamingHistoryViewer(profile)
     window.show()
-    sys.exit(app.exec_())
+    mark("show window")
+    QTimer.singleShot(0, lambda: mark("first event loop pass"))
+    status = app.exec_()
+    if perf_log:
+        recorder.close_log()
+    sys.exit(status)
@@ -0,0 +1,188 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+PERF_SAMPLES = 1024  # most recent durations kept per span for the percentiles
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "bytes", "start")
+
+    def __init__(self, recorder, name, nbytes):
+        self.recorder = recorder
+        self.name = name
+        self.bytes = nbytes
+
+    def __enter__(self):
+        self.recorder._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.recorder._stack().pop()
+        self.recorder.record(self.name, elapsed, self.bytes)
+        return False
+
+
+class _NoSpan:
+    """What span() hands out while recording is off: does nothing, accepts .bytes."""
+
+    bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _SpanStats:
+    __slots__ = ("count", "total", "bytes", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.bytes = 0
+        self.samples = deque(maxlen=PERF_SAMPLES)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class PerfRecorder:
+    """Thread-safe timing spans around the app's expensive operations.
+
+    Recording is on only while someone is looking: the performance panel
+    (watch()) or a JSON-lines log (open_log()). While it is off, span()
+    returns a shared no-op context manager, so instrumented code pays for one
+    attribute check. Per span name it keeps the count, total time and bytes,
+    and the last PERF_SAMPLES durations for p50/p95. add_bytes() credits
+    bytes to the innermost span open on the calling thread, which lets the
+    HTTP layer report transfer sizes for whichever call is in progress.
+    Caches register a callback returning their (hits, misses).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._spans = {}
+        self._caches = {}
+        self._watchers = 0
+        self._log = None
+
+    def span(self, name, nbytes=0):
+        """Context manager timing one run of operation `name`; set .bytes on it to report a size."""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, nbytes)
+
+    def record(self, name, seconds, nbytes=0):
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = _SpanStats()
+            stats.count += 1
+            stats.total += seconds
+            stats.bytes += nbytes
+            stats.samples.append(seconds)
+            if self._log is not None:
+                self._write({"t": round(time.time(), 3), "span": name, "ms": round(seconds * 1000, 3),
+                             "bytes": nbytes, "thread": threading.current_thread().name})
+
+    def add_bytes(self, nbytes):
+        if self.enabled:
+            stack = self._stack()
+            if stack:
+                stack[-1].bytes += nbytes
+
+    def add_cache(self, name, counts):
+        """Report a cache in snapshot(); counts() returns its (hits, misses)."""
+        with self._lock:
+            self._caches[name] = counts
+
+    def watch(self, watching):
+        """Count a viewer of the live numbers in or out; recording runs while there is any."""
+        with self._lock:
+            self._watchers = max(0, self._watchers + (1 if watching else -1))
+            self._update()
+
+    def open_log(self, path):
+        """Append every span to path as a JSON line, and a summary when the log is closed."""
+        with self._lock:
+            self._log = open(path, "a", encoding="utf-8", buffering=1)
+            self._update()
+
+    def close_log(self):
+        with self._lock:
+            if self._log is None:
+                return
+        spans, caches = self.snapshot()
+        with self._lock:
+            now = round(time.time(), 3)
+            for entry in spans:
+                self._write({"t": now, "summary": entry.pop("name"), **entry})
+            for entry in caches:
+                self._write({"t": now, "cache": entry.pop("name"), **entry})
+            self._log.close()
+            self._log = None
+            self._update()
+
+    def snapshot(self):
+        """Return (spans, caches) as lists of dicts, spans by total time, most expensive first."""
+        with self._lock:
+            spans = []
+            for name, stats in self._spans.items():
+                ordered = sorted(stats.samples)
+                spans.append({
+                    "name": name,
+                    "count": stats.count,
+                    "p50_ms": _percentile(ordered, 0.5) * 1000,
+                    "p95_ms": _percentile(ordered, 0.95) * 1000,
+                    "total_ms": stats.total * 1000,
+                    "bytes": stats.bytes,
+                })
+            callbacks = list(self._caches.items())
+        spans.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        caches = []
+        for name, counts in callbacks:
+            try:
+                hits, misses = counts()
+            except Exception as e:
+                logging.error(f"Error reading cache statistics for {name}: {e}")
+                continue
+            lookups = hits + misses
+            caches.append({"name": name, "hits": hits, "misses": misses,
+                           "hit_rate": hits / lookups if lookups else None})
+        return spans, caches
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _update(self):
+        self.enabled = bool(self._watchers or self._log is not None)
+
+    def _write(self, entry):
+        try:
+            self._log.write(json.dumps(entry) + "\n")
+        except (OSError, ValueError) as e:
+            logging.error(f"Error writing performance log: {e}")
+
+
+recorder = PerfRecorder()
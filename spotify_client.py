@@ -0,0 +1,413 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+from spotipy.exceptions import SpotifyException
+
+from perf import recorder
+
+TRACKS_BATCH_SIZE = 50  # most ids the Web API's tracks endpoint accepts per call
+METADATA_MAX_ENTRIES = 100000
+DEVICE_TTL = 30.0  # seconds a fetched device list is trusted
+HTTP_POOL_SIZE = 8
+PLAYLIST_ADD_BATCH_SIZE = 100  # most items playlist_add_items accepts per call
+PLAYLISTS_PAGE_SIZE = 50
+
+# Request scheduling. Lower priority values are served first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 5
+PRIORITY_BACKGROUND = 10
+REQUESTS_PER_SECOND = 10.0
+MIN_REQUESTS_PER_SECOND = 0.5
+REQUEST_BURST = 10
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+INTERACTIVE_MAX_WAIT = 10.0  # seconds a user action may wait on throttling before failing
+# Requests that change state on Spotify. If one times out or gets a 5xx it may
+# already have been applied, so it is not retried (a 429 is: Spotify refused it).
+WRITE_METHODS = frozenset({"start_playback", "add_to_queue", "playlist_add_items", "user_playlist_create"})
+
+
+class NoActiveDeviceError(Exception):
+    pass
+
+
+class RateLimitedError(Exception):
+    """Spotify is throttling us and the request could not wait long enough."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Spotify is rate limiting requests; try again in {retry_after:.0f} s.")
+        self.retry_after = retry_after
+
+
+class RequestScheduler:
+    """Central gate that every Spotify Web API request goes through.
+
+    Requests take a token from a token bucket; waiting callers are served by
+    priority, so user actions overtake art and metadata prefetch. A 429 pauses
+    all requests for its Retry-After and halves the refill rate, which then
+    recovers slowly with each success. Server errors and connection failures
+    are retried with jittered exponential backoff, unless the call is marked
+    as not retryable (writes that may have been applied). Callers block in call()
+    until their request has run, so this works from any thread.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=REQUEST_BURST, max_attempts=MAX_ATTEMPTS,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.throttled = 0
+        self.retries = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._refilled = clock()
+        self._paused_until = 0.0
+        self._waiting = []
+        self._order = itertools.count()
+
+    def call(self, fn, *args, priority=PRIORITY_BACKGROUND, max_wait=None, retryable=True, **kwargs):
+        """Run fn(*args, **kwargs) once the scheduler allows it, retrying transient failures.
+
+        max_wait bounds how long throttling may delay the call; past it a
+        RateLimitedError is raised instead of waiting further. With
+        retryable=False only 429 responses are retried.
+        """
+        deadline = None if max_wait is None else self._clock() + max_wait
+        attempt = 0
+        while True:
+            self._acquire(priority, deadline)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                attempt += 1
+                delay = self._retry_delay(e, attempt, retryable)
+                if delay is None or attempt >= self.max_attempts:
+                    raise
+                if deadline is not None and self._clock() + delay > deadline:
+                    raise RateLimitedError(delay) from e
+                self.retries += 1
+                logging.info(f"Retrying Spotify request in {delay:.1f}s after: {e}")
+                if delay:
+                    self._sleep(delay)
+            else:
+                self._on_success()
+                return result
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _acquire(self, priority, deadline):
+        with self._cond:
+            entry = (priority, next(self._order))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = self._clock()
+                    self._refill(now)
+                    wait = max(0.0, self._paused_until - now)
+                    if not wait and self._tokens < 1:
+                        wait = (1 - self._tokens) / self.rate
+                    if not wait and self._waiting[0] == entry:
+                        self._tokens -= 1
+                        heapq.heappop(self._waiting)
+                        self._cond.notify_all()
+                        return
+                    if deadline is not None and now + wait > deadline:
+                        raise RateLimitedError(wait)
+                    # Not our turn yet: wake up when the head takes its token.
+                    self._cond.wait(timeout=wait or None)
+            except BaseException:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def _retry_delay(self, error, attempt, retryable=True):
+        """Seconds to sleep before retrying after error, or None if it should not be retried."""
+        status = getattr(error, "http_status", None)
+        if status == 429:
+            headers = getattr(error, "headers", None) or {}
+            try:
+                retry_after = float(headers.get("Retry-After", 1))
+            except ValueError:
+                retry_after = 1.0
+            with self._cond:
+                self.throttled += 1
+                self._paused_until = max(self._paused_until, self._clock() + retry_after)
+                self.rate = max(MIN_REQUESTS_PER_SECOND, self.rate / 2)
+                self._cond.notify_all()
+            return 0.0  # _acquire() waits out the pause, keeping our place in the queue
+        transient = (status is not None and status >= 500) or isinstance(
+            error, (requests.ConnectionError, requests.Timeout))
+        if retryable and transient:
+            backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+            return backoff * random.uniform(0.5, 1.0)
+        return None
+
+    def _on_success(self):
+        if self.rate < self.max_rate:
+            with self._cond:
+                self.rate = min(self.max_rate, self.rate + 0.1)
+
+
+def _count_response_bytes(response, *args, **kwargs):
+    if recorder.enabled:
+        recorder.add_bytes(len(response.content))
+
+
+def make_http_session(pool_size=HTTP_POOL_SIZE):
+    """A requests.Session whose connection pool is big enough for our worker threads.
+
+    Response sizes are credited to the performance span the request runs in.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(_count_response_bytes)
+    return session
+
+
+class SpotifyClient:
+    """Session-scoped layer over a spotipy client.
+
+    The user profile is fetched once per session and the device list is
+    reused for DEVICE_TTL seconds, so playback commands normally cost a single
+    request. A device command that fails is retried once against a freshly
+    fetched device list. Identical read requests issued concurrently (e.g.
+    from several worker threads) share one HTTP round trip. Every request is
+    run through a RequestScheduler; user actions go at interactive priority.
+    """
+
+    def __init__(self, sp, device_ttl=DEVICE_TTL, scheduler=None, clock=time.monotonic):
+        self.sp = sp
+        self.device_ttl = device_ttl
+        self.scheduler = scheduler or RequestScheduler()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._user = None
+        self._devices = None
+        self._devices_fetched = 0.0
+
+    def _coalesced(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def call(self, method, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """Call a spotipy method by name through the scheduler; WRITE_METHODS are not retried on errors."""
+        max_wait = INTERACTIVE_MAX_WAIT if priority == PRIORITY_INTERACTIVE else None
+        with recorder.span(f"spotify {method}"):
+            return self.scheduler.call(getattr(self.sp, method), *args, priority=priority, max_wait=max_wait,
+                                       retryable=method not in WRITE_METHODS, **kwargs)
+
+    def current_user(self):
+        if self._user is None:
+            self._user = self._coalesced(("current_user",), self.call, "current_user")
+        return self._user
+
+    def is_premium(self):
+        product = self.current_user().get("product", "")
+        return not product or product.lower() == "premium"
+
+    def devices(self, refresh=False):
+        fresh = self._clock() - self._devices_fetched < self.device_ttl
+        if refresh or self._devices is None or not fresh:
+            devices = self._coalesced(("devices",), self.call, "devices").get("devices", [])
+            # An empty list is not kept: the user is probably opening Spotify right now.
+            self._devices = devices or None
+            self._devices_fetched = self._clock()
+            return devices
+        return self._devices
+
+    def _device_command(self, command):
+        devices = self.devices()
+        if not devices:
+            raise NoActiveDeviceError("No active Spotify devices found.")
+        device_id = devices[0]["id"]
+        try:
+            return command(device_id)
+        except SpotifyException:
+            devices = self.devices(refresh=True)
+            if not devices or devices[0]["id"] == device_id:
+                raise
+            return command(devices[0]["id"])
+
+    def play_track(self, track_uri):
+        return self._device_command(lambda device_id: self.call("start_playback", device_id=device_id, uris=[track_uri]))
+
+    def queue_track(self, track_uri):
+        return self._device_command(lambda device_id: self.call("add_to_queue", track_uri, device_id=device_id))
+
+    def resume(self):
+        return self._device_command(lambda device_id: self.call("start_playback", device_id=device_id))
+
+    def pause(self):
+        return self.call("pause_playback")
+
+    def tracks(self, track_ids, priority=PRIORITY_BACKGROUND):
+        return self._coalesced(("tracks", tuple(track_ids)), self.call, "tracks", track_ids, priority=priority)
+
+
+def summarize_track(track):
+    """Keep the parts of a Web API track object the viewer uses."""
+    album = track.get("album") or {}
+    return {
+        "name": track.get("name"),
+        "album": album.get("name"),
+        "images": album.get("images") or [],
+        "duration_ms": track.get("duration_ms"),
+        "popularity": track.get("popularity"),
+    }
+
+
+class TrackMetadataStore:
+    """Thread-safe store of track metadata shared by art display and prefetch.
+
+    claim() hands out the ids that are neither stored nor already being
+    fetched, so overlapping prefetches never request a track twice; fetch()
+    looks them up in batches of TRACKS_BATCH_SIZE. Ids the API does not know
+    are stored as {} so they are not requested again.
+    """
+
+    def __init__(self, max_entries=METADATA_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._tracks = OrderedDict()
+        self._pending = set()
+
+    def get(self, track_id):
+        with self._lock:
+            info = self._tracks.get(track_id)
+            if info is not None:
+                self._tracks.move_to_end(track_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return info
+
+    def claim(self, track_ids):
+        """Return the ids that still need fetching and mark them as in flight."""
+        with self._lock:
+            claimed = []
+            for track_id in dict.fromkeys(track_ids):
+                if track_id not in self._tracks and track_id not in self._pending:
+                    self._pending.add(track_id)
+                    claimed.append(track_id)
+            return claimed
+
+    def fetch(self, sp, track_ids):
+        """Look up track_ids with sp.tracks() in batches and store the results."""
+        track_ids = list(dict.fromkeys(track_ids))
+        try:
+            for start in range(0, len(track_ids), TRACKS_BATCH_SIZE):
+                batch = track_ids[start:start + TRACKS_BATCH_SIZE]
+                tracks = sp.tracks(batch).get("tracks") or []
+                with self._lock:
+                    self.requests += 1
+                    for track_id, track in zip(batch, tracks):
+                        self._tracks[track_id] = summarize_track(track) if track else {}
+                        self._tracks.move_to_end(track_id)
+                    while len(self._tracks) > self.max_entries:
+                        self._tracks.popitem(last=False)
+        finally:
+            with self._lock:
+                self._pending.difference_update(track_ids)
+
+
+class PlaylistEngine:
+    """Playlist operations sized to the Web API's limits.
+
+    The user's own playlists are paged through once and kept as a
+    lowercased name -> id index. Tracks are added in batches of
+    PLAYLIST_ADD_BATCH_SIZE, sent back to back in order: Spotify applies
+    additions in arrival order, so batches are not sent concurrently.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._index = None
+
+    def playlist_index(self, refresh=False):
+        if self._index is None or refresh:
+            user_id = self.client.current_user()["id"]
+            index = {}
+            offset = 0
+            while True:
+                page = self.client.call("current_user_playlists", limit=PLAYLISTS_PAGE_SIZE, offset=offset)
+                for playlist in page["items"]:
+                    owner = (playlist.get("owner") or {}).get("id")
+                    if owner == user_id:
+                        index.setdefault(playlist["name"].lower(), playlist["id"])
+                if not page.get("next"):
+                    break
+                offset += len(page["items"])
+            self._index = index
+        return self._index
+
+    def create(self, name, description="", public=True):
+        user_id = self.client.current_user()["id"]
+        playlist = self.client.call(
+            "user_playlist_create", user=user_id, name=name, public=public, description=description
+        )
+        if self._index is not None:
+            self._index.setdefault(name.lower(), playlist["id"])
+        return playlist["id"]
+
+    def find_or_create(self, name, description="", public=True):
+        playlist_id = self.playlist_index().get(name.lower())
+        if playlist_id is None:
+            playlist_id = self.create(name, description, public)
+        return playlist_id
+
+    def add_tracks(self, playlist_id, track_uris, priority=PRIORITY_INTERACTIVE,
+                   on_progress=None, is_cancelled=None):
+        """Append track_uris in order; returns how many were added.
+
+        on_progress(added, total) is called after every batch and
+        is_cancelled() is checked before each one.
+        """
+        total = len(track_uris)
+        added = 0
+        for start in range(0, total, PLAYLIST_ADD_BATCH_SIZE):
+            if is_cancelled is not None and is_cancelled():
+                break
+            batch = track_uris[start:start + PLAYLIST_ADD_BATCH_SIZE]
+            self.client.call("playlist_add_items", playlist_id, batch, priority=priority)
+            added += len(batch)
+            if on_progress is not None:
+                on_progress(added, total)
+        return added
@@ -1,26 +1,29 @@
 import sys
 import os
 import json
-import re
-import requests
 import webbrowser
-from io import BytesIO
-import pandas as pd
-from PIL import Image, ImageFilter
 import logging
+from collections import OrderedDict
+from numbers import Integral
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit,
     QPushButton, QTableView, QFileDialog, QMessageBox, QLabel, QHeaderView,
-    QDialog, QProgressDialog, QMenuBar, QMenu, QStatusBar
+    QDialog, QProgressDialog, QMenuBar, QMenu, QStatusBar, QComboBox, QTabWidget, QTableWidget,
+    QTableWidgetItem, QDateEdit, QDockWidget, QInputDialog, QListWidget, QListWidgetItem
 )
 from PyQt5.QtGui import (
-    QStandardItemModel, QStandardItem, QPixmap, QImage, QPalette, QBrush
+    QPixmap, QImage, QPalette, QColor, QPainter
+)
+from PyQt5.QtCore import (
+    Qt, QEvent, QDate, QAbstractTableModel, QModelIndex, QTimer, QObject, QRunnable, QThreadPool, pyqtSignal
 )
-from PyQt5.QtCore import Qt, QEvent
 
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+# album_art defers Pillow to the first image. numpy/pandas (history_core) and
+# spotipy/requests (spotify_client) are imported where first needed, so the
+# window can appear before any of them has loaded.
+from album_art import AlbumArtCache, render_album_art
+from perf import recorder
 
 # Configure logging (optional)
 logging.basicConfig(filename="app_debug.log", level=logging.INFO,
@@ -33,20 +36,511 @@ DEFAULT_REDIRECT_URI = "http://localhost:8888/callback"
 
 CONFIG_FILE = "config.json"
 RELEASE_NAME = "WeeWee1.0 The Big Release"
+SEARCH_DEBOUNCE_MS = 200
+ART_WORKERS = 2
+BACKGROUND_BUCKET = 128  # window sizes are rounded up to this before rendering
+BACKGROUND_CACHE_ENTRIES = 8
+RESIZE_DEBOUNCE_MS = 250
+METADATA_PREFETCH_AHEAD = 100  # rows past the bottom of the viewport to prefetch
+METADATA_PREFETCH_DELAY_MS = 150
+STATS_TOP_N = 25
+COMPARE_TOP_N = 50
+PERF_REFRESH_MS = 1000
+
+HISTORY_COLUMNS = ["Date/Time", "Song", "Creator", "Skipped", "Track URI"]
+
+
+class HistoryTableModel(QAbstractTableModel):
+    """Read-only table model backed directly by the columns of a history DataFrame.
+
+    Cells are formatted on demand in data(), so only the rows the view actually
+    paints are ever turned into strings. The categorical columns are read
+    through their codes. Filtering is done by handing the model an array of row
+    positions into the frame, or a slice of it, instead of rebuilding it.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._dates = []
+        self._skipped = []
+        self._labels = {}
+        self._size = 0
+        self._rows = None  # None means rows _first.._first+_count-1 of the frame, in order
+        self._first = 0
+        self._count = 0
+
+    def setFrame(self, df):
+        import numpy as np
+
+        self.beginResetModel()
+        self._size = len(df)
+        self._rows = None
+        self._first = 0
+        self._count = self._size
+        if self._size:
+            self._dates = df["Date/Time"].array
+            self._skipped = df["Skipped"].fillna(False).to_numpy(dtype=bool)
+            self._labels = {}
+            for column in (1, 2, 4):
+                values = df[HISTORY_COLUMNS[column]].cat
+                # A trailing "" so that code -1 (missing) displays as an empty cell.
+                labels = np.append(values.categories.to_numpy(dtype=object), "")
+                self._labels[column] = (values.codes.to_numpy(), labels)
+        self.endResetModel()
+
+    def setRows(self, rows):
+        """Show only the given frame positions (an array or a slice), or every row when rows is None."""
+        import numpy as np
+
+        self.beginResetModel()
+        if rows is None or isinstance(rows, slice):
+            start, stop, _ = (rows or slice(None)).indices(self._size)
+            self._rows = None
+            self._first, self._count = start, max(0, stop - start)
+        else:
+            self._rows = np.asarray(rows, dtype=np.int64)
+        self.endResetModel()
+
+    def viewRows(self):
+        """Frame positions of every view row in order: an array, or a slice when they are contiguous."""
+        if self._rows is not None:
+            return self._rows
+        return slice(self._first, self._first + self._count)
+
+    def sourceRow(self, row):
+        return int(self._rows[row]) if self._rows is not None else self._first + row
+
+    def sourceRows(self, start, stop):
+        """Frame positions of view rows start..stop-1."""
+        import numpy as np
+
+        if self._rows is not None:
+            return self._rows[start:stop]
+        return np.arange(self._first + start, self._first + min(stop, self._count), dtype=np.int64)
+
+    def text(self, row, column):
+        source = self.sourceRow(row)
+        if column == 0:
+            import pandas as pd
+
+            value = self._dates[source]
+            return "" if pd.isna(value) else str(value)
+        if column == 3:
+            return "Yes" if self._skipped[source] else "No"
+        codes, labels = self._labels[column]
+        return labels[codes[source]]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._count if self._rows is None else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HISTORY_COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        return self.text(index.row(), index.column())
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return HISTORY_COLUMNS[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+
+def format_listening_time(ms):
+    hours = ms / 3_600_000
+    if hours >= 1:
+        return f"{hours:,.1f} h"
+    return f"{ms / 60_000:.0f} min"
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:,.0f} {unit}"
+        size /= 1024
+    return f"{size:,.1f} GB"
+
+
+def pil2qimage(im):
+    im = im.convert("RGB")
+    data = im.tobytes("raw", "RGB")
+    # copy() so the QImage owns its pixels once `data` goes away.
+    return QImage(data, im.size[0], im.size[1], im.size[0] * 3, QImage.Format_RGB888).copy()
+
+
+class BackgroundWidget(QWidget):
+    """Central widget that stretches a small blurred album art image over itself when painted.
+
+    Only the small image from render_album_art() is kept; the blur hides the
+    scaling, and a repaint only scales the region being painted.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.background = QPixmap()
+
+    def setBackground(self, pixmap):
+        self.background = pixmap
+        self.update()
+
+    def paintEvent(self, event):
+        if self.background.isNull():
+            return
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawPixmap(self.rect(), self.background)
+
+
+class AlbumArtSignals(QObject):
+    loaded = pyqtSignal(int, object, str, QImage, QImage)  # generation, cache key, song, thumbnail, background
+    failed = pyqtSignal(int, str)
+
+
+class AlbumArtTask(QRunnable):
+    """Fetches and renders album art for one selection on a worker thread.
+
+    The task gives up as soon as the viewer's art generation moves on, i.e.
+    once another row has been selected, so only the latest selection is
+    ever painted.
+    """
+
+    def __init__(self, viewer, generation, track_uri, song, size):
+        super().__init__()
+        self.viewer = viewer
+        self.signals = viewer.art_signals
+        self.generation = generation
+        self.track_uri = track_uri
+        self.song = song
+        self.size = size
+
+    def isCurrent(self):
+        return self.generation == self.viewer.art_generation
+
+    def run(self):
+        if not self.isCurrent():
+            return
+        try:
+            album_art, blurred = self.viewer.fetchAlbumArt(self.track_uri, self.size)
+            if album_art is None or not self.isCurrent():
+                return
+            # The blurred image stays small; BackgroundWidget scales it as it paints.
+            with recorder.span("image convert"):
+                background = pil2qimage(blurred)
+                thumbnail = pil2qimage(album_art)
+            self.signals.loaded.emit(self.generation, (self.track_uri, self.size), self.song,
+                                     thumbnail, background)
+        except Exception as e:
+            logging.error(f"Error fetching album art for {self.track_uri}: {e}")
+            self.signals.failed.emit(self.generation, str(e))
+
+
+class MetadataPrefetchTask(QRunnable):
+    def __init__(self, viewer, track_ids):
+        super().__init__()
+        self.viewer = viewer
+        self.track_ids = track_ids
+
+    def run(self):
+        try:
+            self.viewer.metadata_store.fetch(self.viewer.get_spotify(), self.track_ids)
+        except Exception as e:
+            logging.error(f"Error prefetching track metadata: {e}")
+
+
+class PlaylistSignals(QObject):
+    progress = pyqtSignal(int, int)  # tracks added, total
+    finished = pyqtSignal(str, int, int)  # playlist name, tracks added, total
+    failed = pyqtSignal(str)
+
+
+class PlaylistTask(QRunnable):
+    """Creates a playlist and fills it in batches on a worker thread."""
+
+    def __init__(self, viewer, signals, name, track_uris):
+        super().__init__()
+        self.engine = viewer.playlist_engine
+        self.signals = signals
+        self.name = name
+        self.track_uris = track_uris
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        from spotify_client import PRIORITY_BULK
+
+        try:
+            playlist_id = self.engine.create(self.name, "Created from streaming history")
+            added = self.engine.add_tracks(
+                playlist_id, self.track_uris, priority=PRIORITY_BULK,
+                on_progress=self.signals.progress.emit, is_cancelled=lambda: self.cancelled,
+            )
+            self.signals.finished.emit(self.name, added, len(self.track_uris))
+        except Exception as e:
+            logging.error(f"Playlist creation failed: {e}")
+            self.signals.failed.emit(str(e))
+
+
+class ExportSignals(QObject):
+    progress = pyqtSignal(int, int)  # rows written, total
+    finished = pyqtSignal(str, object)  # path, rows written (None if cancelled)
+    failed = pyqtSignal(str)
+
+
+class ExportTask(QRunnable):
+    """Streams rows of the history to a file on a worker thread (see export_history)."""
+
+    def __init__(self, signals, df, rows, path, fmt):
+        super().__init__()
+        self.signals = signals
+        self.df = df
+        self.rows = rows
+        self.path = path
+        self.fmt = fmt
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        from history_core import export_history
+
+        def report(written, total):
+            self.signals.progress.emit(written, total)
+            return not self.cancelled
+
+        try:
+            with recorder.span(f"export {self.fmt}"):
+                written = export_history(self.df, self.path, self.fmt, self.rows, report)
+            self.signals.finished.emit(self.path, written)
+        except Exception as e:
+            logging.error(f"Export to {self.path} failed: {e}")
+            self.signals.failed.emit(str(e))
+
+
+class SessionSignals(QObject):
+    # history generation, (files, cache, store, frame, play keys, search index, stats)
+    restored = pyqtSignal(int, object)
+    user_loaded = pyqtSignal(int, object)  # history generation, (store, user id, frame, play keys, search index, stats)
+    failed = pyqtSignal(int, str)
+
+
+class SessionRestoreTask(QRunnable):
+    """Reloads the previous session's files on a worker thread.
+
+    The files normally come straight out of the history cache. Everything
+    the window needs is built here, so the main thread only swaps it in.
+    """
+
+    def __init__(self, signals, generation, files):
+        super().__init__()
+        self.signals = signals
+        self.generation = generation
+        self.files = files
+
+    def run(self):
+        try:
+            from history_core import HistoryStats, SearchIndex, load_history_frame, shared_history_cache
+            from history_store import HistoryStore
+
+            def report_error(file_path, e):
+                logging.error(f"Error restoring {file_path}: {e}")
+
+            cache = shared_history_cache()  # the window's cache too, so one manifest is kept
+            with recorder.span("load files"):
+                df, keys, _ = load_history_frame(self.files, on_error=report_error, cache=cache)
+            with recorder.span("search index"):
+                search_index = SearchIndex(df)
+            with recorder.span("stats rollups"):
+                stats = HistoryStats(df)
+            store = HistoryStore()
+            store.users()  # reads the user list while we are off the main thread
+            self.signals.restored.emit(self.generation, (self.files, cache, store, df, keys, search_index, stats))
+        except Exception as e:
+            logging.error(f"Error restoring last session: {e}")
+            self.signals.failed.emit(self.generation, str(e))
+
+
+class UserLoadTask(QRunnable):
+    """Builds a stored user's history frame on a worker thread.
+
+    store is None at startup, when the store itself is opened here too.
+    """
+
+    def __init__(self, signals, generation, store, user_id):
+        super().__init__()
+        self.signals = signals
+        self.generation = generation
+        self.store = store
+        self.user_id = user_id
+
+    def run(self):
+        try:
+            from history_core import HistoryStats, SearchIndex
+            from history_store import HistoryStore
+
+            store = self.store or HistoryStore()
+            with recorder.span("build frame"):
+                df = store.frame(self.user_id)
+                keys = store.play_keys(self.user_id)
+            with recorder.span("search index"):
+                search_index = SearchIndex(df)
+            with recorder.span("stats rollups"):
+                stats = HistoryStats(df)
+            self.signals.user_loaded.emit(self.generation, (store, self.user_id, df, keys, search_index, stats))
+        except Exception as e:
+            logging.error(f"Error loading user {self.user_id}: {e}")
+            self.signals.failed.emit(self.generation, str(e))
+
+
+class StoreSignals(QObject):
+    finished = pyqtSignal(str, int)  # user id, plays added
+    failed = pyqtSignal(str)
+
+
+class StoreAddTask(QRunnable):
+    """Adds parsed files to the history store on a worker thread.
+
+    With a name the files become a new user; otherwise they are merged into
+    user_id's shard.
+    """
+
+    def __init__(self, signals, store, chunks, files, user_id=None, name=None):
+        super().__init__()
+        self.signals = signals
+        self.store = store
+        self.chunks = chunks
+        self.files = files
+        self.user_id = user_id
+        self.name = name
+
+    def run(self):
+        try:
+            with recorder.span("store add"):
+                if self.name is not None:
+                    user_id = self.store.add_user(self.name, self.chunks, self.files)
+                    added = dict(self.store.users())[user_id]["plays"]
+                else:
+                    user_id = self.user_id
+                    added = self.store.add_chunks(user_id, self.chunks, self.files)
+            self.signals.finished.emit(user_id, added)
+        except Exception as e:
+            logging.error(f"Error adding files to the history store: {e}")
+            self.signals.failed.emit(str(e))
+
+
+class CompareSignals(QObject):
+    finished = pyqtSignal(object)  # {"artists", "tracks", "overlap", "shared"} frames
+    failed = pyqtSignal(str)
+
+
+class CompareTask(QRunnable):
+    """Runs the cross-user queries of Users > Compare Users on a worker thread."""
+
+    def __init__(self, signals, store, user_ids, start, end):
+        super().__init__()
+        self.signals = signals
+        self.store = store
+        self.user_ids = user_ids
+        self.start = start
+        self.end = end
+
+    def run(self):
+        try:
+            with recorder.span("compare users"):
+                artists = self.store.combined_counts(self.user_ids, "artist", self.start, self.end, COMPARE_TOP_N)
+                tracks = self.store.combined_counts(self.user_ids, "track", self.start, self.end, COMPARE_TOP_N)
+                overlap, shared = self.store.top_artist_overlap(self.user_ids, STATS_TOP_N, self.start, self.end)
+            self.signals.finished.emit({"artists": artists, "tracks": tracks, "overlap": overlap, "shared": shared})
+        except Exception as e:
+            logging.error(f"Error comparing users: {e}")
+            self.signals.failed.emit(str(e))
+
 
 class StreamingHistoryViewer(QMainWindow):
-    def __init__(self):
+    def __init__(self, profile=None):
         super().__init__()
+        self.profile = profile
         self.setWindowTitle(f"Streaming History Viewer - {RELEASE_NAME}")
         self.setGeometry(100, 100, 1200, 700)
         self.client_id = DEFAULT_CLIENT_ID
         self.client_secret = DEFAULT_CLIENT_SECRET
         self.redirect_uri = DEFAULT_REDIRECT_URI
         self.sp_client = None
-        self.full_df = pd.DataFrame()
+        self.spotify = None
+        self.playlist_engine = None
+        self.http_session = None
+        self.full_df = None
+        self.play_keys = None
+        self.session_files = []
+        self.history_store = None
+        self.active_user = None  # store user id shown instead of the opened files, if any
+        self.history_generation = 0  # bumped whenever the loaded history is replaced
+        self.history_cache = None
+        self.search_index = None
+        self.history_stats = None
+        self.sort_orders = None
+        self.sort_key = None  # (column, descending) chosen in the table header; None keeps time order
+        self.art_cache = AlbumArtCache()
+        self.art_pool = QThreadPool(self)
+        self.art_pool.setMaxThreadCount(ART_WORKERS)
+        self.art_generation = 0
+        self.art_signals = AlbumArtSignals(self)
+        self.art_signals.loaded.connect(self.onAlbumArtLoaded)
+        self.art_signals.failed.connect(self.onAlbumArtFailed)
+        self.art_track = None  # (track URI, song) of the art on screen
+        self.background_cache = OrderedDict()  # (track URI, bucket size) -> (thumbnail, small background) pixmaps
+        self.background_hits = 0
+        self.background_misses = 0
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(RESIZE_DEBOUNCE_MS)
+        self.resize_timer.timeout.connect(self.refreshAlbumArt)
+        self.metadata_store = None
+        self.metadata_pool = QThreadPool(self)
+        self.metadata_pool.setMaxThreadCount(1)
+        self.playlist_pool = QThreadPool(self)
+        self.playlist_pool.setMaxThreadCount(1)
+        self.session_pool = QThreadPool(self)
+        self.session_pool.setMaxThreadCount(1)
+        self.compare_pool = QThreadPool(self)
+        self.compare_pool.setMaxThreadCount(1)
+        self.export_pool = QThreadPool(self)
+        self.export_pool.setMaxThreadCount(1)
+        self.registerCaches()
         self.loadConfig()
+        self.markStartup("load config")
         self.setupUI()
-        self.showChangeLog()  # Show changelog window on launch
+        self.markStartup("build UI")
+        # Both wait for the event loop, so the window is up before either runs.
+        QTimer.singleShot(0, self.showChangeLog)
+        QTimer.singleShot(0, self.restoreSession)
+
+    def markStartup(self, phase):
+        if self.profile is not None:
+            self.profile.mark(phase)
+
+    def registerCaches(self):
+        """Report the hit rates of every cache to the performance recorder."""
+        for tier in ("memory", "disk", "url"):
+            recorder.add_cache(f"Album art ({tier})",
+                               lambda tier=tier: (self.art_cache.hits[tier], self.art_cache.misses[tier]))
+        recorder.add_cache("Backgrounds", lambda: (self.background_hits, self.background_misses))
+        recorder.add_cache("History files", lambda: (
+            (self.history_cache.hits, self.history_cache.misses) if self.history_cache else (0, 0)))
+        recorder.add_cache("Track metadata", lambda: (
+            (self.metadata_store.hits, self.metadata_store.misses) if self.metadata_store else (0, 0)))
     
     def loadConfig(self):
         if os.path.exists(CONFIG_FILE):
@@ -55,11 +549,18 @@ class StreamingHistoryViewer(QMainWindow):
                     config = json.load(f)
                 self.client_id = config.get("client_id", DEFAULT_CLIENT_ID)
                 self.client_secret = config.get("client_secret", DEFAULT_CLIENT_SECRET)
+                self.session_files = config.get("session_files", [])
+                self.active_user = config.get("active_user")
             except Exception as e:
                 logging.error(f"Error loading config: {e}")
     
     def saveConfig(self):
-        config = {"client_id": self.client_id, "client_secret": self.client_secret}
+        config = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "session_files": self.session_files,
+            "active_user": self.active_user,
+        }
         try:
             with open(CONFIG_FILE, "w", encoding="utf-8") as f:
                 json.dump(config, f, indent=2)
@@ -71,19 +572,31 @@ class StreamingHistoryViewer(QMainWindow):
         menu_bar = QMenuBar(self)
         file_menu = QMenu("File", self)
         settings_menu = QMenu("Settings", self)
+        view_menu = QMenu("View", self)
+        users_menu = QMenu("Users", self)
         help_menu = QMenu("Help", self)
         
         file_menu.addAction("Open Files", self.openFiles)
+        file_menu.addAction("Add Files", self.addFiles)
+        file_menu.addAction("Export View...", self.exportView)
+        file_menu.addAction("Export Full History...", self.exportHistory)
         file_menu.addAction("Clear Cache", self.clearCache)
         file_menu.addSeparator()
         file_menu.addAction("Exit", self.close)
         
         settings_menu.addAction("Configure Credentials", self.configureCredentials)
+
+        users_menu.addAction("Add User...", self.addUser)
+        users_menu.addAction("Remove User", self.removeUser)
+        users_menu.addSeparator()
+        users_menu.addAction("Compare Users...", self.compareUsers)
         
         help_menu.addAction("About", self.showAboutDialog)
         
         menu_bar.addMenu(file_menu)
         menu_bar.addMenu(settings_menu)
+        menu_bar.addMenu(users_menu)
+        menu_bar.addMenu(view_menu)
         menu_bar.addMenu(help_menu)
         self.setMenuBar(menu_bar)
         
@@ -93,7 +606,7 @@ class StreamingHistoryViewer(QMainWindow):
         self.now_playing_label = QLabel("Now Playing: None")
         self.status_bar.addPermanentWidget(self.now_playing_label)
         
-        central_widget = QWidget(self)
+        central_widget = BackgroundWidget(self)
         self.setCentralWidget(central_widget)
         main_layout = QVBoxLayout(central_widget)
         
@@ -105,26 +618,59 @@ class StreamingHistoryViewer(QMainWindow):
         self.clear_button = QPushButton("Clear")
         self.click_me_button = QPushButton("Click Me!")
         self.open_button = QPushButton("Open Files")
+        self.add_files_button = QPushButton("Add Files")
+        self.add_files_button.setToolTip("Merge more history files into the loaded history, skipping plays it already has.")
         self.playlist_button = QPushButton("Create Playlist")
+        self.results_playlist_button = QPushButton("Playlist from Results")
+        self.results_playlist_button.setToolTip("Create a playlist from every row currently listed.")
         
         control_layout.addWidget(self.search_field)
         control_layout.addWidget(self.search_button)
         control_layout.addWidget(self.clear_button)
         control_layout.addWidget(self.click_me_button)
         control_layout.addWidget(self.open_button)
+        control_layout.addWidget(self.add_files_button)
         control_layout.addWidget(self.playlist_button)
+        control_layout.addWidget(self.results_playlist_button)
         main_layout.addLayout(control_layout)
+
+        # Date range bar: quick presets plus an inclusive from/to picker.
+        range_layout = QHBoxLayout()
+        self.range_preset = QComboBox()
+        self.range_from = QDateEdit()
+        self.range_to = QDateEdit()
+        for edit in (self.range_from, self.range_to):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd")
+        range_layout.addWidget(QLabel("Range:"))
+        range_layout.addWidget(self.range_preset)
+        range_layout.addWidget(QLabel("From"))
+        range_layout.addWidget(self.range_from)
+        range_layout.addWidget(QLabel("To"))
+        range_layout.addWidget(self.range_to)
+        range_layout.addStretch()
+        # Switches between the opened files and the users kept in the history store.
+        self.user_combo = QComboBox()
+        self.user_combo.setToolTip("Show the opened files or a stored user's history (Users > Add User...).")
+        self.user_combo.addItem("Opened Files", None)
+        range_layout.addWidget(QLabel("User:"))
+        range_layout.addWidget(self.user_combo)
+        main_layout.addLayout(range_layout)
         
         # Table view for streaming history
         self.table_view = QTableView()
-        self.model = QStandardItemModel()
-        self.model.setHorizontalHeaderLabels(["Date/Time", "Song", "Creator", "Skipped", "Track URI"])
+        self.model = HistoryTableModel(self)
         self.table_view.setModel(self.model)
         self.table_view.setColumnHidden(4, True)
         header = self.table_view.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Stretch)
+        # Sorting is done on the frame's columns (see applyFilters), not by Qt, so only the indicator is used.
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.sortIndicatorChanged.connect(self.onSortChanged)
         self.table_view.setSelectionBehavior(self.table_view.SelectRows)
-        self.table_view.setSelectionMode(self.table_view.SingleSelection)
+        self.table_view.setSelectionMode(self.table_view.ExtendedSelection)
         self.table_view.setStyleSheet("""
             QTableView {
                 background-color: rgba(0, 0, 0, 150);
@@ -142,9 +688,45 @@ class StreamingHistoryViewer(QMainWindow):
         """)
         self.table_view.setToolTip("Double-click or press the 'Play' button to start playback.\nRight-click to add to queue.\nMiddle-click to add to 'history' playlist.")
         
-        # Right side: Thumbnail frame with playback and action buttons.
+        # Stats pane next to the table: top tracks/artists and a listening heatmap.
         content_layout = QHBoxLayout()
         content_layout.addWidget(self.table_view)
+        self.stats_frame = QWidget()
+        self.stats_frame.setFixedWidth(340)
+        stats_layout = QVBoxLayout(self.stats_frame)
+        stats_layout.setContentsMargins(0, 0, 0, 0)
+        self.stats_rank = QComboBox()
+        self.stats_rank.addItem("By Plays", "plays")
+        self.stats_rank.addItem("By Time", "ms")
+        stats_layout.addWidget(self.stats_rank)
+        self.stats_summary = QLabel()
+        self.stats_summary.setWordWrap(True)
+        stats_layout.addWidget(self.stats_summary)
+        self.stats_tabs = QTabWidget()
+        self.top_tracks_table = self.createStatsTable(["Song", "Creator", "Plays", "Time"])
+        self.top_artists_table = self.createStatsTable(["Creator", "Plays", "Time"])
+        self.heatmap_table = self.createStatsTable([str(hour) for hour in range(24)])
+        self.heatmap_table.setRowCount(7)
+        self.heatmap_table.verticalHeader().setVisible(True)
+        self.heatmap_table.setShowGrid(False)
+        self.heatmap_table.horizontalHeader().setMinimumSectionSize(10)
+        self.stats_tabs.addTab(self.top_tracks_table, "Top Tracks")
+        self.stats_tabs.addTab(self.top_artists_table, "Top Artists")
+        self.stats_tabs.addTab(self.heatmap_table, "Hours")
+        self.stats_tabs.setTabToolTip(2, "Listening by weekday and hour of day (UTC).")
+        for table in (self.top_tracks_table, self.top_artists_table):
+            for column in (table.columnCount() - 2, table.columnCount() - 1):
+                table.horizontalHeader().setSectionResizeMode(column, QHeaderView.ResizeToContents)
+        stats_layout.addWidget(self.stats_tabs)
+        content_layout.addWidget(self.stats_frame)
+        self.stats_rank.currentIndexChanged.connect(self.refreshStats)
+        self.range_preset.currentIndexChanged.connect(self.applyRangePreset)
+        self.range_from.dateChanged.connect(self.onRangeEdited)
+        self.range_to.dateChanged.connect(self.onRangeEdited)
+        self.user_combo.currentIndexChanged.connect(self.onUserChanged)
+        self.refreshDatePresets()
+
+        # Right side: Thumbnail frame with playback and action buttons.
         self.thumbnail_frame = QWidget()
         self.thumbnail_frame.setFixedWidth(250)
         thumb_layout = QVBoxLayout(self.thumbnail_frame)
@@ -178,9 +760,17 @@ class StreamingHistoryViewer(QMainWindow):
         # Connect signals for top controls.
         self.click_me_button.clicked.connect(self.clickMe)
         self.open_button.clicked.connect(self.openFiles)
+        self.add_files_button.clicked.connect(self.addFiles)
         self.search_button.clicked.connect(self.search)
+        self.search_field.returnPressed.connect(self.search)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.search)
+        self.search_field.textChanged.connect(self.search_timer.start)
         self.clear_button.clicked.connect(self.clearSearch)
         self.playlist_button.clicked.connect(self.createPlaylist)
+        self.results_playlist_button.clicked.connect(self.createPlaylistFromResults)
         
         # Connect signals for bottom playback/actions.
         self.play_btn_thumb.clicked.connect(self.playSelectedTrack)
@@ -190,11 +780,81 @@ class StreamingHistoryViewer(QMainWindow):
         self.add_to_playlist_button.clicked.connect(self.addSelectedTrackToHistory)
         
         # Connect table row selection.
-        self.table_view.clicked.connect(self.onRowSelect)
+        self.table_view.selectionModel().currentRowChanged.connect(self.onRowSelect)
+        
+        # Prefetch metadata for the rows in (and just below) the viewport.
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(METADATA_PREFETCH_DELAY_MS)
+        self.prefetch_timer.timeout.connect(self.prefetchVisibleMetadata)
+        self.table_view.verticalScrollBar().valueChanged.connect(lambda: self.prefetch_timer.start())
+        self.model.modelReset.connect(self.prefetch_timer.start)
         self.table_view.doubleClicked.connect(self.playSelectedTrack)
+
+        self.setupPerformancePanel(view_menu)
+
+    def setupPerformancePanel(self, view_menu):
+        """Dockable live view of the timing spans and cache hit rates (View > Performance).
+
+        Spans are only recorded while the panel is shown (or a --perf-log is
+        being written), so a hidden panel costs next to nothing.
+        """
+        self.perf_dock = QDockWidget("Performance", self)
+        self.perf_dock.setObjectName("performance")
+        panel = QWidget()
+        layout = QVBoxLayout(panel)
+        self.perf_spans_table = self.createStatsTable(["Operation", "Count", "p50", "p95", "Total", "Bytes"])
+        self.perf_caches_table = self.createStatsTable(["Cache", "Hits", "Misses", "Hit Rate"])
+        reset_button = QPushButton("Reset")
+        reset_button.setToolTip("Forget the timings recorded so far.")
+        reset_button.clicked.connect(self.resetPerformance)
+        layout.addWidget(self.perf_spans_table, 3)
+        layout.addWidget(self.perf_caches_table, 2)
+        layout.addWidget(reset_button)
+        self.perf_dock.setWidget(panel)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.perf_dock)
+        self.perf_dock.hide()
+        self.perf_watching = False
+        self.perf_timer = QTimer(self)
+        self.perf_timer.setInterval(PERF_REFRESH_MS)
+        self.perf_timer.timeout.connect(self.refreshPerformance)
+        self.perf_dock.visibilityChanged.connect(self.onPerformanceVisibility)
+        view_menu.addAction(self.perf_dock.toggleViewAction())
+
+    def onPerformanceVisibility(self, visible):
+        if visible == self.perf_watching:
+            return
+        self.perf_watching = visible
+        recorder.watch(visible)
+        if visible:
+            self.refreshPerformance()
+            self.perf_timer.start()
+        else:
+            self.perf_timer.stop()
+
+    def refreshPerformance(self):
+        spans, caches = recorder.snapshot()
+        self.perf_spans_table.setRowCount(len(spans))
+        for row, entry in enumerate(spans):
+            values = (entry["name"], f"{entry['count']:,}", f"{entry['p50_ms']:,.1f} ms",
+                      f"{entry['p95_ms']:,.1f} ms", f"{entry['total_ms']:,.0f} ms",
+                      format_bytes(entry["bytes"]) if entry["bytes"] else "")
+            for column, text in enumerate(values):
+                self.perf_spans_table.setItem(row, column, QTableWidgetItem(text))
+        self.perf_caches_table.setRowCount(len(caches))
+        for row, entry in enumerate(caches):
+            rate = entry["hit_rate"]
+            values = (entry["name"], f"{entry['hits']:,}", f"{entry['misses']:,}",
+                      "-" if rate is None else f"{rate:.0%}")
+            for column, text in enumerate(values):
+                self.perf_caches_table.setItem(row, column, QTableWidgetItem(text))
+
+    def resetPerformance(self):
+        recorder.reset()
+        self.refreshPerformance()
     
     def showChangeLog(self):
-        """Display a changelog dialog on launch."""
+        """Display a changelog dialog on launch, without blocking the main window."""
         changelog = (
             f"{RELEASE_NAME}\n\n"
             "Changelog:\n"
@@ -214,7 +874,8 @@ class StreamingHistoryViewer(QMainWindow):
         close_button = QPushButton("Close")
         close_button.clicked.connect(dialog.accept)
         layout.addWidget(close_button)
-        dialog.exec_()
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.show()
     
     def showAboutDialog(self):
         QMessageBox.information(self, "About",
@@ -234,12 +895,21 @@ class StreamingHistoryViewer(QMainWindow):
     
     def clearCache(self):
         cache_file = ".cache-spotify"
+        cleared = []
         if os.path.exists(cache_file):
             os.remove(cache_file)
             self.sp_client = None
-            QMessageBox.information(self, "Cache Cleared", "The Spotify token cache has been cleared.")
+            cleared.append("Spotify token cache")
+        if self.historyCache().clear():
+            cleared.append("history file cache")
+        if self.art_cache.clear():
+            cleared.append("album art cache")
+        if cleared:
+            verb = "have" if len(cleared) > 1 else "has"
+            names = ", ".join(cleared[:-1]) + " and " + cleared[-1] if len(cleared) > 1 else cleared[0]
+            QMessageBox.information(self, "Cache Cleared", f"The {names} {verb} been cleared.")
         else:
-            QMessageBox.information(self, "No Cache Found", "No token cache was found.")
+            QMessageBox.information(self, "No Cache Found", "No token, history or album art cache was found.")
     
     def configureCredentials(self):
         dialog = QDialog(self)
@@ -282,6 +952,9 @@ class StreamingHistoryViewer(QMainWindow):
     
     def get_sp_client(self):
         if self.sp_client is None:
+            import spotipy
+            from spotipy.oauth2 import SpotifyOAuth
+
             self.sp_client = spotipy.Spotify(auth_manager=SpotifyOAuth(
                 client_id=self.client_id,
                 client_secret=self.client_secret,
@@ -289,217 +962,806 @@ class StreamingHistoryViewer(QMainWindow):
                 scope="playlist-modify-public user-modify-playback-state user-read-playback-state",
                 show_dialog=True,
                 cache_path=".cache-spotify"
-            ))
+            ), requests_session=self.httpSession())
         return self.sp_client
     
+    def get_spotify(self):
+        """The session-scoped client layer (cached user and devices) for get_sp_client()."""
+        from spotify_client import PlaylistEngine, SpotifyClient, TrackMetadataStore
+
+        sp = self.get_sp_client()
+        if self.spotify is None or self.spotify.sp is not sp:
+            self.spotify = SpotifyClient(sp)
+            self.playlist_engine = PlaylistEngine(self.spotify)
+        if self.metadata_store is None:
+            self.metadata_store = TrackMetadataStore()
+        return self.spotify
+
+    def httpSession(self):
+        if self.http_session is None:
+            from spotify_client import make_http_session
+
+            self.http_session = make_http_session()
+        return self.http_session
+
+    def historyCache(self):
+        if self.history_cache is None:
+            from history_core import shared_history_cache
+
+            self.history_cache = shared_history_cache()
+        return self.history_cache
+    
+    def historyStore(self):
+        if self.history_store is None:
+            from history_store import HistoryStore
+
+            self.history_store = HistoryStore()
+        return self.history_store
+
     def normalize_track_uri(self, uri):
-        if uri.startswith("https://open.spotify.com/track/"):
-            m = re.search(r'https://open\.spotify\.com/track/([A-Za-z0-9]+)', uri)
-            if m:
-                return f"spotify:track:{m.group(1)}"
-        return uri
+        from history_core import normalize_track_uri
+
+        return normalize_track_uri(uri)
     
     def openFiles(self):
+        self.loadFiles(merge=False)
+
+    def addFiles(self):
+        self.loadFiles(merge=True)
+
+    def loadFiles(self, merge):
+        """Load export files, replacing the history or (merge=True) adding the plays it lacks."""
         files, _ = QFileDialog.getOpenFileNames(
-            self, "Open JSON Files", "", "JSON Files (*.json);;All Files (*)"
+            self, "Add JSON Files" if merge else "Open JSON Files", "", "JSON Files (*.json);;All Files (*)"
         )
         if files:
-            progress = QProgressDialog("Loading files...", "Cancel", 0, len(files), self)
-            progress.setWindowModality(Qt.WindowModal)
-            progress.show()
-            all_data = []
-            for i, file_path in enumerate(files):
+            from history_core import merge_history
+
+            self.history_generation += 1  # supersedes a session restore still in flight
+            if not merge or (self.active_user is None and self.full_df is None):
+                # A fresh history: the merged frame may come straight from the cache.
+                loaded = self.parseFiles(files, merged=True)
+                if loaded is None:
+                    return
+                df, keys, plays = loaded
+                session_files = [os.path.abspath(file_path) for file_path in files]
+                added = len(df)
+                skipped = plays - added
+            else:
+                chunks = self.parseFiles(files)
+                if chunks is None:
+                    return
+                files = [os.path.abspath(file_path) for file_path in files]
+                if self.active_user is not None:
+                    self.addUserFiles(chunks, files)
+                    return
+                keys, session_files = self.play_keys, self.session_files + files
                 try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                    if isinstance(data, list):
-                        all_data.extend(data)
-                    else:
-                        all_data.append(data)
+                    with recorder.span("build frame"):
+                        df, added = merge_history(self.full_df, keys, chunks)
                 except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to load file {file_path}: {e}")
-                progress.setValue(i + 1)
-                if progress.wasCanceled():
-                    break
+                    logging.error(f"Error merging files: {e}")
+                    QMessageBox.critical(self, "Error", f"Failed to add the files: {e}")
+                    return
+                skipped = sum(len(chunk["Date/Time"]) for chunk in chunks) - added
+            self.status_bar.showMessage(f"Loaded {added:,} plays, skipped {skipped:,} already loaded.", 5000)
+            if added and len(df):
+                self.play_keys = keys
+                self.session_files = list(dict.fromkeys(session_files))
+                self.active_user = None
+                self.saveConfig()
+                self.refreshUsers()
+                self.setHistory(df)
+
+    def exportView(self):
+        """Export the rows listed in the table (search and date range applied), in view order."""
+        self.exportRows(self.model.viewRows(), "view")
+
+    def exportHistory(self):
+        self.exportRows(None, "history")
+
+    def exportRows(self, rows, name):
+        if self.full_df is None or (rows is not None and not self.model.rowCount()):
+            QMessageBox.information(self, "Info", "No rows to export.")
+            return
+        from history_core import EXPORT_FILE_FORMATS, export_file_formats
+
+        descriptions = {"csv": "CSV", "jsonl": "JSON Lines", "parquet": "Parquet"}
+        formats = export_file_formats()
+        filters = [f"{descriptions[fmt]} (*{EXPORT_FILE_FORMATS[fmt]})" for fmt in formats]
+        path, selected = QFileDialog.getSaveFileName(self, "Export", f"streaming_{name}.csv", ";;".join(filters))
+        if not path:
+            return
+        fmt = formats[filters.index(selected)] if selected in filters else "csv"
+        # A typed extension wins over the filter; a missing one is added.
+        by_extension = {extension: fmt for fmt, extension in EXPORT_FILE_FORMATS.items() if fmt in formats}
+        extension = os.path.splitext(path)[1].lower()
+        if extension in by_extension:
+            fmt = by_extension[extension]
+        else:
+            path += EXPORT_FILE_FORMATS[fmt]
+
+        total = len(self.full_df) if rows is None else self.model.rowCount()
+        progress = QProgressDialog(f"Exporting {total:,} plays to {os.path.basename(path)}...", "Cancel",
+                                   0, max(total, 1), self)
+        progress.setWindowModality(Qt.NonModal)
+        progress.setMinimumDuration(0)
+        signals = ExportSignals(self)
+        task = ExportTask(signals, self.full_df, rows, path, fmt)
+
+        def finished(path, written):
+            progress.close()
+            signals.deleteLater()
+            if written is None:
+                self.status_bar.showMessage("Export cancelled.", 5000)
+            else:
+                self.status_bar.showMessage(f"Exported {written:,} plays to {path}.", 5000)
+
+        def failed(message):
+            progress.close()
+            signals.deleteLater()
+            QMessageBox.critical(self, "Error", f"Export failed:\n{message}")
+
+        signals.progress.connect(lambda written, total: progress.setValue(written))
+        signals.finished.connect(finished)
+        signals.failed.connect(failed)
+        progress.canceled.connect(task.cancel)
+        progress.show()
+        self.export_pool.start(task)
+
+    def parseFiles(self, files, merged=False):
+        """Parse export files behind a progress dialog; returns their chunks, or None if cancelled.
+
+        With merged=True returns load_history_frame()'s (frame, play keys, plays) instead.
+        """
+        from history_core import load_history_chunks, load_history_frame
+
+        total = sum(os.path.getsize(file_path) for file_path in files)
+        # QProgressDialog works in ints, so report in KiB to stay in range.
+        progress = QProgressDialog("Loading files...", "Cancel", 0, total // 1024 + 1, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.show()
+
+        def report(bytes_read):
+            progress.setValue(bytes_read // 1024)
+            return not progress.wasCanceled()
+
+        def report_error(file_path, e):
+            QMessageBox.critical(self, "Error", f"Failed to load file {file_path}: {e}")
+
+        if merged:
+            with recorder.span("load files", total):
+                loaded = load_history_frame(files, report, report_error, cache=self.historyCache())
             progress.close()
-            if all_data:
-                self.full_df = pd.DataFrame(all_data)
-                columns_to_use = ["ts", "master_metadata_track_name", "master_metadata_album_artist_name", "spotify_track_uri", "skipped"]
-                self.full_df = self.full_df[columns_to_use]
-                self.full_df.rename(columns={
-                    "ts": "Date/Time",
-                    "master_metadata_track_name": "Song",
-                    "master_metadata_album_artist_name": "Creator",
-                    "spotify_track_uri": "Track URI",
-                    "skipped": "Skipped"
-                }, inplace=True)
-                self.full_df["Date/Time"] = pd.to_datetime(self.full_df["Date/Time"], errors="coerce")
-                self.full_df.sort_values("Date/Time", inplace=True)
-                self.full_df.fillna("", inplace=True)
-                self.populateTable(self.full_df)
-                self.setWindowTitle(f"Streaming History Viewer - {len(files)} files loaded")
+            return loaded
+        with recorder.span("parse files", total):
+            chunks = load_history_chunks(files, report, report_error, cache=self.historyCache())
+        progress.close()
+        if chunks is None:
+            return None
+        return [chunk for chunk in chunks if chunk is not None]
+
+    def addUserFiles(self, chunks, files):
+        """Add Files while a stored user is shown: merge into their shard in the background, then reload it."""
+        total = sum(len(chunk["Date/Time"]) for chunk in chunks)
+        self.status_bar.showMessage("Adding files to the user...")
+        signals = StoreSignals(self)
+
+        def finished(user_id, added):
+            signals.deleteLater()
+            self.status_bar.showMessage(f"Added {added:,} plays, skipped {total - added:,} already stored.", 5000)
+            if added:
+                self.refreshUsers()
+                if user_id == self.active_user:
+                    self.loadUser(user_id)
+
+        def failed(message):
+            signals.deleteLater()
+            self.status_bar.clearMessage()
+            QMessageBox.critical(self, "Error", f"Failed to add the files: {message}")
+
+        signals.finished.connect(finished)
+        signals.failed.connect(failed)
+        self.session_pool.start(StoreAddTask(signals, self.historyStore(), chunks, files, user_id=self.active_user))
+
+    def setHistory(self, df, search_index=None, stats=None):
+        from history_core import HistoryStats, SearchIndex, SortOrders
+
+        self.full_df = df
+        if search_index is None:
+            with recorder.span("search index"):
+                search_index = SearchIndex(df)
+        if stats is None:
+            with recorder.span("stats rollups"):
+                stats = HistoryStats(df)
+        self.search_index = search_index
+        self.history_stats = stats
+        self.sort_orders = SortOrders(df)
+        self.populateTable(self.full_df)
+        self.refreshDatePresets()
+        if self.active_user is not None:
+            self.setWindowTitle(f"Streaming History Viewer - {self.history_store.user_name(self.active_user)}")
+        else:
+            self.setWindowTitle(f"Streaming History Viewer - {len(self.session_files)} files loaded")
+
+    def restoreSession(self):
+        """Reload the last session's user or files in the background."""
+        if self.full_df is not None:
+            return
+        if self.active_user is not None:
+            self.loadUser(self.active_user)
+        else:
+            self.restoreFiles()
+
+    def restoreFiles(self):
+        """Reload the opened files in the background (the history store is opened there too)."""
+        files = [file_path for file_path in self.session_files if os.path.isfile(file_path)]
+        self.history_generation += 1
+        if files:
+            self.status_bar.showMessage("Restoring last session...")
+        signals = SessionSignals(self)
+        signals.restored.connect(self.onSessionRestored)
+        signals.failed.connect(self.onSessionFailed)
+        self.session_pool.start(SessionRestoreTask(signals, self.history_generation, files))
+
+    def onSessionRestored(self, generation, result):
+        self.sender().deleteLater()
+        files, cache, store, df, keys, search_index, stats = result
+        if self.history_store is None:
+            self.history_store = store
+            self.refreshUsers()
+        if generation != self.history_generation:
+            return  # files were opened in the meantime
+        if files:
+            self.status_bar.showMessage(f"Restored {len(df):,} plays from the last session.", 5000)
+        if not len(df) and self.full_df is None:
+            return
+        if self.history_cache is None:
+            self.history_cache = cache
+        self.play_keys = keys
+        self.session_files = files
+        self.setHistory(df, search_index, stats)
+        self.markStartup("restore session (background)")
+
+    def onSessionFailed(self, generation, message):
+        self.sender().deleteLater()
+        if generation == self.history_generation:
+            self.status_bar.showMessage(f"Could not restore the last session: {message}", 5000)
+
+    def refreshUsers(self):
+        """List the stored users in the switcher and select the active one."""
+        self.user_combo.blockSignals(True)
+        self.user_combo.clear()
+        self.user_combo.addItem("Opened Files", None)
+        if self.history_store is not None:
+            for user_id, info in self.history_store.users():
+                self.user_combo.addItem(f"{info['name']} ({info['plays']:,} plays)", user_id)
+        index = 0 if self.active_user is None else self.user_combo.findData(self.active_user)
+        self.user_combo.setCurrentIndex(max(0, index))
+        self.user_combo.blockSignals(False)
+
+    def onUserChanged(self, index):
+        user_id = self.user_combo.itemData(index)
+        if user_id != self.active_user:
+            self.switchUser(user_id)
+
+    def switchUser(self, user_id):
+        """Show a stored user's history, or the opened files for None."""
+        self.active_user = user_id
+        self.saveConfig()
+        if user_id is None:
+            self.restoreFiles()
+        else:
+            self.loadUser(user_id)
+
+    def loadUser(self, user_id):
+        self.history_generation += 1
+        self.status_bar.showMessage("Loading user history...")
+        signals = SessionSignals(self)
+        signals.user_loaded.connect(self.onUserLoaded)
+        signals.failed.connect(self.onUserLoadFailed)
+        self.session_pool.start(UserLoadTask(signals, self.history_generation, self.history_store, user_id))
+
+    def onUserLoaded(self, generation, result):
+        self.sender().deleteLater()
+        store, user_id, df, keys, search_index, stats = result
+        if self.history_store is None:
+            self.history_store = store
+            self.refreshUsers()
+        if generation != self.history_generation:
+            return
+        self.play_keys = keys
+        self.setHistory(df, search_index, stats)
+        self.status_bar.showMessage(f"Loaded {len(df):,} plays of {store.user_name(user_id)}.", 5000)
+        self.markStartup("restore session (background)")
+
+    def onUserLoadFailed(self, generation, message):
+        self.sender().deleteLater()
+        if generation != self.history_generation:
+            return
+        self.status_bar.showMessage(f"Could not load the user's history: {message}", 5000)
+        # Typically the user was removed from the store: fall back to the opened files.
+        self.active_user = None
+        self.saveConfig()
+        self.refreshUsers()
+        self.restoreFiles()
+
+    def addUser(self):
+        name, ok = QInputDialog.getText(self, "Add User", "Name:")
+        name = name.strip()
+        if not ok or not name:
+            return
+        files, _ = QFileDialog.getOpenFileNames(
+            self, f"Streaming History Files of {name}", "", "JSON Files (*.json);;All Files (*)"
+        )
+        if not files:
+            return
+        chunks = self.parseFiles(files)
+        if chunks is None:
+            return
+        self.status_bar.showMessage(f"Adding user {name}...")
+        signals = StoreSignals(self)
+
+        def finished(user_id, added):
+            signals.deleteLater()
+            self.active_user = user_id
+            self.saveConfig()
+            self.refreshUsers()
+            self.loadUser(user_id)
+
+        def failed(message):
+            signals.deleteLater()
+            self.status_bar.clearMessage()
+            QMessageBox.critical(self, "Error", f"Failed to add user {name}: {message}")
+
+        signals.finished.connect(finished)
+        signals.failed.connect(failed)
+        self.session_pool.start(StoreAddTask(signals, self.historyStore(), chunks, files, name=name))
+
+    def removeUser(self):
+        if self.active_user is None:
+            QMessageBox.information(self, "Info", "Switch to the user you want to remove first.")
+            return
+        store = self.historyStore()
+        name = store.user_name(self.active_user)
+        answer = QMessageBox.question(
+            self, "Remove User", f"Remove {name} and their stored history?\nTheir export files are not touched."
+        )
+        if answer != QMessageBox.Yes:
+            return
+        try:
+            store.remove_user(self.active_user)
+        except Exception as e:
+            logging.error(f"Error removing user {self.active_user}: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to remove user {name}: {e}")
+            return
+        self.switchUser(None)
+        self.refreshUsers()
+
+    def compareUsers(self):
+        store = self.historyStore()
+        users = store.users()
+        if len(users) < 2:
+            QMessageBox.information(self, "Info", "Add at least two users to compare (Users > Add User...).")
+            return
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Compare Users")
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel(f"Users to compare ({self.range_preset.currentText()}):"))
+        user_list = QListWidget()
+        for user_id, info in users:
+            item = QListWidgetItem(f"{info['name']} ({info['plays']:,} plays)")
+            item.setData(Qt.UserRole, user_id)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            user_list.addItem(item)
+        layout.addWidget(user_list)
+        btn_layout = QHBoxLayout()
+        ok_button = QPushButton("Compare")
+        cancel_button = QPushButton("Cancel")
+        btn_layout.addWidget(ok_button)
+        btn_layout.addWidget(cancel_button)
+        layout.addLayout(btn_layout)
+        ok_button.clicked.connect(lambda: dialog.accept())
+        cancel_button.clicked.connect(lambda: dialog.reject())
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        user_ids = [user_list.item(row).data(Qt.UserRole) for row in range(user_list.count())
+                    if user_list.item(row).checkState() == Qt.Checked]
+        if len(user_ids) < 2:
+            QMessageBox.information(self, "Info", "Select at least two users.")
+            return
+
+        start, end = self.dateRange()
+        range_text = self.range_preset.currentText()
+        if range_text == "Custom":
+            range_text = f"{self.range_from.date().toString('yyyy-MM-dd')} to {self.range_to.date().toString('yyyy-MM-dd')}"
+        labels = store.user_labels(user_ids)
+        self.status_bar.showMessage(f"Comparing {len(user_ids)} users...")
+        signals = CompareSignals(self)
+
+        def finished(results):
+            signals.deleteLater()
+            self.status_bar.clearMessage()
+            self.showComparison(results, labels, range_text)
+
+        def failed(message):
+            signals.deleteLater()
+            self.status_bar.clearMessage()
+            QMessageBox.critical(self, "Error", f"Comparing users failed:\n{message}")
+
+        signals.finished.connect(finished)
+        signals.failed.connect(failed)
+        self.compare_pool.start(CompareTask(signals, store, user_ids, start, end))
+
+    def showComparison(self, results, labels, range_text):
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"Compare Users - {range_text}")
+        dialog.resize(900, 600)
+        layout = QVBoxLayout(dialog)
+        tabs = QTabWidget()
+        overlap = results["overlap"].rename_axis("User").reset_index()
+        for title, frame, columns in (
+            ("Top Artists", results["artists"], ["Creator"] + labels + ["Plays", "Played (ms)"]),
+            ("Top Tracks", results["tracks"], ["Song", "Creator"] + labels + ["Plays", "Played (ms)"]),
+            ("Shared Artists", results["shared"], ["Creator", "Users", "Plays"]),
+            ("Overlap", overlap, ["User"] + labels),
+        ):
+            table = self.createStatsTable(["Time" if column == "Played (ms)" else column for column in columns])
+            self.fillStatsTable(table, frame, columns)
+            tabs.addTab(table, title)
+        tabs.setTabToolTip(2, f"Artists in the top {STATS_TOP_N} of at least two of the users.")
+        tabs.setTabToolTip(3, f"How many of their top {STATS_TOP_N} artists each pair of users has in common.")
+        layout.addWidget(tabs)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(lambda: dialog.accept())
+        layout.addWidget(close_button)
+        dialog.exec_()
     
     def populateTable(self, df):
-        self.model.removeRows(0, self.model.rowCount())
-        for index, row in df.iterrows():
-            track_uri = self.normalize_track_uri(row["Track URI"])
-            item1 = QStandardItem(str(row["Date/Time"]))
-            item1.setEditable(False)
-            item2 = QStandardItem(row["Song"])
-            item2.setEditable(False)
-            item3 = QStandardItem(row["Creator"])
-            item3.setEditable(False)
-            skipped_val = "Yes" if row["Skipped"] else "No"
-            item4 = QStandardItem(skipped_val)
-            item4.setEditable(False)
-            item5 = QStandardItem(track_uri)
-            item5.setEditable(False)
-            self.model.appendRow([item1, item2, item3, item4, item5])
-    
-    def search(self):
+        with recorder.span("populate model"):
+            self.model.setFrame(df)
+
+    def createStatsTable(self, labels):
+        table = QTableWidget(0, len(labels))
+        table.setHorizontalHeaderLabels(labels)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.setSelectionMode(QTableWidget.NoSelection)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        table.setStyleSheet(self.table_view.styleSheet())
+        return table
+
+    def refreshDatePresets(self):
+        """Offer All Time, the last 30 days / 12 months of the history, each year in it, and Custom."""
+        self.range_preset.blockSignals(True)
+        self.range_preset.clear()
+        from history_core import date_range_presets
+
+        stats = self.history_stats
+        has_dates = stats is not None and stats.last_day is not None
+        days = (stats.first_day, stats.last_day) if has_dates else (None, None)
+        for label, bounds in date_range_presets(*days):
+            self.range_preset.addItem(label, bounds)
+        if has_dates:
+            import pandas as pd
+
+            first = pd.Timestamp(stats.first_day, unit="D")
+            last = pd.Timestamp(stats.last_day, unit="D")
+            for edit in (self.range_from, self.range_to):
+                edit.blockSignals(True)
+                edit.setDateRange(QDate(first.year, first.month, first.day), QDate(last.year, last.month, last.day))
+                edit.blockSignals(False)
+        self.range_preset.addItem("Custom", None)
+        self.range_preset.blockSignals(False)
+        for edit in (self.range_from, self.range_to):
+            edit.setEnabled(has_dates)
+        self.applyRangePreset()
+
+    def applyRangePreset(self):
+        preset = self.range_preset.currentData()
+        if preset is None:
+            return  # Custom: keep the picked dates
+        stats = self.history_stats
+        if stats is not None and stats.last_day is not None:
+            import pandas as pd
+
+            start, end = preset
+            if start is None:
+                start = pd.Timestamp(stats.first_day, unit="D")
+            if end is None:
+                end = pd.Timestamp(stats.last_day + 1, unit="D")
+            end -= pd.Timedelta(days=1)
+            for edit, day in ((self.range_from, start), (self.range_to, end)):
+                edit.blockSignals(True)
+                edit.setDate(QDate(day.year, day.month, day.day))
+                edit.blockSignals(False)
+        self.onRangeChanged()
+
+    def onRangeEdited(self):
+        self.range_preset.blockSignals(True)
+        self.range_preset.setCurrentIndex(self.range_preset.count() - 1)
+        self.range_preset.blockSignals(False)
+        self.onRangeChanged()
+
+    def dateRange(self):
+        """(start, end) of the selected range with end exclusive; (None, None) for All Time."""
+        import pandas as pd
+
+        preset = self.range_preset.currentData()
+        if preset is not None:
+            return preset
+        start = pd.Timestamp(self.range_from.date().toPyDate())
+        end = pd.Timestamp(self.range_to.date().toPyDate()) + pd.Timedelta(days=1)
+        return start, max(start, end)
+
+    def onRangeChanged(self):
+        self.applyFilters()
+        with recorder.span("stats pane"):
+            self.refreshStats()
+
+    def applyFilters(self):
+        """Show the rows inside the date range that also match the search text, in the chosen sort order."""
+        if self.search_index is None:
+            return
+        from history_core import select_rows
+
+        start, end = self.dateRange()
         query = self.search_field.text().strip()
-        if query == "":
+        with recorder.span("search"):
+            rows = select_rows(self.full_df, start, end, query=query, search_index=self.search_index)
+        if self.sort_key is not None:
+            with recorder.span("sort"):
+                rows = self.sort_orders.sort_rows(rows, *self.sort_key)
+        self.model.setRows(rows)
+
+    def onSortChanged(self, section, order):
+        self.sort_key = None if section < 0 else (HISTORY_COLUMNS[section], order == Qt.DescendingOrder)
+        self.applyFilters()
+
+    def refreshStats(self):
+        stats = self.history_stats
+        if stats is None:
+            self.stats_summary.setText("Open history files to see listening statistics.")
             return
-        filtered = self.full_df[
-            self.full_df["Song"].str.contains(query, case=False, na=False) |
-            self.full_df["Creator"].str.contains(query, case=False, na=False)
-        ]
-        self.populateTable(filtered)
+        start, end = self.dateRange()
+        by = self.stats_rank.currentData()
+        summary = stats.summary(start, end)
+        self.stats_summary.setText(
+            f"{summary['plays']:,} plays, {format_listening_time(summary['ms_played'])} listened, "
+            f"{summary['skip_rate']:.0%} skipped\n"
+            f"{summary['tracks']:,} tracks by {summary['artists']:,} artists"
+        )
+        tracks = stats.top_tracks(STATS_TOP_N, start, end, by)
+        self.fillStatsTable(self.top_tracks_table, tracks, ["Song", "Creator", "Plays", "Played (ms)"])
+        artists = stats.top_artists(STATS_TOP_N, start, end, by)
+        self.fillStatsTable(self.top_artists_table, artists, ["Creator", "Plays", "Played (ms)"])
+
+        heatmap = stats.heatmap(start, end, by)
+        self.heatmap_table.setVerticalHeaderLabels(list(heatmap.index))
+        peak = max(int(heatmap.values.max()), 1)
+        for day, row in enumerate(heatmap.values):
+            for hour, value in enumerate(row):
+                item = QTableWidgetItem()
+                item.setBackground(QColor(74, 144, 226, int(255 * value / peak)))
+                amount = format_listening_time(value) if by == "ms" else f"{value:,} plays"
+                item.setToolTip(f"{heatmap.index[day]} {hour:02d}:00: {amount}")
+                self.heatmap_table.setItem(day, hour, item)
+
+    def fillStatsTable(self, table, frame, columns):
+        table.setRowCount(len(frame))
+        for column, name in enumerate(columns):
+            values = frame[name].to_numpy()
+            for row, value in enumerate(values):
+                if name == "Played (ms)":
+                    text = format_listening_time(value)
+                elif name == "Plays" or isinstance(value, Integral):
+                    text = f"{value:,}"
+                else:
+                    text = str(value)
+                table.setItem(row, column, QTableWidgetItem(text))
+    
+    def search(self):
+        self.search_timer.stop()
+        self.applyFilters()
     
     def clearSearch(self):
         self.search_field.clear()
-        self.populateTable(self.full_df)
+        self.search_timer.stop()
+        self.applyFilters()
     
-    def onRowSelect(self, index):
+    def onRowSelect(self, index, previous=None):
+        if not index.isValid():
+            return
         row = index.row()
-        track_uri = self.model.item(row, 4).text()  # Hidden column
+        track_uri = self.model.text(row, 4)  # Hidden column
         track_uri = self.normalize_track_uri(track_uri)
         if track_uri.startswith("spotify:track:"):
-            album_art, blurred = self.fetchAlbumArt(track_uri)
-            if blurred:
-                pix = self.pil2pixmap(blurred)
-                self.setBackgroundPixmap(pix)
-            if album_art:
-                thumb_pix = self.pil2pixmap(album_art)
-                self.thumbnail_label.setPixmap(thumb_pix)
-                song = self.model.item(row, 1).text()
-                self.now_playing_label.setText(f"Now Playing: {song}")
+            self.requestAlbumArt(track_uri, self.model.text(row, 1))
         else:
+            self.art_generation += 1
+            self.art_pool.clear()
+            self.art_track = None
             self.setBackgroundPixmap(QPixmap())
             self.thumbnail_label.clear()
             self.now_playing_label.setText("Now Playing: None")
     
+    def backgroundSize(self):
+        width = -(-self.width() // BACKGROUND_BUCKET) * BACKGROUND_BUCKET
+        height = -(-self.height() // BACKGROUND_BUCKET) * BACKGROUND_BUCKET
+        return width, height
+    
+    def requestAlbumArt(self, track_uri, song):
+        # Any art still queued or loading belongs to an older selection now.
+        self.art_generation += 1
+        self.art_pool.clear()
+        self.art_track = (track_uri, song)
+        key = (track_uri, self.backgroundSize())
+        cached = self.background_cache.get(key)
+        if cached is not None:
+            self.background_hits += 1
+            self.background_cache.move_to_end(key)
+            self.showAlbumArt(song, *cached)
+            return
+        self.background_misses += 1
+        self.get_spotify()  # create the client here, not on a worker thread
+        self.art_pool.start(AlbumArtTask(self, self.art_generation, track_uri, song, key[1]))
+    
+    def refreshAlbumArt(self):
+        """Re-render the background for the current track after the window was resized."""
+        if self.art_track is not None:
+            self.requestAlbumArt(*self.art_track)
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.art_track is not None:
+            self.resize_timer.start()
+    
+    def prefetchVisibleMetadata(self):
+        # Only prefetch once the user has signed in; never pop up the login from a scroll.
+        if self.sp_client is None and not os.path.exists(".cache-spotify"):
+            return
+        from history_core import track_rows, unique_track_uris
+
+        first = self.table_view.rowAt(0)
+        if first < 0:
+            return
+        last = self.table_view.rowAt(self.table_view.viewport().height() - 1)
+        if last < 0:
+            last = self.model.rowCount() - 1
+        rows = track_rows(self.full_df, self.model.sourceRows(first, last + 1 + METADATA_PREFETCH_AHEAD))
+        track_ids = [uri.split(":")[-1] for uri in unique_track_uris(self.full_df, rows)]
+        self.get_spotify()  # also creates the metadata store
+        track_ids = self.metadata_store.claim(track_ids)
+        if track_ids:
+            self.metadata_pool.start(MetadataPrefetchTask(self, track_ids))
+    
+    def onAlbumArtLoaded(self, generation, key, song, thumbnail, background):
+        if generation != self.art_generation:
+            return
+        with recorder.span("pixmap convert"):
+            pixmaps = (QPixmap.fromImage(thumbnail), QPixmap.fromImage(background))
+        self.background_cache[key] = pixmaps
+        while len(self.background_cache) > BACKGROUND_CACHE_ENTRIES:
+            self.background_cache.popitem(last=False)
+        self.showAlbumArt(song, *pixmaps)
+    
+    def showAlbumArt(self, song, thumbnail, background):
+        self.setBackgroundPixmap(background)
+        self.thumbnail_label.setPixmap(thumbnail)
+        self.now_playing_label.setText(f"Now Playing: {song}")
+    
+    def onAlbumArtFailed(self, generation, message):
+        if generation != self.art_generation:
+            return
+        self.status_bar.showMessage(f"Error fetching album art: {message}", 5000)
+    
+    def closeEvent(self, event):
+        self.art_generation += 1
+        self.art_pool.clear()
+        self.metadata_pool.clear()
+        if self.history_store is not None:
+            self.history_store.close()
+        super().closeEvent(event)
+    
     def setBackgroundPixmap(self, pixmap):
-        if not pixmap:
-            pixmap = QPixmap()
-        palette = self.centralWidget().palette()
-        brush = QBrush(pixmap)
-        palette.setBrush(self.centralWidget().backgroundRole(), brush)
-        self.centralWidget().setPalette(palette)
-        self.centralWidget().setAutoFillBackground(True)
+        self.centralWidget().setBackground(pixmap or QPixmap())
     
     def playSelectedTrack(self):
+        from spotify_client import NoActiveDeviceError, RateLimitedError
+
         selected_indexes = self.table_view.selectionModel().selectedRows()
         if not selected_indexes:
             QMessageBox.information(self, "Playback", "No row selected.")
             return
         row = selected_indexes[0].row()
-        track_uri = self.model.item(row, 4).text()  # Hidden column
+        track_uri = self.model.text(row, 4)  # Hidden column
         track_uri = self.normalize_track_uri(track_uri)
         if not track_uri.startswith("spotify:track:"):
             QMessageBox.information(self, "Playback", "Invalid track URI.")
             return
         try:
-            sp = self.get_sp_client()
-            user_info = sp.current_user()
-            product = user_info.get("product", "")
-            if product and product.lower() != "premium":
+            spotify = self.get_spotify()
+            if not spotify.is_premium():
                 QMessageBox.critical(self, "Error", "Spotify Premium is required for playback.")
                 return
-            devices = sp.devices().get("devices", [])
-            if not devices:
-                QMessageBox.critical(self, "Error", "No active Spotify devices found. Please open Spotify on a device.")
-                return
-            device_id = devices[0]["id"]
-            sp.add_to_queue(track_uri, device_id=device_id)
-            sp.next_track(device_id=device_id)
-            song = self.model.item(row, 1).text()
+            spotify.play_track(track_uri)
+            song = self.model.text(row, 1)
             self.now_playing_label.setText(f"Now Playing: {song}")
+        except NoActiveDeviceError:
+            QMessageBox.critical(self, "Error", "No active Spotify devices found. Please open Spotify on a device.")
+        except RateLimitedError as e:
+            self.status_bar.showMessage(str(e), 5000)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Playback failed: {e}")
     
     def pausePlayback(self):
+        from spotify_client import RateLimitedError
+
         try:
-            sp = self.get_sp_client()
-            sp.pause_playback()
+            self.get_spotify().pause()
             self.now_playing_label.setText("Now Playing: Paused")
+        except RateLimitedError as e:
+            self.status_bar.showMessage(str(e), 5000)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Pause failed: {e}")
     
     def resumePlayback(self):
+        from spotify_client import NoActiveDeviceError, RateLimitedError
+
         try:
-            sp = self.get_sp_client()
-            devices = sp.devices().get("devices", [])
-            if not devices:
-                QMessageBox.critical(self, "Error", "No active Spotify devices found.")
-                return
-            device_id = devices[0]["id"]
-            sp.start_playback(device_id=device_id)
+            self.get_spotify().resume()
             self.now_playing_label.setText("Now Playing: Resumed")
+        except NoActiveDeviceError:
+            QMessageBox.critical(self, "Error", "No active Spotify devices found.")
+        except RateLimitedError as e:
+            self.status_bar.showMessage(str(e), 5000)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Resume failed: {e}")
     
     def queueSelectedTrack(self):
+        from spotify_client import NoActiveDeviceError, RateLimitedError
+
         selected_indexes = self.table_view.selectionModel().selectedRows()
         if not selected_indexes:
             QMessageBox.information(self, "Queue", "No row selected.")
             return
         row = selected_indexes[0].row()
-        track_uri = self.model.item(row, 4).text()
+        track_uri = self.model.text(row, 4)
         track_uri = self.normalize_track_uri(track_uri)
         if not track_uri.startswith("spotify:track:"):
             QMessageBox.information(self, "Queue", "Invalid track URI.")
             return
         try:
-            sp = self.get_sp_client()
-            devices = sp.devices().get("devices", [])
-            if not devices:
-                QMessageBox.critical(self, "Error", "No active Spotify devices found.")
-                return
-            device_id = devices[0]["id"]
-            sp.add_to_queue(track_uri, device_id=device_id)
+            self.get_spotify().queue_track(track_uri)
             self.status_bar.showMessage("Track added to queue", 3000)
+        except NoActiveDeviceError:
+            QMessageBox.critical(self, "Error", "No active Spotify devices found.")
+        except RateLimitedError as e:
+            self.status_bar.showMessage(str(e), 5000)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to queue track: {e}")
     
     def addSelectedTrackToHistory(self):
+        from spotify_client import RateLimitedError
+
         selected_indexes = self.table_view.selectionModel().selectedRows()
         if not selected_indexes:
             QMessageBox.information(self, "Playlist", "No row selected.")
             return
         row = selected_indexes[0].row()
-        track_uri = self.model.item(row, 4).text()
+        track_uri = self.model.text(row, 4)
         track_uri = self.normalize_track_uri(track_uri)
         if not track_uri.startswith("spotify:track:"):
             QMessageBox.information(self, "Playlist", "Invalid track URI.")
             return
         try:
-            sp = self.get_sp_client()
-            user_info = sp.current_user()
-            user_id = user_info["id"]
-            history_playlist = None
-            playlists = sp.current_user_playlists(limit=50)
-            for playlist in playlists["items"]:
-                if playlist["name"].lower() == "history":
-                    history_playlist = playlist
-                    break
-            if not history_playlist:
-                history_playlist = sp.user_playlist_create(
-                    user=user_id, name="history", public=True,
-                    description="History playlist from the app"
-                )
-            sp.playlist_add_items(history_playlist["id"], [track_uri])
+            self.get_spotify()
+            playlist_id = self.playlist_engine.find_or_create("history", "History playlist from the app")
+            self.playlist_engine.add_tracks(playlist_id, [track_uri])
             self.status_bar.showMessage("Track added to 'history' playlist", 3000)
+        except RateLimitedError as e:
+            self.status_bar.showMessage(str(e), 5000)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to add track to 'history' playlist:\n{e}")
     
@@ -508,70 +1770,86 @@ class StreamingHistoryViewer(QMainWindow):
         if not selected:
             QMessageBox.information(self, "Info", "No rows selected.")
             return
-        track_uris = []
-        dates = []
-        for idx in selected:
-            row = idx.row()
-            track_uri = self.model.item(row, 4).text()  # Hidden column
-            track_uri = self.normalize_track_uri(track_uri)
-            date_time = self.model.item(row, 0).text()
-            if track_uri.startswith("spotify:track:"):
-                track_uris.append(track_uri)
-                dates.append(date_time)
-        if not track_uris:
+        self.buildPlaylist([self.model.sourceRow(idx.row()) for idx in selected])
+    
+    def createPlaylistFromResults(self):
+        if not self.model.rowCount():
+            QMessageBox.information(self, "Info", "No rows listed.")
+            return
+        self.buildPlaylist(self.model.sourceRows(0, self.model.rowCount()))
+    
+    def buildPlaylist(self, rows):
+        import pandas as pd
+        from history_core import track_rows, unique_track_uris
+
+        rows = track_rows(self.full_df, rows)
+        if not len(rows):
             QMessageBox.information(self, "Info", "No valid tracks selected.")
             return
-        track_uris = list(dict.fromkeys(track_uris))
-        try:
-            parsed_min = pd.to_datetime(min(dates), errors="coerce")
-            parsed_max = pd.to_datetime(max(dates), errors="coerce")
-            start_str = parsed_min.strftime("%Y-%m-%d") if pd.notnull(parsed_min) else "unknown"
-            end_str = parsed_max.strftime("%Y-%m-%d") if pd.notnull(parsed_max) else "unknown"
-        except Exception:
-            start_str, end_str = "unknown", "unknown"
+        track_uris = unique_track_uris(self.full_df, rows)
+        dates = self.full_df["Date/Time"].iloc[rows]
+        parsed_min, parsed_max = dates.min(), dates.max()
+        start_str = parsed_min.strftime("%Y-%m-%d") if pd.notnull(parsed_min) else "unknown"
+        end_str = parsed_max.strftime("%Y-%m-%d") if pd.notnull(parsed_max) else "unknown"
         playlist_name = f"Playlist {start_str} to {end_str}"
         try:
-            sp = self.get_sp_client()
-            user_id = sp.current_user()["id"]
-            playlist = sp.user_playlist_create(
-                user=user_id, name=playlist_name, public=True,
-                description="Created from streaming history"
-            )
-            sp.playlist_add_items(playlist["id"], track_uris)
-            QMessageBox.information(self, "Success", f"Playlist '{playlist_name}' created!")
+            self.get_spotify()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Playlist creation failed:\n{e}")
+            return
+        
+        progress = QProgressDialog(f"Adding {len(track_uris)} tracks to '{playlist_name}'...",
+                                   "Cancel", 0, len(track_uris), self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        signals = PlaylistSignals(self)
+        task = PlaylistTask(self, signals, playlist_name, track_uris)
+        
+        def finished(name, added, total):
+            progress.close()
+            signals.deleteLater()
+            if added < total:
+                QMessageBox.information(self, "Cancelled", f"Playlist '{name}' created with {added} of {total} tracks.")
+            else:
+                QMessageBox.information(self, "Success", f"Playlist '{name}' created!")
+        
+        def failed(message):
+            progress.close()
+            signals.deleteLater()
+            QMessageBox.critical(self, "Error", f"Playlist creation failed:\n{message}")
+        
+        signals.progress.connect(lambda added, total: progress.setValue(added))
+        signals.finished.connect(finished)
+        signals.failed.connect(failed)
+        progress.canceled.connect(task.cancel)
+        progress.show()
+        self.playlist_pool.start(task)
     
-    def fetchAlbumArt(self, track_uri):
-        sp = self.get_sp_client()
+    def fetchAlbumArt(self, track_uri, size):
+        """Return (thumbnail, small blurred background) PIL images, or (None, None).
+
+        Runs on an art worker thread; errors are raised to the caller.
+        """
         track_id = track_uri.split(":")[-1]
-        try:
-            track_info = sp.track(track_id)
-            images = track_info.get("album", {}).get("images", [])
-            if images:
-                image_url = images[0]["url"]
-                response = requests.get(image_url)
-                img_data = response.content
-                img = Image.open(BytesIO(img_data))
-                width, height = self.width(), self.height()
-                blurred = img.copy().resize((width, height), Image.Resampling.LANCZOS)
-                blurred = blurred.filter(ImageFilter.GaussianBlur(radius=15))
-                blurred = blurred.convert("RGBA")
-                overlay = Image.new("RGBA", blurred.size, (0, 0, 0, 80))
-                blurred = Image.alpha_composite(blurred, overlay)
-                blurred = blurred.convert("RGB")
-                album_art = img.copy()
-                album_art.thumbnail((200, 200), Image.Resampling.LANCZOS)
-                return album_art, blurred
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error fetching album art:\n{e}")
+        art = self.art_cache.get(track_id, self.albumImageUrl, self.downloadImage)
+        if art is not None:
+            with recorder.span("art render"):
+                return render_album_art(art, size)
         return None, None
     
-    def pil2pixmap(self, im):
-        im = im.convert("RGB")
-        data = im.tobytes("raw", "RGB")
-        qimg = QImage(data, im.size[0], im.size[1], QImage.Format_RGB888)
-        return QPixmap.fromImage(qimg)
+    def albumImageUrl(self, track_id):
+        info = self.metadata_store.get(track_id)
+        if info is None:
+            self.metadata_store.fetch(self.get_spotify(), [track_id])
+            info = self.metadata_store.get(track_id) or {}
+        images = info.get("images", [])
+        return images[0]["url"] if images else None
+    
+    def downloadImage(self, url):
+        with recorder.span("image download"):
+            response = self.httpSession().get(url, timeout=10)
+        response.raise_for_status()
+        return response.content
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
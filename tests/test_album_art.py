@@ -0,0 +1,93 @@
+"""AlbumArtCache: URL lookups without art, atomic image writes, unreadable entries and what stays in memory."""
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+import album_art
+from album_art import ART_BACKGROUND_SOURCE_SIZE, ART_THUMBNAIL_SIZE, AlbumArtCache, render_album_art
+
+
+def png_bytes(size=(4, 4)):
+    out = BytesIO()
+    Image.new("RGB", size, "red").save(out, format="PNG")
+    return out.getvalue()
+
+
+class Spotify:
+    """Counts the URL lookups and downloads the cache asks for."""
+
+    def __init__(self, url="https://img.example/a.png", size=(4, 4)):
+        self.url = url
+        self.size = size
+        self.lookups = 0
+        self.downloads = 0
+
+    def lookup_url(self, track_id):
+        self.lookups += 1
+        return self.url
+
+    def download(self, url):
+        self.downloads += 1
+        return png_bytes(self.size)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "art")
+
+
+def test_missing_art_is_looked_up_again_after_its_ttl(path, monkeypatch):
+    spotify = Spotify(url=None)
+    now = [1000.0]
+    monkeypatch.setattr(album_art.time, "time", lambda: now[0])
+    assert AlbumArtCache(path).get("track", spotify.lookup_url, spotify.download) is None
+    assert AlbumArtCache(path).get("track", spotify.lookup_url, spotify.download) is None
+    assert spotify.lookups == 1
+
+    now[0] += album_art.ART_MISSING_TTL
+    spotify.url = "https://img.example/a.png"
+    assert AlbumArtCache(path).get("track", spotify.lookup_url, spotify.download)[0].size == (4, 4)
+    assert spotify.lookups == 2
+
+
+def test_images_are_written_without_leftover_temp_files(path):
+    spotify = Spotify()
+    AlbumArtCache(path).get("track", spotify.lookup_url, spotify.download)
+    assert sorted(os.listdir(path)) == ["track.img", "urls.json"]
+
+
+def test_unreadable_disk_entries_are_dropped_and_fetched_again(path):
+    spotify = Spotify()
+    AlbumArtCache(path).get("track", spotify.lookup_url, spotify.download)
+    with open(os.path.join(path, "track.img"), "wb") as f:
+        f.write(b"not an image")
+
+    cache = AlbumArtCache(path)
+    assert cache.get("track", spotify.lookup_url, spotify.download)[0].size == (4, 4)
+    assert spotify.downloads == 2
+    with open(os.path.join(path, "track.img"), "rb") as f:
+        assert f.read() == png_bytes()
+
+
+def test_undecodable_downloads_are_not_cached(path):
+    spotify = Spotify()
+    with pytest.raises(UnidentifiedImageError):
+        AlbumArtCache(path).get("track", spotify.lookup_url, lambda url: b"not an image")
+    assert not os.path.exists(os.path.join(path, "track.img"))
+
+
+def test_memory_keeps_the_thumbnail_and_background_source_only(path):
+    spotify = Spotify(size=(640, 640))
+    cache = AlbumArtCache(path)
+    thumbnail, source = cache.get("track", spotify.lookup_url, spotify.download)
+    assert thumbnail.size == (ART_THUMBNAIL_SIZE, ART_THUMBNAIL_SIZE)
+    assert source.size == (ART_BACKGROUND_SOURCE_SIZE, ART_BACKGROUND_SOURCE_SIZE)
+    assert cache.stats()["memory_bytes"] == 3 * (ART_THUMBNAIL_SIZE ** 2 + ART_BACKGROUND_SOURCE_SIZE ** 2)
+
+    art = cache.get("track", spotify.lookup_url, spotify.download)
+    assert cache.hits["memory"] == 1 and spotify.downloads == 1
+    thumbnail, background = render_album_art(art, (3840, 2160))
+    assert thumbnail.size == (ART_THUMBNAIL_SIZE, ART_THUMBNAIL_SIZE)
+    assert background.size == (480, 270)
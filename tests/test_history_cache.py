@@ -0,0 +1,81 @@
+"""HistoryCache reuse of parsed files and of the merged frame across loads."""
+import json
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from history_core import HistoryCache, load_history_frame
+
+
+def write_export(path, *times):
+    records = [{"ts": ts, "ms_played": 1000, "master_metadata_track_name": f"Song {i}",
+                "master_metadata_album_artist_name": "Artist", "spotify_track_uri": f"spotify:track:{i}",
+                "skipped": None} for i, ts in enumerate(times)]
+    path.write_text(json.dumps(records), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def files(tmp_path):
+    return [write_export(tmp_path / "a.json", "2020-01-01T10:00:00Z", "2020-01-02T10:00:00Z"),
+            write_export(tmp_path / "b.json", "2020-01-01T10:00:00Z", "2020-01-03T10:00:00Z")]
+
+
+def test_reopen_reads_the_merged_frame_back(tmp_path, files):
+    cache = HistoryCache(str(tmp_path / "cache"))
+    df, keys, plays = load_history_frame(files, max_workers=1, cache=cache)
+    assert (len(df), len(keys), plays) == (3, 3, 4)
+
+    cache = HistoryCache(str(tmp_path / "cache"))
+    cached_df, cached_keys, cached_plays = load_history_frame(files, max_workers=1, cache=cache)
+    assert cache.hits == cache.misses == 0  # no file was even looked up
+    pd.testing.assert_frame_equal(cached_df, df)
+    assert cached_keys.arrays[0].tolist() == keys.arrays[0].tolist()
+    assert cached_plays == plays
+
+
+def test_frame_is_keyed_by_file_contents_in_order(tmp_path, files):
+    cache = HistoryCache(str(tmp_path / "cache"))
+    load_history_frame(files, max_workers=1, cache=cache)
+
+    load_history_frame(files[::-1], max_workers=1, cache=cache)
+    assert cache.hits == 2  # a new order merges again, from the cached files
+
+    write_export(tmp_path / "b.json", "2020-01-04T10:00:00Z")
+    df, _, _ = load_history_frame(files, max_workers=1, cache=cache)
+    assert (cache.hits, cache.misses) == (3, 3)
+    assert len(df) == 3
+
+
+def test_threads_can_share_one_cache(tmp_path, files):
+    cache = HistoryCache(str(tmp_path / "cache"))
+    errors = []
+
+    def load(order):
+        try:
+            for _ in range(3):
+                load_history_frame(order, max_workers=1, cache=cache)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=load, args=(order,)) for order in (files, files[::-1], files)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    entries = HistoryCache(str(tmp_path / "cache")).manifest["entries"]
+    assert len(entries) == 4  # two files and the frames of both orders
+    assert sorted(entries) == sorted(name for name in os.listdir(tmp_path / "cache") if name != "manifest.json")
+
+
+def test_no_files_leave_the_cache_alone(tmp_path, files):
+    cache = HistoryCache(str(tmp_path / "cache"))
+    load_history_frame(files, max_workers=1, cache=cache)
+    entries = sorted(cache.manifest["entries"])
+
+    df, keys, plays = load_history_frame([], cache=cache)
+    assert (len(df), len(keys), plays) == (0, 0, 0)
+    assert sorted(HistoryCache(str(tmp_path / "cache")).manifest["entries"]) == entries
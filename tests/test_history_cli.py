@@ -0,0 +1,82 @@
+"""history.py command line: filters, --top and output formats, and the imports it avoids."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import history
+
+PLAYS = [
+    ("2022-12-31T23:00:00Z", "One More Time", "Daft Punk", 9000, None),
+    ("2023-01-01T00:00:00Z", "One More Time", "Daft Punk", 1000, False),
+    ("2023-01-03T12:00:00Z", "D.A.N.C.E.", "Justice", 3000, False),
+    ("2023-01-05T12:00:00Z", "One More Time", "daft punk", 2000, True),
+    ("2023-01-10T12:00:00Z", "Around the World", "Daft Punk", 5000, False),
+    ("2023-01-31T23:59:00Z", "Around the World", "Daft Punk", 1000, None),
+    ("2023-02-01T00:00:00Z", "Digital Love", "Daft Punk", 4000, False),
+]
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the HistoryCache directory goes here
+    export = tmp_path / "export"
+    export.mkdir()
+    records = [{"ts": ts, "master_metadata_track_name": song, "master_metadata_album_artist_name": artist,
+                "spotify_track_uri": f"spotify:track:{song.replace(' ', '')}", "ms_played": ms, "skipped": skipped}
+               for ts, song, artist, ms, skipped in PLAYS]
+    (export / "Streaming_History_Audio_2022.json").write_text(json.dumps(records[:1]), encoding="utf-8")
+    (export / "Streaming_History_Audio_2023.json").write_text(json.dumps(records[1:]), encoding="utf-8")
+    return str(export)
+
+
+def run(capsys, *argv):
+    assert history.main(list(argv)) == 0
+    return capsys.readouterr().out
+
+
+def test_top_tracks_of_an_artist_in_a_date_range(files, capsys):
+    out = run(capsys, "query", files, "--artist", "DAFT PUNK", "--from", "2023-01-01", "--to", "2023-01-31",
+              "--top", "5", "--format", "csv")
+    assert out == ("Song,Creator,Plays,Played (ms),Skip Rate\n"
+                   "Around the World,Daft Punk,2,6000,0.0\n"
+                   "One More Time,Daft Punk,2,3000,0.5\n")
+    # A second run reads the cache and prints the same.
+    assert run(capsys, "query", files, "--artist", "DAFT PUNK", "--from", "2023-01-01", "--to", "2023-01-31",
+               "--top", "5", "--format", "csv") == out
+
+
+def test_plays_are_listed_as_history_records(files, capsys):
+    out = run(capsys, "query", files, "--artist", "daft punk", "--from", "2023-01-05", "--to", "2023-01-31",
+              "--format", "jsonl", "--no-cache")
+    assert [json.loads(line) for line in out.splitlines()] == [
+        {"ts": "2023-01-05T12:00:00Z", "master_metadata_track_name": "One More Time",
+         "master_metadata_album_artist_name": "daft punk", "spotify_track_uri": "spotify:track:OneMoreTime",
+         "skipped": True, "ms_played": 2000},
+        {"ts": "2023-01-10T12:00:00Z", "master_metadata_track_name": "Around the World",
+         "master_metadata_album_artist_name": "Daft Punk", "spotify_track_uri": "spotify:track:AroundtheWorld",
+         "skipped": False, "ms_played": 5000},
+        {"ts": "2023-01-31T23:59:00Z", "master_metadata_track_name": "Around the World",
+         "master_metadata_album_artist_name": "Daft Punk", "spotify_track_uri": "spotify:track:AroundtheWorld",
+         "skipped": None, "ms_played": 1000},
+    ]
+
+
+def test_no_matches_still_print_the_csv_header(files, capsys):
+    out = run(capsys, "query", files, "--artist", "Nobody", "--format", "csv", "--no-cache")
+    assert out == "Date/Time,Song,Creator,Track URI,Skipped,Played (ms)\n"
+
+
+def test_stats(files, capsys):
+    out = run(capsys, "stats", files, "--from", "2023-01-01", "--to", "2023-01-31", "--no-cache")
+    assert out == "plays,ms_played,skip_rate,tracks,artists\n5,12000,0.2,3,3\n"
+
+
+def test_import_does_not_load_the_gui_or_network_libraries():
+    code = ("import sys, history; "
+            "print(sorted(name for name in ('PyQt5', 'PIL', 'spotipy') if name in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=Path(history.__file__).parent, capture_output=True,
+                         text=True, check=True).stdout
+    assert out.strip() == "[]"
@@ -0,0 +1,117 @@
+"""Streaming exports: chunking, CSV / JSON lines round trips, empty selections and cancelling."""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from history_core import (HistoryColumns, PlayKeySet, empty_history_frame, export_chunks, export_history,
+                          load_history_files, merge_history, write_frames)
+
+RECORDS = [
+    {"ts": "2020-01-01T10:00:00Z", "ms_played": 1000, "master_metadata_track_name": "Song, with a comma",
+     "master_metadata_album_artist_name": "Artist", "spotify_track_uri": "spotify:track:a", "skipped": True},
+    {"ts": "2020-01-02T10:00:00Z", "ms_played": 2000, "master_metadata_track_name": 'Say "Hi"\nagain',
+     "master_metadata_album_artist_name": "Ärtist", "spotify_track_uri": "spotify:track:b", "skipped": False},
+    {"ts": "2020-01-03T10:00:00Z", "ms_played": 3000, "episode_name": "An episode"},
+    {"ts": "2020-01-04T10:00:00Z", "ms_played": 4000, "master_metadata_track_name": "Song",
+     "master_metadata_album_artist_name": "Artist", "spotify_track_uri": "spotify:track:c"},
+    {"ts": "2020-01-05T10:00:00Z", "ms_played": 5000, "master_metadata_track_name": "Song",
+     "master_metadata_album_artist_name": "Artist", "spotify_track_uri": "spotify:track:c", "skipped": True},
+]
+
+
+@pytest.fixture(scope="module")
+def df():
+    columns = HistoryColumns()
+    for record in RECORDS:
+        columns.append(record)
+    df, _ = merge_history(empty_history_frame(), PlayKeySet(), [columns.to_chunk()])
+    return df
+
+
+def plain(df):
+    """The frame's values with missing strings and skip flags as None, for comparing exports."""
+    return df.astype(object).where(df.notna(), None).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("rows, positions, sizes", [
+    (None, [0, 1, 2, 3, 4], [2, 2, 1]),
+    (slice(1, 4), [1, 2, 3], [2, 1]),
+    (np.array([0, 2, 4]), [0, 2, 4], [2, 1]),
+    (np.array([], dtype=np.int64), [], [0]),
+])
+def test_chunks_cover_the_rows(df, rows, positions, sizes):
+    chunks = list(export_chunks(df, rows, chunk_rows=2))
+    assert [len(chunk) for chunk in chunks] == sizes
+    assert pd.concat(chunks)["Played (ms)"].tolist() == df["Played (ms)"].iloc[positions].tolist()
+    assert list(chunks[0].columns) == list(df.columns)
+
+
+def test_csv_round_trip(df, tmp_path):
+    path = str(tmp_path / "plays.csv")
+    assert export_history(df, path, "csv", chunk_rows=2) == len(df)
+    back = pd.read_csv(path, keep_default_na=False, na_values=[""])
+    assert list(back.columns) == list(df.columns)
+    assert pd.to_datetime(back["Date/Time"], utc=True).tolist() == df["Date/Time"].tolist()
+    expected = plain(df)
+    for name in ("Song", "Creator", "Track URI", "Skipped", "Played (ms)"):
+        assert plain(back)[name].tolist() == expected[name].tolist()
+
+
+def test_jsonl_round_trip(df, tmp_path):
+    path = str(tmp_path / "plays.jsonl")
+    assert export_history(df, path, "jsonl", chunk_rows=2) == len(df)
+    with open(path, encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == len(df)
+    back = load_history_files([path], max_workers=1)
+    pd.testing.assert_frame_equal(plain(back), plain(df))
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_rows_are_exported_in_the_given_order(df, tmp_path, fmt):
+    path = str(tmp_path / f"plays.{fmt}")
+    assert export_history(df, path, fmt, rows=np.array([4, 1]), chunk_rows=1) == 2
+    if fmt == "csv":
+        assert pd.read_csv(path)["Played (ms)"].tolist() == [5000, 2000]
+    else:
+        assert pd.read_json(path, lines=True)["ms_played"].tolist() == [5000, 2000]
+
+
+def test_empty_selection_still_writes_the_csv_header(df, tmp_path):
+    path = str(tmp_path / "plays.csv")
+    assert export_history(df, path, "csv", rows=np.array([], dtype=np.int64)) == 0
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == ",".join(df.columns) + "\n"
+
+    out = io.StringIO()
+    assert write_frames(export_chunks(empty_history_frame()), out, "csv", plays=True) == 0
+    assert out.getvalue() == ",".join(df.columns) + "\n"
+
+    out = io.StringIO()
+    assert write_frames(export_chunks(df, slice(0, 0)), out, "jsonl", plays=True) == 0
+    assert out.getvalue() == ""
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_cancelling_removes_the_partial_file(df, tmp_path, fmt):
+    path = str(tmp_path / f"plays.{fmt}")
+    progress = []
+
+    def on_progress(done, total):
+        progress.append((done, total))
+        return done < 2
+
+    assert export_history(df, path, fmt, on_progress=on_progress, chunk_rows=2) is None
+    assert progress == [(2, 5)]
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_export_removes_the_partial_file(df, tmp_path):
+    def on_progress(done, total):
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError):
+        export_history(df, str(tmp_path / "plays.csv"), "csv", on_progress=on_progress, chunk_rows=2)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,39 @@
+"""Parsing export files in this process or in worker processes, and reporting files that fail."""
+import json
+
+import pytest
+
+from history_core import load_history_chunks, load_history_files
+
+
+@pytest.fixture
+def good(tmp_path):
+    path = tmp_path / "good.json"
+    path.write_text(json.dumps([{"ts": "2020-01-01T10:00:00Z", "ms_played": 1000,
+                                 "master_metadata_track_name": "Song", "spotify_track_uri": "spotify:track:a"}]))
+    return str(path)
+
+
+@pytest.fixture
+def bad(tmp_path):
+    path = tmp_path / "bad.json"
+    path.write_text('[{"ts": "2020-01-01T10:00:00Z", ')
+    return str(path)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_failures_go_to_on_error(good, bad, max_workers):
+    errors = []
+    chunks = load_history_chunks([good, bad], on_error=lambda path, e: errors.append(path), max_workers=max_workers)
+    assert len(chunks[0]["Date/Time"]) == 1 and chunks[1] is None
+    assert errors == [bad]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_failures_raise_without_on_error(good, bad, max_workers):
+    with pytest.raises(ValueError):
+        load_history_files([good, bad], max_workers=max_workers)
+
+
+def test_progress_can_cancel_in_process(good):
+    assert load_history_chunks([good], on_progress=lambda done: False) is None
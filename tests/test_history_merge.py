@@ -0,0 +1,77 @@
+"""Play deduplication in merge_history() across the extended and legacy export schemas."""
+from history_core import HistoryCache, HistoryColumns, PlayKeySet, empty_history_frame, merge_history
+
+PLAY = {"ts": "2020-01-01T10:00:05Z", "ms_played": 1000, "master_metadata_track_name": "Song",
+        "master_metadata_album_artist_name": "Artist", "spotify_track_uri": "spotify:track:abc"}
+LEGACY_PLAY = {"endTime": "2020-01-01 10:00", "msPlayed": 1000, "trackName": "Song", "artistName": "Artist"}
+
+
+def chunk(*records):
+    columns = HistoryColumns()
+    for record in records:
+        columns.append(record)
+    return columns.to_chunk()
+
+
+def merge(*chunks):
+    keys = PlayKeySet()
+    df = empty_history_frame()
+    added = []
+    for part in chunks:
+        df, count = merge_history(df, keys, [part])
+        added.append(count)
+    return df, added
+
+
+def test_exact_duplicates_are_dropped():
+    _, added = merge(chunk(PLAY, PLAY), chunk(PLAY))
+    assert added == [1, 0]
+
+
+def test_distinct_plays_in_the_same_minute_are_kept():
+    replay = dict(PLAY, ts="2020-01-01T10:00:45Z")
+    _, added = merge(chunk(PLAY, replay))
+    assert added == [2]
+
+
+def test_episodes_without_a_track_uri_are_kept_apart():
+    episodes = [{"ts": f"2020-01-01T11:00:0{i}Z", "ms_played": 500, "episode_name": f"Episode {i}"}
+                for i in range(3)]
+    _, added = merge(chunk(*episodes))
+    assert added == [3]
+
+
+def test_legacy_rows_match_extended_rows_either_way():
+    assert merge(chunk(PLAY), chunk(LEGACY_PLAY))[1] == [1, 0]
+    assert merge(chunk(LEGACY_PLAY), chunk(PLAY))[1] == [1, 0]
+    assert merge(chunk(LEGACY_PLAY, LEGACY_PLAY))[1] == [1]
+
+
+def test_extended_row_wins_over_legacy_in_one_batch():
+    keys = PlayKeySet()
+    df, added = merge_history(empty_history_frame(), keys, [chunk(LEGACY_PLAY), chunk(PLAY)])
+    assert added == 1
+    assert df["Track URI"].tolist() == ["spotify:track:abc"]
+
+
+def test_legacy_and_episode_rows_merge_into_a_loaded_frame():
+    # Their empty Track URI / Song tables have another categories dtype than the loaded frame's.
+    legacy = dict(LEGACY_PLAY, endTime="2021-01-01 10:00")
+    episode = {"ts": "2021-02-01T11:00:05Z", "ms_played": 5, "episode_name": "Episode"}
+    df, added = merge(chunk(PLAY), chunk(legacy), chunk(episode))
+    assert added == [1, 1, 1]
+    assert df["Track URI"].tolist()[0] == "spotify:track:abc"
+    assert df["Song"].tolist()[:2] == ["Song", "Song"]
+    assert df["Track URI"].isna().tolist() == [False, True, True]
+
+
+def test_plays_merge_into_a_frame_read_back_from_the_cache(tmp_path):
+    cache = HistoryCache(str(tmp_path))
+    keys = PlayKeySet()
+    df, _ = merge_history(empty_history_frame(), keys, [chunk(LEGACY_PLAY)])
+    cache.store_frame(["a"], df, keys, 1)
+    cache.save()
+    df, keys, _ = HistoryCache(str(tmp_path)).lookup_frame(["a"])
+    df, added = merge_history(df, keys, [chunk(dict(PLAY, ts="2021-01-01T10:00:00Z"))])
+    assert added == 1
+    assert df["Track URI"].tolist()[1] == "spotify:track:abc"
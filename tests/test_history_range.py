@@ -0,0 +1,90 @@
+"""Date range selection: [start, end) bounds, time zones, empty ranges and the viewer's presets."""
+import pandas as pd
+import pytest
+
+from history_core import (HistoryColumns, HistoryStats, PlayKeySet, date_range_bounds, date_range_presets,
+                          empty_history_frame, history_times, merge_history, select_rows)
+
+TIMES = [
+    "2019-12-31T23:59:59Z",
+    "2020-01-01T00:00:00Z",
+    "2020-01-01T12:00:00Z",
+    "2020-01-02T00:00:00Z",
+    "2020-06-15T08:00:00Z",
+    "2021-03-01T00:00:00Z",
+]
+
+
+@pytest.fixture(scope="module")
+def df():
+    columns = HistoryColumns()
+    for i, ts in enumerate(TIMES):
+        columns.append({"ts": ts, "ms_played": 1000, "master_metadata_track_name": f"Song {i}",
+                        "master_metadata_album_artist_name": "Artist", "spotify_track_uri": f"spotify:track:{i}"})
+    df, _ = merge_history(empty_history_frame(), PlayKeySet(), [columns.to_chunk()])
+    return df
+
+
+def positions(df, rows):
+    return list(range(*rows.indices(len(df)))) if isinstance(rows, slice) else rows.tolist()
+
+
+def test_start_is_inclusive_and_end_exclusive(df):
+    times = history_times(df)
+    assert date_range_bounds(times, "2020-01-01", "2020-01-02") == (1, 3)
+    assert date_range_bounds(times, "2020-01-01T12:00:00", "2020-01-02T00:00:01") == (2, 4)
+    assert date_range_bounds(times, None, "2020-01-01") == (0, 1)
+    assert date_range_bounds(times, "2020-01-02", None) == (3, 6)
+    assert date_range_bounds(times) == (0, 6)
+
+
+@pytest.mark.parametrize("start, first", [
+    ("2020-01-01T01:00:00+01:00", 1),  # midnight UTC
+    ("2019-12-31T19:00:00-05:00", 1),  # midnight UTC
+    ("2019-12-31T19:00:01-05:00", 2),  # just past it
+    (pd.Timestamp("2020-01-01", tz="Europe/Berlin"), 0),  # 23:00 UTC the day before
+    (pd.Timestamp("2020-01-01 12:00"), 2),  # naive means UTC
+])
+def test_time_zone_aware_bounds_are_compared_in_utc(df, start, first):
+    assert date_range_bounds(history_times(df), start)[0] == first
+
+
+@pytest.mark.parametrize("start, end", [
+    ("2020-01-01", "2020-01-01"),
+    ("2020-01-02", "2020-01-01"),  # end before start
+    ("2022-01-01", "2023-01-01"),  # after the last play
+    ("2020-02-01", "2020-03-01"),  # between plays
+])
+def test_empty_ranges_select_nothing(df, start, end):
+    first, last = date_range_bounds(history_times(df), start, end)
+    assert first == last
+    assert positions(df, select_rows(df, start, end)) == []
+    assert positions(df, select_rows(df, start, end, query="song")) == []
+    assert positions(df, select_rows(df, start, end, artist="artist")) == []
+
+
+def test_filters_only_match_inside_the_range(df):
+    assert positions(df, select_rows(df, "2020-01-01", "2020-06-16", query="song")) == [1, 2, 3, 4]
+    assert positions(df, select_rows(df, "2020-01-01", "2020-06-16", artist="ARTIST")) == [1, 2, 3, 4]
+    assert positions(df, select_rows(df, end="2020-01-01T12:00:00Z", song="song 2")) == []
+    assert positions(df, select_rows(df, end="2020-01-01T12:00:01Z", song="song 2")) == [2]
+
+
+def test_presets(df):
+    stats = HistoryStats(df)
+    presets = dict(date_range_presets(stats.first_day, stats.last_day))
+    assert list(presets) == ["All Time", "Last 30 Days", "Last 12 Months", "2021", "2020", "2019"]
+    assert presets["Last 30 Days"] == (pd.Timestamp("2021-01-31"), pd.Timestamp("2021-03-02"))
+    assert presets["Last 12 Months"] == (pd.Timestamp("2020-04-01"), pd.Timestamp("2021-04-01"))
+
+    times = [pd.Timestamp(ts).tz_localize(None) for ts in TIMES]
+    for start, end in presets.values():
+        inside = [i for i, ts in enumerate(times) if (start is None or ts >= start) and (end is None or ts < end)]
+        assert positions(df, select_rows(df, start, end)) == inside
+    assert positions(df, select_rows(df, *presets["2020"])) == [1, 2, 3, 4]
+    assert positions(df, select_rows(df, *presets["Last 12 Months"])) == [4, 5]
+
+
+def test_history_without_dates_only_has_all_time():
+    stats = HistoryStats(empty_history_frame())
+    assert date_range_presets(stats.first_day, stats.last_day) == [("All Time", (None, None))]
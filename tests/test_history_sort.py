@@ -0,0 +1,83 @@
+"""SortOrders permutations, alone and applied to the rows of a search or date range."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from history_core import (HistoryColumns, PlayKeySet, SearchIndex, SortOrders, empty_history_frame, merge_history,
+                          select_rows)
+
+PLAYS = [
+    ("beta", "Band", True),
+    ("Alpha", "artist", False),
+    (None, None, None),  # an episode: no song, creator or skip flag
+    ("alpha", "Band", True),
+    ("Gamma", None, None),
+    ("beta", "Artist", False),
+    ("Delta", "band", None),
+]
+
+
+@pytest.fixture(scope="module")
+def df():
+    columns = HistoryColumns()
+    for day, (song, creator, skipped) in enumerate(PLAYS, start=1):
+        columns.append({"ts": f"2020-01-{day:02}T10:00:00Z", "ms_played": 1000, "skipped": skipped,
+                        "master_metadata_track_name": song, "master_metadata_album_artist_name": creator,
+                        "spotify_track_uri": song and f"spotify:track:{song}", "episode_name": "Episode"})
+    df, _ = merge_history(empty_history_frame(), PlayKeySet(), [columns.to_chunk()])
+    return df
+
+
+def expected(df, column, descending, rows=None):
+    """Reference order: casefolded values, ties in time order, missing values last either way."""
+    rows = range(len(df)) if rows is None else rows
+    values = df[column].tolist()
+    present = [i for i in rows if not pd.isna(values[i])]
+    key = (lambda i: values[i].casefold()) if isinstance(values[present[0]], str) else (lambda i: values[i])
+    ordered = sorted(present, key=key, reverse=descending)  # sorted() stays stable with reverse=True
+    return ordered + [i for i in rows if i not in present]
+
+
+def positions(rows, size):
+    return list(range(*rows.indices(size))) if isinstance(rows, slice) else list(rows)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("column", ["Date/Time", "Song", "Creator", "Skipped", "Track URI"])
+def test_order_matches_a_reference_sort(df, column, descending):
+    assert SortOrders(df).order(column, descending).tolist() == expected(df, column, descending)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_missing_values_sort_last(df, descending):
+    orders = SortOrders(df)
+    assert orders.order("Song", descending).tolist()[-1] == 2
+    assert orders.order("Creator", descending).tolist()[-2:] == [2, 4]
+    assert orders.order("Skipped", descending).tolist()[-3:] == [2, 4, 6]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("column", ["Date/Time", "Song", "Skipped"])
+def test_sorting_a_search_or_date_range(df, column, descending):
+    orders = SortOrders(df)
+    found = select_rows(df, query="ta", search_index=SearchIndex(df))
+    assert found.tolist() == [0, 5, 6]
+    assert positions(orders.sort_rows(found, column, descending), len(df)) == \
+        expected(df, column, descending, found.tolist())
+
+    days = select_rows(df, start="2020-01-02", end="2020-01-06")
+    assert days == slice(1, 5)
+    assert positions(orders.sort_rows(days, column, descending), len(df)) == \
+        expected(df, column, descending, range(1, 5))
+
+    both = select_rows(df, start="2020-01-02", query="a")
+    assert positions(orders.sort_rows(both, column, descending), len(df)) == \
+        expected(df, column, descending, both.tolist())
+
+
+def test_orders_are_cached_and_unknown_columns_rejected(df):
+    orders = SortOrders(df)
+    assert orders.order("Song") is orders.order("Song")
+    assert isinstance(orders.sort_rows(slice(0, len(df)), "Song"), np.ndarray)
+    with pytest.raises(ValueError):
+        orders.order("Played (ms)")
@@ -0,0 +1,101 @@
+"""HistoryStats rollups checked against a plain pandas groupby over the same plays."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from history_core import WEEKDAYS, HistoryColumns, HistoryStats, PlayKeySet, empty_history_frame, merge_history
+
+RANGES = [
+    (None, None),
+    ("2020-02-01", "2020-04-01"),  # whole months
+    ("2020-01-10", "2020-03-20"),  # whole days
+    ("2020-01-10T15:30:00Z", "2020-03-20T06:00:00+02:00"),  # inside days: truncated to UTC midnight
+    ("2020-05-01", "2020-06-01"),  # no plays
+]
+
+
+@pytest.fixture(scope="module")
+def df():
+    rng = np.random.default_rng(7)
+    start = pd.Timestamp("2020-01-01", tz="UTC").value
+    seconds = np.sort(rng.integers(0, 100 * 86400, 600))
+    columns = HistoryColumns()
+    for second, track, skipped in zip(seconds, rng.integers(0, 12, 600), rng.integers(-1, 2, 600)):
+        ts = pd.Timestamp(start + int(second) * 10**9, tz="UTC").strftime("%Y-%m-%dT%H:%M:%SZ")
+        record = {"ts": ts, "ms_played": 1000 + int(second) % 7000, "skipped": None if skipped < 0 else bool(skipped)}
+        if track < 10:  # the rest are episodes, which count towards the totals only
+            record.update(master_metadata_track_name=f"Song {track}", spotify_track_uri=f"spotify:track:{track}",
+                          master_metadata_album_artist_name=f"Artist {track % 4}")
+        columns.append(record)
+    df, _ = merge_history(empty_history_frame(), PlayKeySet(), [columns.to_chunk()])
+    return df
+
+
+def utc_day(value):
+    value = pd.Timestamp(value)
+    return (value.tz_localize("UTC") if value.tz is None else value.tz_convert("UTC")).floor("D")
+
+
+def reference(df, start, end):
+    """The plays HistoryStats counts for [start, end): its bounds floored to whole UTC days."""
+    plays = df.assign(Skipped=df["Skipped"].fillna(False).astype(bool), **{
+        name: df[name].astype(object) for name in ("Song", "Creator", "Track URI")})
+    if start is not None:
+        plays = plays[plays["Date/Time"] >= utc_day(start)]
+    if end is not None:
+        plays = plays[plays["Date/Time"] < utc_day(end)]
+    return plays
+
+
+def totals(plays, by):
+    grouped = plays.groupby(by).agg(plays=("Played (ms)", "size"), ms=("Played (ms)", "sum"),
+                                    skips=("Skipped", "sum"))
+    return {key: (row.plays, row.ms, row.skips / row.plays) for key, row in grouped.iterrows()}
+
+
+@pytest.mark.parametrize("start, end", RANGES)
+def test_summary_matches_groupby(df, start, end):
+    plays = reference(df, start, end)
+    summary = HistoryStats(df).summary(start, end)
+    assert summary["plays"] == len(plays)
+    assert summary["ms_played"] == plays["Played (ms)"].sum()
+    assert summary["skip_rate"] == pytest.approx(plays["Skipped"].mean() if len(plays) else 0.0)
+    assert summary["tracks"] == plays["Track URI"].nunique()
+    assert summary["artists"] == plays["Creator"].nunique()
+
+
+@pytest.mark.parametrize("start, end", RANGES)
+def test_top_tracks_and_artists_match_groupby(df, start, end):
+    plays = reference(df, start, end)
+    stats = HistoryStats(df)
+
+    tracks = stats.top_tracks(n=100, start=start, end=end)
+    expected = totals(plays.dropna(subset=["Track URI"]), ["Song", "Creator"])
+    assert {(song, creator): (count, ms, rate) for song, creator, count, ms, rate in tracks.itertuples(index=False)} \
+        == pytest.approx(expected)
+    assert tracks["Plays"].is_monotonic_decreasing
+
+    artists = stats.top_artists(n=100, start=start, end=end, by="ms")
+    expected = totals(plays.dropna(subset=["Creator"]), "Creator")
+    assert {creator: (count, ms, rate) for creator, count, ms, rate in artists.itertuples(index=False)} \
+        == pytest.approx(expected)
+    assert artists["Played (ms)"].is_monotonic_decreasing
+    ranked = sorted(expected, key=lambda creator: (-expected[creator][0], -expected[creator][1]))
+    assert stats.top_artists(n=2, start=start, end=end)["Creator"].tolist() == ranked[:2]
+
+
+@pytest.mark.parametrize("start, end", RANGES)
+def test_heatmap_matches_groupby(df, start, end):
+    plays = reference(df, start, end)
+    times = plays["Date/Time"].dt
+    for value, column in (("plays", "size"), ("ms", "sum")):
+        expected = plays.groupby([times.weekday, times.hour])["Played (ms)"].agg(column)
+        expected = expected.unstack(fill_value=0).reindex(index=range(7), columns=range(24), fill_value=0)
+        expected.index = list(WEEKDAYS)
+        heatmap = HistoryStats(df).heatmap(start, end, value=value)
+        pd.testing.assert_frame_equal(heatmap, expected, check_dtype=False, check_names=False)
+
+
+def test_bounds_inside_a_day_count_the_whole_day(df):
+    stats = HistoryStats(df)
+    assert stats.summary("2020-01-10T15:30:00Z", "2020-03-20T23:59:59Z") == stats.summary("2020-01-10", "2020-03-20")
@@ -0,0 +1,63 @@
+"""StringDictionary ids under concurrent encodes, and cross-user track totals in HistoryStore."""
+import threading
+
+import pandas as pd
+
+from history_core import HistoryColumns, top_plays
+from history_store import HistoryStore, StringDictionary
+
+
+def test_concurrent_encodes_agree_on_ids(tmp_path):
+    path = tmp_path / "strings" / "song.jsonl"
+    dictionary = StringDictionary(str(path))
+    values = [f"Song {i}" for i in range(2000)]
+    results = []
+
+    def encode(offset):
+        ids = dictionary.encode(values[offset:] + values[:offset])
+        results.append(dict(zip(values[offset:] + values[:offset], ids.tolist())))
+        dictionary.categories()
+
+    threads = [threading.Thread(target=encode, args=(offset,)) for offset in (0, 500, 1000, 1500)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(result == results[0] for result in results)
+    assert sorted(results[0].values()) == list(range(len(values)))
+    reloaded = StringDictionary(str(path))
+    assert [reloaded[i] for i in range(len(reloaded))] == list(dictionary.categories())
+
+
+def chunk(*plays):
+    columns = HistoryColumns()
+    for i, (song, creator, uri) in enumerate(plays):
+        columns.append({"ts": f"2020-01-01T10:{i:02}:00Z", "ms_played": 1000 * (i + 1), "spotify_track_uri": uri,
+                        "master_metadata_track_name": song, "master_metadata_album_artist_name": creator,
+                        "episode_name": None if uri else "Episode"})
+    return columns.to_chunk()
+
+
+def test_tracks_are_combined_by_track_uri(tmp_path):
+    store = HistoryStore(str(tmp_path), max_workers=1)
+    alice = store.add_user("Alice", [chunk(
+        ("Song", "Artist", "spotify:track:a"),
+        ("Song", "Artist", "spotify:track:b"),  # another recording under the same names
+        ("Song (Remastered)", "Artist", "spotify:track:a"),  # renamed, same track
+        (None, None, None),  # an episode
+    )])
+    bob = store.add_user("Bob", [chunk(
+        ("Song (Remastered)", "Artist", "spotify:track:a"),
+        (None, None, None),
+    )])
+
+    counts = store.combined_counts([alice, bob], "track")
+    assert counts.to_dict("records") == [
+        {"Song": "Song", "Creator": "Artist", "Alice": 2, "Bob": 1, "Plays": 3, "Played (ms)": 5000},
+        {"Song": "Song", "Creator": "Artist", "Alice": 1, "Bob": 0, "Plays": 1, "Played (ms)": 2000},
+    ]
+    for user_id in (alice, bob):
+        totals = store.combined_counts([user_id], "track").drop(columns=store.user_labels([user_id]))
+        expected = top_plays(store.frame(user_id), group="track").drop(columns="Skip Rate")
+        pd.testing.assert_frame_equal(totals, expected, check_dtype=False)
+    store.close()
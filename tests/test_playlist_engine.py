@@ -0,0 +1,106 @@
+"""PlaylistEngine requests, checked against a fake client that records every call."""
+import pytest
+
+from spotify_client import PLAYLIST_ADD_BATCH_SIZE, PLAYLISTS_PAGE_SIZE, PRIORITY_BULK, PlaylistEngine
+
+
+class FakeClient:
+    """Serves the user's playlists a page at a time and records the calls made."""
+
+    def __init__(self, playlists=()):
+        self.playlists = list(playlists)
+        self.calls = []
+
+    def current_user(self):
+        return {"id": "me"}
+
+    def call(self, method, *args, **kwargs):
+        self.calls.append((method, args, kwargs))
+        if method == "current_user_playlists":
+            offset, limit = kwargs["offset"], kwargs["limit"]
+            more = offset + limit < len(self.playlists)
+            return {"items": self.playlists[offset:offset + limit], "next": "next page" if more else None}
+        if method == "user_playlist_create":
+            return {"id": f"new-{kwargs['name']}"}
+        return {"snapshot_id": "snapshot"}
+
+    def made(self, method):
+        return [(args, kwargs) for name, args, kwargs in self.calls if name == method]
+
+
+def playlist(i, owner="me", name=None):
+    return {"id": f"p{i}", "name": name or f"Playlist {i}", "owner": {"id": owner}}
+
+
+def test_tracks_are_added_in_order_in_batches_of_100():
+    client = FakeClient()
+    uris = [f"spotify:track:{i}" for i in range(250)]
+    progress = []
+    added = PlaylistEngine(client).add_tracks("p1", uris, PRIORITY_BULK, on_progress=lambda *p: progress.append(p))
+    assert added == 250
+    batches = client.made("playlist_add_items")
+    assert [len(args[1]) for args, _ in batches] == [PLAYLIST_ADD_BATCH_SIZE, PLAYLIST_ADD_BATCH_SIZE, 50]
+    assert [uri for args, _ in batches for uri in args[1]] == uris
+    assert all(args[0] == "p1" and kwargs == {"priority": PRIORITY_BULK} for args, kwargs in batches)
+    assert progress == [(100, 250), (200, 250), (250, 250)]
+
+
+def test_cancelling_stops_before_the_next_batch():
+    client = FakeClient()
+    uris = [f"spotify:track:{i}" for i in range(250)]
+    progress = []
+    engine = PlaylistEngine(client)
+    added = engine.add_tracks("p1", uris, on_progress=lambda *p: progress.append(p),
+                              is_cancelled=lambda: bool(progress))
+    assert added == 100
+    assert len(client.made("playlist_add_items")) == 1
+    assert engine.add_tracks("p1", []) == 0
+    assert len(client.made("playlist_add_items")) == 1
+
+
+def test_index_pages_through_every_playlist():
+    client = FakeClient([playlist(i) for i in range(2 * PLAYLISTS_PAGE_SIZE + 1)])
+    index = PlaylistEngine(client).playlist_index()
+    assert len(index) == 2 * PLAYLISTS_PAGE_SIZE + 1
+    pages = client.made("current_user_playlists")
+    assert [kwargs for _, kwargs in pages] == [{"limit": PLAYLISTS_PAGE_SIZE, "offset": offset}
+                                               for offset in (0, PLAYLISTS_PAGE_SIZE, 2 * PLAYLISTS_PAGE_SIZE)]
+
+
+def test_index_only_keeps_the_users_own_playlists():
+    client = FakeClient([
+        playlist(1, owner="someone else", name="Mix"),
+        playlist(2, name="Mix"),
+        playlist(3, name="MIX"),  # same name in another case: the first one wins
+        playlist(4, owner="someone else", name="Followed"),
+        {"id": "p5", "name": "No owner"},
+    ])
+    assert PlaylistEngine(client).playlist_index() == {"mix": "p2"}
+
+
+def test_index_is_cached_until_refreshed():
+    client = FakeClient([playlist(1)])
+    engine = PlaylistEngine(client)
+    engine.playlist_index()
+    engine.playlist_index()
+    assert len(client.made("current_user_playlists")) == 1
+    client.playlists.append(playlist(2))
+    assert engine.playlist_index(refresh=True) == {"playlist 1": "p1", "playlist 2": "p2"}
+    assert len(client.made("current_user_playlists")) == 2
+
+
+@pytest.mark.parametrize("name, created", [("playlist 1", False), ("Brand New", True)])
+def test_find_or_create(name, created):
+    client = FakeClient([playlist(1)])
+    engine = PlaylistEngine(client)
+    playlist_id = engine.find_or_create(name, "description", public=False)
+    creates = client.made("user_playlist_create")
+    if created:
+        assert playlist_id == f"new-{name}"
+        assert creates == [((), {"user": "me", "name": name, "public": False, "description": "description"})]
+        assert engine.find_or_create(name.upper()) == playlist_id  # now in the index
+        assert len(client.made("user_playlist_create")) == 1
+    else:
+        assert playlist_id == "p1"
+        assert creates == []
+    assert len(client.made("current_user_playlists")) == 1
@@ -0,0 +1,154 @@
+"""RequestScheduler throttling and retries, on a fake clock or against the stub Web API."""
+import threading
+import time
+
+import pytest
+from spotipy.exceptions import SpotifyException
+
+from benchmarks.stub_server import StubSpotifyAPI, stub_spotify
+from spotify_client import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PlaylistEngine, RateLimitedError, RequestScheduler, SpotifyClient,
+    make_http_session
+)
+
+
+class FakeTime:
+    """A clock that only moves when told to, or when the scheduler sleeps."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def rate_limited(retry_after):
+    return SpotifyException(429, -1, "rate limited", headers={"Retry-After": str(retry_after)})
+
+
+def failing(*errors):
+    """fn that raises each of errors in turn, then returns "ok"."""
+    errors = list(errors)
+
+    def fn():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    return fn
+
+
+@pytest.fixture
+def fake_time():
+    return FakeTime()
+
+
+@pytest.fixture
+def api():
+    api = StubSpotifyAPI().start()
+    yield api
+    api.stop()
+
+
+def stub_client(api, scheduler):
+    return SpotifyClient(stub_spotify(api.url, make_http_session()), scheduler=scheduler)
+
+
+def test_retry_after_pauses_every_request(api):
+    scheduler = RequestScheduler()
+    client = stub_client(api, scheduler)
+    api.fail_next(429, retry_after=0.3)
+    start = time.monotonic()
+    assert client.tracks(["track000000000000001"])["tracks"]
+    assert time.monotonic() - start >= 0.3
+    assert scheduler.throttled == 1
+    assert api.requests["rate limited"] == 1
+    assert api.requests["tracks"] == 1
+
+
+def test_rate_halves_on_429_and_recovers_with_successes(fake_time):
+    scheduler = RequestScheduler(rate=10.0, clock=fake_time.clock, sleep=fake_time.sleep)
+    with pytest.raises(RateLimitedError):
+        scheduler.call(failing(rate_limited(2)), max_wait=1.0)
+    assert scheduler.throttled == 1
+    assert scheduler.rate == 5.0
+
+    # Still paused: a call that cannot wait out the rest of the pause fails fast.
+    fake_time.now += 1.5
+    with pytest.raises(RateLimitedError):
+        scheduler.call(failing(), max_wait=0.1)
+    fake_time.now += 0.5
+    assert scheduler.call(failing()) == "ok"
+
+    # +0.1 per success: back at the full rate after about 50 of them.
+    for _ in range(48):
+        fake_time.now += 1.0
+        scheduler.call(failing())
+    assert scheduler.rate < 10.0
+    for _ in range(2):
+        fake_time.now += 1.0
+        scheduler.call(failing())
+    assert scheduler.rate == 10.0
+
+
+def test_max_wait_raises_rate_limited_error(fake_time):
+    scheduler = RequestScheduler(rate=1.0, burst=1, clock=fake_time.clock, sleep=fake_time.sleep)
+    scheduler.call(failing())
+    with pytest.raises(RateLimitedError) as raised:
+        scheduler.call(failing(), max_wait=0.5)  # the next token is a second away
+    assert raised.value.retry_after == pytest.approx(1.0)
+    fake_time.now += 1.0
+    assert scheduler.call(failing(), max_wait=0.5) == "ok"
+
+
+def test_waiting_calls_are_served_by_priority():
+    scheduler = RequestScheduler(rate=100.0, burst=1)
+    served = []
+
+    def record(name):
+        served.append(name)
+
+    # A 429 pauses the scheduler while the other calls queue up behind it.
+    throttled = threading.Thread(target=scheduler.call, args=(failing(rate_limited(0.5)),))
+    throttled.start()
+    time.sleep(0.05)
+    threads = []
+    for name, priority in (("background", PRIORITY_BACKGROUND), ("interactive", PRIORITY_INTERACTIVE)):
+        threads.append(threading.Thread(target=scheduler.call, args=(record, name), kwargs={"priority": priority}))
+        threads[-1].start()
+        time.sleep(0.05)
+    assert len(scheduler._waiting) == 3
+    for thread in [throttled] + threads:
+        thread.join()
+    assert served == ["interactive", "background"]
+
+
+def test_server_errors_are_retried_with_backoff_for_reads(api, fake_time):
+    scheduler = RequestScheduler(sleep=fake_time.sleep)
+    client = stub_client(api, scheduler)
+    api.fail_next(503, count=2)
+    assert client.tracks(["track000000000000001"])["tracks"]
+    assert api.requests["server error"] == 2
+    assert len(fake_time.sleeps) == 2
+    assert 0.25 <= fake_time.sleeps[0] <= 0.5 and 0.5 <= fake_time.sleeps[1] <= 1.0
+
+
+def test_server_errors_are_not_retried_for_writes(api, fake_time):
+    scheduler = RequestScheduler(sleep=fake_time.sleep)
+    engine = PlaylistEngine(stub_client(api, scheduler))
+    playlist_id = engine.create("Retries")
+    api.fail_next(503)
+    with pytest.raises(SpotifyException):
+        engine.add_tracks(playlist_id, ["spotify:track:abc"])
+    assert api.playlist_items[playlist_id] == 0
+    assert scheduler.retries == 0
+
+    # A 429 was refused without being applied, so even a write is sent again.
+    api.fail_next(429, retry_after=0)
+    assert engine.add_tracks(playlist_id, ["spotify:track:abc"]) == 1
+    assert api.playlist_items[playlist_id] == 1
@@ -0,0 +1,50 @@
+"""SearchIndex results compared with a plain str.contains scan, as queries narrow and broaden."""
+import numpy as np
+import pytest
+
+from history_core import HistoryColumns, PlayKeySet, SearchIndex, empty_history_frame, merge_history
+
+SONGS = ["Blue Monday", "Blue in Green", "Monday Monday", "BLUEBIRD", "Green Onions", "Élan", None]
+ARTISTS = ["New Order", "Miles Davis", "The Mamas & the Papas", "Blue Öyster Cult", None]
+
+# Typed one key at a time, then edited back to a shorter or different query.
+QUERIES = ["b", "bl", "blu", "blue", "blue ", "blue m", "blue", "mon", "monday", "on", "ö", "öy", "élan", "a.b",
+           "&", "zzz", "zz", "e"]
+
+
+@pytest.fixture(scope="module")
+def df():
+    rng = np.random.default_rng(3)
+    columns = HistoryColumns()
+    for i in range(300):
+        columns.append({"ts": f"2020-01-01T00:{i // 60:02}:{i % 60:02}Z", "ms_played": 1000,
+                        "master_metadata_track_name": SONGS[rng.integers(len(SONGS))],
+                        "master_metadata_album_artist_name": ARTISTS[rng.integers(len(ARTISTS))]})
+    df, _ = merge_history(empty_history_frame(), PlayKeySet(), [columns.to_chunk()])
+    return df
+
+
+def expected(df, query):
+    hit = False
+    for name in SearchIndex.COLUMNS:
+        hit = hit | df[name].astype(object).str.contains(query, case=False, regex=False).fillna(False).astype(bool)
+    return np.flatnonzero(hit.to_numpy()).tolist()
+
+
+def test_queries_match_str_contains_while_typing(df):
+    index = SearchIndex(df)
+    for query in QUERIES:
+        assert index.search(query).tolist() == expected(df, query), query
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_a_fresh_index_matches_str_contains(df, query):
+    assert SearchIndex(df).search(query).tolist() == expected(df, query)
+
+
+def test_broadened_query_finds_rows_the_narrower_one_dropped(df):
+    index = SearchIndex(df)
+    narrow = index.search("blue m").tolist()
+    broad = index.search("blue").tolist()
+    assert set(narrow) < set(broad)
+    assert broad == expected(df, "blue")
@@ -0,0 +1,92 @@
+"""SpotifyClient against the stub Web API in benchmarks/stub_server.py (no network or credentials)."""
+import threading
+
+import pytest
+
+from benchmarks.stub_server import StubSpotifyAPI, stub_spotify
+from spotify_client import SpotifyClient, make_http_session
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def api():
+    api = StubSpotifyAPI().start()
+    yield api
+    api.stop()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def client(api, clock):
+    return SpotifyClient(stub_spotify(api.url, make_http_session()), device_ttl=30.0, clock=clock)
+
+
+def test_user_profile_is_fetched_once(api, client):
+    assert client.current_user()["id"] == client.current_user()["id"]
+    assert client.is_premium()
+    assert api.requests["me"] == 1
+
+
+def test_devices_are_reused_within_ttl(api, client, clock):
+    client.devices()
+    clock.now += 29
+    client.devices()
+    assert api.requests["devices"] == 1
+    clock.now += 2
+    client.devices()
+    assert api.requests["devices"] == 2
+
+
+def test_device_command_refreshes_devices_after_failure(api, client):
+    client.devices()
+    api.devices = [{"id": "phone", "is_active": True, "name": "Phone", "type": "Smartphone"}]
+    client.play_track("spotify:track:abc")
+    assert api.requests["devices"] == 2
+    assert api.requests["player"] == 2  # the stale device's 404, then the new device
+    client.play_track("spotify:track:abc")
+    assert api.requests["devices"] == 2
+    assert api.requests["player"] == 3
+
+
+def test_concurrent_identical_reads_share_one_request(api, client):
+    api.latency = 0.2  # keeps the first request in flight while the others arrive
+    track_ids = [f"track{i:018d}" for i in range(20)]
+    barrier = threading.Barrier(8)
+    results = []
+
+    def read():
+        barrier.wait()
+        results.append(client.tracks(track_ids))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8
+    assert all(result == results[0] for result in results)
+    assert api.requests["tracks"] == 1
+
+
+@pytest.mark.parametrize("command", [
+    lambda client: client.play_track("spotify:track:abc"),
+    lambda client: client.queue_track("spotify:track:abc"),
+    lambda client: client.resume(),
+], ids=["play", "queue", "resume"])
+def test_playback_commands_make_a_single_call(api, client, command):
+    client.devices()
+    before = sum(api.requests.values())
+    command(client)
+    assert sum(api.requests.values()) - before == 1
+    assert api.requests["player"] == 1